@@ -17,11 +17,14 @@ os.environ["LLM_PROVIDER"] = st.secrets.get("LLM_PROVIDER", "google")
 # 🚫 Prevent crewai from trying to use chromadb backend
 os.environ["CREWAI_STORAGE_BACKEND"] = "none"
 
-from shopsmart.agents import run_pipeline
+from shopsmart.core import metrics
+from shopsmart.service import ServiceBusy, get_service
 import json
 import pandas as pd
 
 st.set_page_config(page_title="ShopSmart-EG", page_icon="🛍️", layout="wide")
+metrics.start_server()  # Prometheus /metrics when METRICS_PORT is set
+service = get_service()  # shared by all sessions: identical concurrent searches run once
 
 
 with st.sidebar:
@@ -45,57 +48,118 @@ with st.sidebar:
     min_rating = st.slider("Min Rating", 0.0, 5.0, 0.0, 0.1)
     brand = st.text_input("Preferred Brand (optional)", "")
     features = st.text_input("Must-have features (comma separated)", "")
+    show_timings = st.checkbox("Show timings", value=False, disabled=not metrics.enabled())
     st.caption("Note: This app fetches a small number of public pages and follows polite backoff.")
 
 st.title("ShopSmart-EG — Multi Agent Shopping Assistant")
 user_query = st.text_input("What are you shopping for today?", placeholder="e.g., wireless earbuds under 2000 EGP with ANC")
 
+job = None
 if st.button("Search", type="primary") and user_query.strip():
     # Persist keys into env for this process
     os.environ["LLM_PROVIDER"] = st.session_state.get("LLM_PROVIDER","openai")
     for k in ["OPENAI_API_KEY","OPENAI_MODEL","ANTHROPIC_API_KEY","ANTHROPIC_MODEL","GOOGLE_API_KEY","GOOGLE_MODEL","TAVILY_API_KEY"]:
         if k in st.session_state and st.session_state[k]:
             os.environ[k] = st.session_state[k]
-    # Compose enriched query
-    q = user_query
-    if budget:
-        q += f" under {budget} EGP"
-    if brand:
-        q += f" {brand}"
-    if features.strip():
-        q += " " + features.strip()
-    with st.spinner("Thinking with multiple agents..."):
-        result = run_pipeline(q)
-    st.success("Done!")
-
-    # Results
-    plan = result.get("plan", {})
+    # Sidebar fields go in as structured constraints; the free text is parsed by rules (LLM only if unclear)
+    constraints = {
+        "max_price": budget or None,
+        "min_rating": min_rating or None,
+        "brand": brand.strip() or None,
+        "features": [f.strip() for f in features.split(",") if f.strip()],
+    }
+    try:
+        job = service.submit(user_query, constraints=constraints)
+        st.session_state["job_id"] = job.id
+    except ServiceBusy as e:
+        st.warning(f"Lots of shoppers right now — please try again in about {e.retry_after:.0f} seconds.")
+elif st.session_state.get("job_id"):
+    job = service.get(st.session_state["job_id"])  # reattach after a rerun (e.g. a sidebar change)
+
+if job is not None:
+    show_cols = ["title","price","rating","source","url"]
+    progress = st.progress(0.0, text="Planning search..." if job.status != "queued" else "Waiting for a free worker...")
     st.subheader("Search Plan")
-    st.json(plan)
-
-    prods = result.get("products", [])
-    if prods:
-        df = pd.DataFrame(prods)
-        show_cols = ["title","price","rating","source","url"]
-        st.dataframe(df[show_cols].sort_values(by=["source","price"], na_position="last"), use_container_width=True, hide_index=True)
-
-    top5 = result.get("top5", [])
-    if top5:
-        st.subheader("Top Candidates")
-        df2 = pd.DataFrame(top5)
-        st.dataframe(df2[["title","price","rating","source","url"]], use_container_width=True, hide_index=True)
-
+    plan_box = st.empty()
+    products_box = st.empty()
+    st.subheader("Top Candidates")
+    top_box = st.empty()
     st.subheader("Summary")
-    st.markdown(result.get("summary",""))
-
+    summary_box = st.empty()
     st.subheader("Recommendation")
-    st.json(result.get("recommendation", {}))
+    rec_box = st.empty()
+
+    # Render each stage as soon as the pipeline reports it
+    prods, n_urls, n_done, summary_text, reasoning_text = [], 0, 0, "", ""
+    result = {}
+    seen = 0
+    while True:
+        batch = job.poll(seen, timeout=0.5)
+        if not batch:
+            if job.finished:
+                break
+            if job.status == "queued":
+                progress.progress(0.0, text=f"Queued behind {service.position(job)} searches...")
+            continue
+        seen += len(batch)
+        for event in batch:
+            if event.kind == "plan":
+                with plan_box.container():
+                    st.json(event.plan.model_dump())
+                    st.caption(f"Plan source: {event.source}")
+                progress.progress(0.15, text="Searching Amazon.eg, Jumia and Noon...")
+            elif event.kind == "urls":
+                n_urls = len(event.urls)
+                progress.progress(0.25, text=f"Found {n_urls} pages, extracting products...")
+            elif event.kind == "product":
+                n_done += 1
+                progress.progress(0.25 + 0.5 * n_done / max(n_urls, 1), text=f"Extracted {n_done}/{n_urls} pages...")
+                if event.product:
+                    prods.append(event.product.model_dump())
+                    df = pd.DataFrame(prods)
+                    products_box.dataframe(df[show_cols].sort_values(by=["source","price"], na_position="last"), use_container_width=True, hide_index=True)
+            elif event.kind == "ranking":
+                if event.top:
+                    top_box.dataframe(pd.DataFrame([p.model_dump() for p in event.top])[show_cols], use_container_width=True, hide_index=True)
+                if event.final:
+                    progress.progress(0.8, text="Writing summary and recommendation...")
+            elif event.kind == "llm_text":
+                if event.stage == "summary":
+                    summary_text += event.delta
+                    summary_box.markdown(summary_text)
+                else:
+                    reasoning_text += event.delta
+                    rec_box.markdown(reasoning_text)
+            elif event.kind == "done":
+                result = event.result
+    progress.empty()
+    for stage, err in result.get("errors", {}).items():
+        st.warning(f"{stage.capitalize()} incomplete: {err}")
+    if result.get("skipped"):
+        why = "top picks were already settled" if result["skipped"][0]["reason"] == "early_stop" else "the time budget ran out"
+        st.caption(f"Skipped {len(result['skipped'])} slow pages ({why}): " + ", ".join(x["url"] for x in result["skipped"]))
+    if job.error is not None:
+        st.error(f"Search failed: {job.error}")
+    else:
+        st.success("Done!" if job.subscribers == 1 else f"Done! (shared with {job.subscribers - 1} other identical searches)")
+        rec_box.json(result.get("recommendation", {}))
+    if show_timings and result.get("timings"):
+        with st.sidebar:
+            st.subheader("Timings (ms)")
+            st.bar_chart(pd.Series({k: v for k, v in result["timings"].items() if k != "total"}))
+            st.caption(f"Total: {result['timings']['total']:.0f} ms")
+            caches = metrics.cache_stats()
+            if caches:
+                st.dataframe(pd.DataFrame(caches).T[["hits", "misses", "hit_rate"]], use_container_width=True)
+            jobs = service.stats()
+            st.caption(f"Queue: {jobs['queued']} waiting, {jobs['running']}/{jobs['workers']} running, "
+                       f"{jobs['coalesced']} coalesced" + (f", wait p50 {jobs['wait_p50_ms']:.0f} ms" if "wait_p50_ms" in jobs else ""))
 else:
     st.caption("Enter a query and press **Search**. For best results include budget and desired features.")
 
 
 from streamlit_webrtc import webrtc_streamer, WebRtcMode
-import speech_recognition as sr
+from shopsmart.audio import VoiceSession
 import queue
 
 st.subheader("🎤 Voice Input (Optional)")
@@ -107,24 +171,25 @@ webrtc_ctx = webrtc_streamer(
     async_processing=True,
 )
 
-voice_text = None
+# Per-session in-memory buffer + VAD: each finished utterance is recognized as it arrives
+voice = st.session_state.setdefault("voice", VoiceSession())
 if webrtc_ctx.audio_receiver:
     try:
-        audio_frames = []
-        while not webrtc_ctx.audio_receiver._queue.empty():
-            frame = webrtc_ctx.audio_receiver._queue.get_nowait()
-            audio_frames.append(frame)
-        if audio_frames:
-            with open("temp.wav", "wb") as f:
-                for frame in audio_frames:
-                    f.write(frame.to_ndarray().tobytes())
-
-            recognizer = sr.Recognizer()
-            with sr.AudioFile("temp.wav") as source:
-                audio = recognizer.record(source)
-                voice_text = recognizer.recognize_google(audio, language="en-US")
-                st.success(f"You said: {voice_text}")
-    except Exception as e:
-        st.error(f"Voice input failed: {e}")
+        voice.push_frames(webrtc_ctx.audio_receiver.get_frames(timeout=0.2))
+    except queue.Empty:
+        pass
+elif st.session_state.get("voice_live"):
+    voice.flush()  # microphone stopped: recognize whatever was being said
+st.session_state["voice_live"] = bool(webrtc_ctx.audio_receiver)
+
+heard = voice.transcribe()
+if heard:
+    st.session_state["voice_text"] = " ".join([st.session_state.get("voice_text", ""), *heard]).strip()
+for err in voice.errors:
+    st.error(f"Voice input failed: {err}")
+voice.errors.clear()
+voice_text = st.session_state.get("voice_text")
+if voice_text:
+    st.success(f"You said: {voice_text}")
 
 query_input = st.text_input("What are you shopping for today?", value=voice_text or "")
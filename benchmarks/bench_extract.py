@@ -0,0 +1,79 @@
+"""Pages/sec for the product extractor on the benchmark corpus.
+
+Compares the previous two-parse path (extruct JSON-LD + BeautifulSoup DOM) with
+scrapers.parse_product (regex JSON-LD fast path, one lxml tree otherwise).
+
+    python -m benchmarks.bench_extract --pad-kb 1024 --rounds 20
+
+The corpus is six small hand-written pages shaped like each marketplace's markup, padded
+with repeated filler, not saved marketplace pages. On JSON-LD pages the new path never
+parses the filler while the old one does, so their before/after gap mostly measures page
+size; only the DOM-only numbers say much about selector and parser cost on real pages.
+"""
+from __future__ import annotations
+import argparse
+import re
+import time
+from typing import Callable, Dict
+from benchmarks.corpus import load_corpus
+from shopsmart.tools import scrapers
+from shopsmart.core.utils import parse_price_to_float
+
+def legacy_parse(html: str, url: str):
+    """The extractor as it was before the single-parse rewrite, kept for comparison."""
+    import extruct
+    from bs4 import BeautifulSoup
+    from w3lib.html import get_base_url
+
+    source = scrapers.source_of(url)
+    data = extruct.extract(html, base_url=get_base_url(html, url), syntaxes=["json-ld"], errors="log")
+    for it in data.get("json-ld", []) if data else []:
+        if isinstance(it, dict) and it.get("@type") in ("Product", "ProductGroup"):
+            return scrapers._from_jsonld(it, url, source)
+    soup = BeautifulSoup(html, "lxml")
+    title = soup.select_one("meta[property='og:title']") or soup.select_one("title")
+    candidates = []
+    for sel in ["[data-asin-price]", "#priceblock_ourprice", "#priceblock_dealprice", "[data-old-price]",
+                ".price ._price", ".-fs24", ".price-number", ".product-price", "meta[itemprop='price']",
+                "span[data-price]", "span.price", "div.price"]:
+        node = soup.select_one(sel)
+        if node:
+            candidates.append(node.get("content") if node.has_attr("content") else node.get_text(" ", strip=True))
+    price = next((p for p in map(parse_price_to_float, candidates) if p), None)
+    rating = None
+    for sel in ["i[data-hook='average-star-rating'] span", "span[data-hook='rating-out-of-text']", ".rating-stars", ".rating .-fs16", "span.rating__value"]:
+        node = soup.select_one(sel)
+        if node:
+            m = re.search(r"(\d[\d\. ]*)", node.get_text(" ", strip=True))
+            rating = float(m.group(1).replace(" ", "")) if m else None
+            if rating:
+                break
+    images = [im.get("src") or im.get("data-src") for im in soup.select("img")]
+    return {"title": title, "price": price, "rating": rating, "images": [i for i in images if i and i.startswith("http")][:5]}
+
+def bench(name: str, fn: Callable, pages: Dict[str, str], rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for url, html in pages.items():
+            fn(html, url)
+    elapsed = time.perf_counter() - t0
+    rate = rounds * len(pages) / elapsed
+    print(f"{name:<10} {rate:10.1f} pages/sec  ({elapsed * 1000 / (rounds * len(pages)):.2f} ms/page)")
+    return rate
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--pad-kb", type=int, default=1024, help="pad each page to roughly this size (KiB)")
+    ap.add_argument("--rounds", type=int, default=10)
+    args = ap.parse_args()
+    pages = load_corpus(args.pad_kb)
+    print(f"{len(pages)} synthetic pages, ~{sum(map(len, pages.values())) // len(pages) // 1024} KiB each (mostly filler)")
+    has_ld = {u: "application/ld+json" in h for u, h in pages.items()}
+    for subset, keep in (("json-ld", lambda u: has_ld[u]), ("dom-only", lambda u: not has_ld[u]), ("all", lambda u: True)):
+        chosen = {u: h for u, h in pages.items() if keep(u)}
+        print(f"-- {subset} ({len(chosen)} pages)")
+        bench("before", legacy_parse, chosen, args.rounds)
+        bench("after", scrapers.parse_product, chosen, args.rounds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Cross-marketplace clustering throughput on synthetic listings.
+
+    python -m benchmarks.bench_matching --items 1000
+
+Each base item is listed on every marketplace with a differently worded title.
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+from shopsmart.core.matching import cluster_products
+from shopsmart.core.models import Product
+
+BRANDS = ["Samsung", "Xiaomi", "Apple", "Oraimo", "Anker", "Realme", "Infinix", "Honor", "JBL", "Lenovo"]
+KINDS = ["Smartphone", "Earbuds", "Power Bank", "Smart Watch", "Tablet", "Speaker"]
+TEMPLATES = [
+    "{brand} {kind} {model} {storage}GB, {color}",
+    "{brand} {model} {kind} - {storage} GB - {color}",
+    "{brand} {kind} {model} Dual SIM {storage}GB {color} | Official",
+]
+SOURCES = ["amazon.eg", "jumia.com.eg", "noon.com/egypt-en"]
+
+def make_listings(items: int, seed: int = 1):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(items):
+        spec = dict(brand=rnd.choice(BRANDS), kind=rnd.choice(KINDS), model=f"X{i}", storage=rnd.choice([64, 128, 256]),
+                    color=rnd.choice(["Black", "Blue", "Silver"]))
+        for s, tpl in zip(SOURCES, TEMPLATES):
+            out.append(Product(title=tpl.format(**spec), url=f"https://{s.split('/')[0]}/p/{i}", price=rnd.randint(500, 30000), source=s))
+    rnd.shuffle(out)
+    return out
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--items", type=int, default=1000)
+    args = ap.parse_args()
+    listings = make_listings(args.items)
+    t0 = time.perf_counter()
+    clusters = cluster_products(listings)
+    elapsed = time.perf_counter() - t0
+    merged = sum(1 for c in clusters if len(c.offers) == len(SOURCES))
+    print(f"{len(listings)} listings -> {len(clusters)} clusters ({merged}/{args.items} items fully merged) in {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
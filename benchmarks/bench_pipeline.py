@@ -0,0 +1,187 @@
+"""Offline end-to-end benchmark: per-stage latency, extraction pages/sec, pipeline throughput.
+
+Marketplace pages are replayed from the synthetic benchmark corpus (see benchmarks.corpus) by a
+local server (with latency and injected 503s); Tavily and the LLM are local stand-ins. No
+network access or API keys.
+
+    python -m benchmarks.bench_pipeline --queries 20 --concurrency 4 --latency-ms 80 --error-rate 0.02
+    python -m benchmarks.bench_pipeline --json out.json              # save a baseline
+    python -m benchmarks.bench_pipeline --baseline out.json          # exit 1 on a >20% regression
+    python -m benchmarks.bench_pipeline --burst 40                   # 40 sessions at once through the job service
+
+Caches (page, search, LLM, catalog) are off unless --warm is given.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+import numpy as np
+from benchmarks.fakes import FakeLLM, FakeTavily, ReplayServer, replay_pages
+from shopsmart import agents, llm
+from shopsmart.core import http
+from shopsmart.service import PipelineService, ServiceBusy
+from shopsmart.speculation import speculation_stats
+from shopsmart.tools import tavily_tool
+from shopsmart.tools.extraction import iter_extract
+
+QUERIES = [
+    "samsung galaxy a55 256gb under 20000", "iphone 15 128gb", "oraimo freepods anc earbuds under 2000",
+    "redmi note 13 8gb ram", "anker power bank 20000mah under 1500", "airpods pro usb-c",
+    "budget android phone 256gb under 12000", "wireless earbuds with anc 4+ stars", "20000mah power bank fast charging",
+    "xiaomi phone under 15000",
+]
+# extract covers UrlsFound -> final RankingUpdated (extraction, dedupe and ranking);
+# first_token is the wait for the first summary delta, llm everything after the ranking
+STAGES = ("plan", "search", "extract", "first_token", "llm", "total")
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    a = np.asarray(samples, dtype=np.float64) * 1000
+    return {"p50": float(np.percentile(a, 50)), "p90": float(np.percentile(a, 90)), "p99": float(np.percentile(a, 99))}
+
+def timed_run(query: str) -> Dict[str, float]:
+    """Seconds spent in each pipeline stage, measured from the event stream."""
+    t0 = last = time.perf_counter()
+    marks: Dict[str, float] = {}
+    for event in agents.iter_pipeline(query):
+        now = time.perf_counter()
+        if event.kind == "plan":
+            marks["plan"] = now - last
+        elif event.kind == "urls":
+            marks["search"] = now - last
+        elif event.kind == "ranking" and event.final:
+            marks["extract"] = now - last
+        elif event.kind == "llm_text" and "first_token" not in marks:
+            marks["first_token"] = now - last
+        elif event.kind == "done":
+            marks["llm"] = now - last
+            marks["total"] = now - t0
+            break
+        if event.kind in ("plan", "urls") or (event.kind == "ranking" and event.final):
+            last = now
+    return marks
+
+def stage_latency(queries: List[str]) -> Dict[str, Dict[str, float]]:
+    runs = [timed_run(q) for q in queries]
+    out = {}
+    for stage in STAGES:
+        samples = [r[stage] for r in runs if stage in r]
+        if samples:
+            out[stage] = percentiles(samples)
+    return out
+
+def extraction_rate(urls: List[str], rounds: int, workers: int) -> float:
+    t0 = time.perf_counter()
+    n = 0
+    for _ in range(rounds):
+        for _, _, p in iter_extract(urls, max_workers=workers):
+            n += p is not None
+    return n / (time.perf_counter() - t0)
+
+def throughput(queries: List[str], concurrency: int) -> float:
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(agents.run_pipeline, queries))
+    return len(queries) / (time.perf_counter() - t0)
+
+def burst(queries: List[str], sessions: int, workers: int) -> Dict[str, float]:
+    """`sessions` users submitting at once, drawn from a few hot queries, through the job service."""
+    svc = PipelineService(workers=workers, max_queue=sessions)
+    hot = queries[:3]
+    latencies: List[float] = []
+
+    def session(i: int) -> None:
+        t0 = time.perf_counter()
+        try:
+            svc.submit(hot[i % len(hot)]).result()
+            latencies.append(time.perf_counter() - t0)
+        except ServiceBusy:
+            pass
+
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(session, range(sessions)))
+    svc.shutdown()
+    stats = svc.stats()
+    return {**percentiles(latencies), "runs": stats["started"], "coalesced": stats["coalesced"], "rejected": stats["rejected"]}
+
+def regressions(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Stage p50s that got slower, or rates that dropped, by more than `tolerance`."""
+    found = []
+    for stage, pct in baseline.get("stages", {}).items():
+        now = current["stages"].get(stage, {}).get("p50")
+        if now is not None and pct["p50"] > 0 and now > pct["p50"] * (1 + tolerance):
+            found.append(f"{stage} p50 {pct['p50']:.1f} -> {now:.1f} ms")
+    for key in ("pages_per_sec", "queries_per_sec"):
+        if key in baseline and current[key] < baseline[key] * (1 - tolerance):
+            found.append(f"{key} {baseline[key]:.1f} -> {current[key]:.1f}")
+    return found
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--queries", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--copies", type=int, default=4, help="distinct URLs served per corpus page")
+    ap.add_argument("--pad-kb", type=int, default=256)
+    ap.add_argument("--latency-ms", type=float, default=80)
+    ap.add_argument("--error-rate", type=float, default=0.02)
+    ap.add_argument("--search-latency-ms", type=float, default=300)
+    ap.add_argument("--llm-latency-ms", type=float, default=250)
+    ap.add_argument("--token-ms", type=float, default=5)
+    ap.add_argument("--extract-rounds", type=int, default=3)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--burst", type=int, default=0, help="also run N simultaneous sessions through the job service")
+    ap.add_argument("--gzip", action="store_true", help="serve pages gzip-encoded")
+    ap.add_argument("--warm", action="store_true", help="leave the page/search/LLM caches and catalog on")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--baseline", help="compare against a previous --json file")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    args = ap.parse_args()
+
+    os.environ["SHOPSMART_CACHE_DIR"] = tempfile.mkdtemp(prefix="shopsmart-bench-")
+    os.environ.setdefault("TAVILY_API_KEY", "bench")
+    for flag in ("PAGE_CACHE", "SEARCH_CACHE", "LLM_CACHE", "CATALOG"):
+        os.environ[flag] = "true" if args.warm else "false"
+    queries = [QUERIES[i % len(QUERIES)] + ("" if i < len(QUERIES) else f" v{i // len(QUERIES)}") for i in range(args.queries)]
+
+    with ReplayServer(replay_pages(args.copies, args.pad_kb), latency=args.latency_ms / 1000, error_rate=args.error_rate,
+                      gzip=args.gzip) as server:
+        http.set_client(server.client())
+        tavily_tool.set_client(FakeTavily(server.urls, latency=args.search_latency_ms / 1000))
+        llm.set_llm(FakeLLM(latency=args.llm_latency_ms / 1000, token_delay=args.token_ms / 1000))
+        print(f"{len(server.urls)} pages on {server.base}, {args.latency_ms:.0f} ms latency, {args.error_rate:.0%} errors")
+        result = {"stages": stage_latency(queries)}
+        for stage, pct in result["stages"].items():
+            print(f"{stage:<13} p50 {pct['p50']:8.1f} ms   p90 {pct['p90']:8.1f} ms   p99 {pct['p99']:8.1f} ms")
+        result["pages_per_sec"] = extraction_rate(server.urls, args.extract_rounds, args.workers)
+        print(f"extraction    {result['pages_per_sec']:8.1f} pages/sec ({args.workers} workers)")
+        result["queries_per_sec"] = throughput(queries, args.concurrency)
+        print(f"run_pipeline  {result['queries_per_sec']:8.2f} queries/sec (concurrency {args.concurrency})")
+        if args.burst:
+            result["burst"] = burst(queries, args.burst, args.concurrency)
+            b = result["burst"]
+            print(f"burst         p50 {b['p50']:8.1f} ms   p90 {b['p90']:8.1f} ms   "
+                  f"{b['runs']} runs for {args.burst} sessions ({b['coalesced']} coalesced)")
+        result["speculation"] = speculation_stats()
+        if result["speculation"]["hits"] + result["speculation"]["misses"]:
+            print(f"speculation   {result['speculation']['hit_rate']:8.0%} hit rate")
+        result["server"] = dict(server.stats)
+        print(f"served        {server.stats['bytes'] / max(server.stats['requests'], 1) / 1024:8.1f} KiB/request")
+    http.set_client(None)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(result, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        return 1 if found else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""Ranking cost: per-product scoring + full sort vs. ProductBatch + vectorized top-k.
+
+    python -m benchmarks.bench_ranker --sizes 10 1000 100000 --k 5
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+from shopsmart.core.models import Product
+from shopsmart.core.ranker import ProductBatch, rank_batch, score_product
+
+def make_products(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    brands = ["Samsung", "Xiaomi", "Apple", "Oraimo", "Anker", "Realme", "Infinix"]
+    return [
+        Product(
+            title=f"{rnd.choice(brands)} model {i} {rnd.randint(64, 512)}GB",
+            url=f"https://www.amazon.eg/dp/B{i:09d}",
+            price=rnd.choice([None, float(rnd.randint(300, 60000))]),
+            rating=rnd.choice([None, round(rnd.uniform(1, 5), 1)]),
+            review_count=rnd.randint(0, 5000),
+        )
+        for i in range(n)
+    ]
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    plan = ("Samsung", 20000.0, 4.0)
+    print(f"{'n':>8} {'sorted()':>12} {'batch+topk':>12} {'topk only':>12}")
+    for n in args.sizes:
+        products = make_products(n)
+        legacy = lambda: sorted(products, key=lambda p: score_product(p, *plan), reverse=True)[: args.k]
+        fresh = lambda: rank_batch(ProductBatch(products), *plan, k=args.k)
+        batch = ProductBatch(products)
+        warm = lambda: rank_batch(batch, *plan, k=args.k)
+        assert legacy() == fresh() == warm()
+        t_legacy, t_fresh, t_warm = (timed(f, args.repeat) for f in (legacy, fresh, warm))
+        print(f"{n:>8} {t_legacy * 1000:10.3f}ms {t_fresh * 1000:10.3f}ms {t_warm * 1000:10.3f}ms")
+
+if __name__ == "__main__":
+    main()
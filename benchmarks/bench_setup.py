@@ -0,0 +1,58 @@
+"""Cold-import and per-request setup cost of the pipeline.
+
+    python -m benchmarks.bench_setup --requests 50
+
+Import times are measured in fresh interpreters. "crew" setup is what every request used
+to pay (crewai LLM + six Agents + six Tasks + Crew); "lite" is what iter_pipeline pays now.
+"""
+from __future__ import annotations
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+def import_time(module: str, runs: int) -> float | None:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if out.returncode != 0:
+            return None
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+def setup_lite() -> None:
+    from shopsmart.llm import make_llm, cached_llm
+    cached_llm(make_llm())
+
+def setup_crew() -> None:
+    from crewai import LLM
+    from shopsmart.crew import build_crew
+    from shopsmart.llm import llm_settings
+    s = llm_settings()
+    build_crew(LLM(model=s["model"], api_key=s["api_key"] or "sk-bench"))
+
+def per_request(fn, n: int) -> float:
+    fn()  # warm imports
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--requests", type=int, default=50)
+    ap.add_argument("--import-runs", type=int, default=3)
+    args = ap.parse_args()
+    for module in ("shopsmart.agents", "crewai"):
+        t = import_time(module, args.import_runs)
+        print(f"import {module:<18} " + (f"{t * 1000:8.1f} ms" if t is not None else "   (not installed)"))
+    print(f"setup lite            {per_request(setup_lite, args.requests) * 1e6:8.1f} us/request")
+    try:
+        print(f"setup crew            {per_request(setup_crew, args.requests) * 1000:8.1f} ms/request")
+    except ImportError:
+        print("setup crew               (crewai not installed)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+from __future__ import annotations
+import os
+from typing import Dict
+
+CORPUS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# hand-written page shaped like that marketplace's markup -> the product URL it stands for
+# (drives marketplace dispatch in the extractor); these are not captured marketplace pages
+PAGES = {
+    "amazon_jsonld.html": "https://www.amazon.eg/dp/B0CV9XQ5VX",
+    "amazon_dom.html": "https://www.amazon.eg/dp/B0CHWRXH8B",
+    "jumia_jsonld.html": "https://www.jumia.com.eg/xiaomi-redmi-note-13-8gb-256gb-black-123456.html",
+    "jumia_dom.html": "https://www.jumia.com.eg/oraimo-freepods-4-anc-654321.html",
+    "noon_jsonld.html": "https://www.noon.com/egypt-en/iphone-15-128gb-black/N53432547A/p/",
+    "noon_dom.html": "https://www.noon.com/egypt-en/anker-powercore-20000/N40633285A/p/",
+}
+
+_FILLER = (
+    '<div class="a-section a-spacing-small"><span class="a-size-base">Customers also viewed</span>'
+    '<ul>' + "".join(f'<li data-idx="{i}"><a href="/dp/X{i:04d}">Related item {i}</a></li>' for i in range(20)) + "</ul>"
+    '<script>window.ue_t0=window.ue_t0||+new Date();var P={"k":"' + "x" * 400 + '"};</script></div>\n'
+)
+
+def pad_html(html: str, pad_kb: int) -> str:
+    """Grow a page toward real marketplace size by inserting repeated filler markup after the product region.
+
+    Only the size is realistic: the filler is uniform, unlike a real page's scripts and widgets.
+    """
+    if pad_kb <= 0:
+        return html
+    reps = max(1, pad_kb * 1024 // len(_FILLER))
+    i = html.rfind("</body>")
+    i = i if i >= 0 else len(html)
+    return html[:i] + _FILLER * reps + html[i:]
+
+def load_corpus(pad_kb: int = 0) -> Dict[str, str]:
+    """Map product URL -> HTML for every corpus page, optionally padded to `pad_kb` KiB."""
+    out = {}
+    for name, url in PAGES.items():
+        with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+            out[url] = pad_html(f.read(), pad_kb)
+    return out
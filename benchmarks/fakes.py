@@ -0,0 +1,202 @@
+"""Local stand-ins for the network: a marketplace replay server, Tavily and an LLM.
+
+    with ReplayServer(replay_pages(copies=4), latency=0.05, error_rate=0.02) as server:
+        http.set_client(server.client())
+        tavily_tool.set_client(FakeTavily(server.urls))
+        llm.set_llm(FakeLLM())
+
+Everything is seeded, so two runs with the same arguments see the same pages, errors
+and search results.
+"""
+from __future__ import annotations
+import gzip as _gzip
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence
+from urllib.parse import urlparse
+from benchmarks.corpus import load_corpus
+from shopsmart.core.http import HttpClient
+
+_ID_RE = re.compile(r"(/dp/[A-Z0-9]{8})[A-Z0-9]{2}$|(-\d+)(\.html)$|(/N\d+)([A-Z]/p/)$")
+
+def copy_url(url: str, i: int) -> str:
+    """The i-th stand-in for a corpus product URL, with its own product ID (ASIN, SKU or Noon ID)."""
+    if i == 0:
+        return url
+    m = _ID_RE.search(url)
+    if m.group(1):
+        return url[:m.start()] + f"{m.group(1)}{i:02d}"
+    if m.group(2):
+        return url[:m.start()] + f"{m.group(2)}{i:02d}{m.group(3)}"
+    return url[:m.start()] + f"{m.group(4)}{i:02d}{m.group(5)}"
+
+def replay_pages(copies: int = 1, pad_kb: int = 0) -> Dict[str, str]:
+    """Saved corpus served under `copies` distinct product URLs per page, so dedupe and caches see new products."""
+    out = {}
+    for url, html in load_corpus(pad_kb).items():
+        for i in range(copies):
+            out[copy_url(url, i)] = html
+    return out
+
+class ReplayServer:
+    """Threaded HTTP server on 127.0.0.1 replaying corpus pages by (Host header, path?query).
+
+    Each response is delayed by `latency` seconds (+/- `jitter` as a fraction) and fails
+    with a 503 with probability `error_rate`; unknown pages get a 404. With `gzip`, bodies
+    are sent gzip-encoded to clients that accept it. `stats["bytes"]` counts body bytes
+    actually written (clients may hang up early).
+    """
+
+    def __init__(self, pages: Dict[str, str], latency: float = 0.0, jitter: float = 0.5, error_rate: float = 0.0, seed: int = 0,
+                 gzip: bool = False):
+        self.pages = {}
+        self.gzip = gzip
+        for url, html in pages.items():
+            parts = urlparse(url)
+            self.pages[(parts.netloc.lower(), parts.path + (f"?{parts.query}" if parts.query else ""))] = html.encode("utf-8")
+        self._gzipped = {k: _gzip.compress(v, 6) for k, v in self.pages.items()} if gzip else {}
+        self.urls = list(pages)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "not_found": 0, "bytes": 0}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def hosts(self) -> List[str]:
+        return sorted({host for host, _ in self.pages})
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _draw(self):
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency * (1 + self.jitter * (2 * self._rng.random() - 1)) if self.latency > 0 else 0.0
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.stats["errors"] += 1
+        return delay, fail
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                delay, fail = server._draw()
+                if delay:
+                    time.sleep(delay)
+                key = ((self.headers.get("Host") or "").lower(), self.path)
+                body = server.pages.get(key)
+                if fail or body is None:
+                    if body is None and not fail:
+                        server.stats["not_found"] += 1
+                    self.send_response(503 if fail else 404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                if server.gzip and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                    body = server._gzipped[key]
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                for i in range(0, len(body), 16384):
+                    try:
+                        self.wfile.write(body[i:i + 16384])
+                    except OSError:  # client stopped reading (streamed fetch got what it needed)
+                        self.close_connection = True
+                        return
+                    with server._lock:
+                        server.stats["bytes"] += len(body[i:i + 16384])
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "ReplayServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._server.handle_error = lambda request, address: None  # connections reset by early-closing clients
+        threading.Thread(target=self._server.serve_forever, name="replay-server", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def client(self, rate: float = 0, **kwargs) -> HttpClient:
+        """HttpClient that sends every marketplace host to this server (no rate limit by default)."""
+        return HttpClient(rate=rate, resolve={h: self.base for h in self.hosts}, **kwargs)
+
+    def __enter__(self) -> "ReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+class FakeTavily:
+    """TavilyClient stand-in: `search` returns a query-seeded sample of known URLs after `latency` seconds."""
+
+    def __init__(self, urls: Sequence[str], latency: float = 0.0):
+        self.urls = list(urls)
+        self.latency = latency
+        self.calls = 0
+
+    def search(self, query: str, max_results: int = 5, include_domains: Optional[Sequence[str]] = None, **kwargs) -> Dict:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        pool = [u for u in self.urls if not include_domains or urlparse(u).netloc.lower() in include_domains]
+        picked = random.Random(query).sample(pool, min(max_results, len(pool)))
+        return {"query": query, "results": [{"url": u, "title": "", "content": "", "score": 1.0} for u in picked]}
+
+_budget_re = re.compile(r"(?:under|below|max)\s*(\d[\d,]*)", re.I)
+
+class FakeLLM:
+    """LLM stand-in with `call` and token-by-token `stream`; plan prompts get a SearchPlan JSON."""
+
+    model = "fake/bench"
+    api_key = None
+
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0, tokens: int = 60):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.calls = 0
+
+    def _reply(self, prompt: str) -> str:
+        if "SearchPlan" in prompt:
+            query = prompt.split("User input:", 1)[-1].split("\n", 1)[0].strip()
+            m = _budget_re.search(query)
+            return json.dumps({"query": query, "brand": None, "max_price": float(m.group(1).replace(",", "")) if m else None,
+                               "min_rating": None, "features": []})
+        return " ".join(f"word{i}" for i in range(self.tokens))
+
+    def call(self, prompt, **kwargs) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self._reply(prompt if isinstance(prompt, str) else prompt[-1]["content"])
+
+    def stream(self, prompt, **kwargs) -> Iterator[str]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        for i, word in enumerate(self._reply(prompt if isinstance(prompt, str) else prompt[-1]["content"]).split(" ")):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
@@ -1,198 +1,371 @@
 from __future__ import annotations
-import os
-from typing import List
-from crewai import Agent, Task, Crew, Process, LLM
-from pydantic import BaseModel
-from .core.models import SearchPlan, Product
+import json, math, os, queue, re, threading, time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Generator, Iterator, List, Optional, Tuple, Union
+from .core.models import (
+    SearchPlan, Product, ProductCluster, PipelineEvent, PlanReady, UrlsFound, ProductExtracted, RankingUpdated, LLMText, PipelineDone,
+)
+from .llm import make_llm, cached_llm, stream_call
+from .core import metrics
+from .core.budget import Budget
+from .core.cache import env_flag
+from .core.catalog import get_catalog
+from .core.matching import cluster_products, mentions_brand
+from .core.planner import rule_plan, apply_constraints
 from .core.ranker import rank_products
-from .tools.tavily_tool import search_products
+from .tools.tavily_tool import search_plan
+from .tools.extraction import iter_extract
 from .tools.scrapers import extract_product
+from .speculation import SpeculativeSearch
 
-def make_llm() -> LLM:
-    provider = os.getenv("LLM_PROVIDER", "openai").lower()
-    if provider == "anthropic":
-        return LLM(model=os.getenv("ANTHROPIC_MODEL","claude-3-haiku-20240307"), api_key=os.getenv("ANTHROPIC_API_KEY"))
-    if provider == "google":
-        return LLM(model=os.getenv("GOOGLE_MODEL","gemini-2.0-flash-lite"), api_key=os.getenv("GOOGLE_API_KEY"))
-    # default openai
-    return LLM(model=os.getenv("OPENAI_MODEL","gpt-4o-mini"), api_key=os.getenv("OPENAI_API_KEY"))
-
-def planner_agent(llm: LLM) -> Agent:
-    return Agent(
-        role="Shopping Planner",
-        goal="Turn user input into a precise search plan with budget, brand, features, and rating thresholds.",
-        backstory="Expert prompt engineer and retail analyst who crafts actionable search queries.",
-        llm=llm,
-        verbose=True,
-    )
+# Agent/Task/Crew definitions live in .crew and are only imported (with crewai) on demand.
+_CREW_NAMES = {
+    "planner_agent", "search_agent", "extractor_agent", "analyst_agent", "reviewer_agent", "recommender_agent",
+    "make_tasks", "build_crew", "run_crew",
+}
 
-def search_agent(llm: LLM) -> Agent:
-    return Agent(
-        role="Marketplace Searcher",
-        goal="Use Tavily to find the most relevant product URLs on Amazon.eg, Jumia, and Noon (Egypt).",
-        backstory="Specialist in web search for Egyptian marketplaces.",
-        llm=llm,
-        verbose=True,
-    )
+def __getattr__(name: str):
+    if name in _CREW_NAMES:
+        from . import crew
+        return getattr(crew, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-def extractor_agent(llm: LLM) -> Agent:
-    return Agent(
-        role="Product Extractor",
-        goal="Fetch pages and extract normalized product info (title, price EGP, rating, images).",
-        backstory="Schema.org and DOM parsing expert.",
-        llm=llm,
-        verbose=True,
-    )
+# ---- Orchestration (glue code that actually executes tools) ----
+def plan_stage(chat, user_input: str, fallback: Optional[SearchPlan] = None) -> SearchPlan:
+    plan_res = chat.call(f"User input: {user_input}\nReturn JSON for SearchPlan with keys query, brand, max_price, min_rating, features.")
+    # naive JSON extraction
+    try:
+        plan_json_str = re.search(r"{[\s\S]*}", plan_res).group(0)
+        return SearchPlan(**json.loads(plan_json_str))
+    except Exception:
+        return fallback or SearchPlan(query=user_input)
 
-def analyst_agent(llm: LLM) -> Agent:
-    return Agent(
-        role="Product Analyst",
-        goal="Compare products based on constraints and quality to shortlist top candidates.",
-        backstory="E-commerce analyst valuing quality and price fairness.",
-        llm=llm,
-        verbose=True,
-    )
+PLANS_TOTAL = metrics.counter("shopsmart_plans_total", "Search plans by source (given/rules/llm).")
 
-def reviewer_agent(llm: LLM) -> Agent:
-    return Agent(
-        role="Reviewer",
-        goal="Summarize strengths/weaknesses, tradeoffs, and who each product is for.",
-        backstory="Reads product pages and synthesizes key points for buyers.",
-        llm=llm,
-        verbose=True,
-    )
+def resolve_plan(chat, user_input: str, plan: Optional[SearchPlan] = None, constraints: Optional[Dict[str, Any]] = None,
+                 before_llm: Optional[Callable[[SearchPlan], None]] = None) -> Tuple[SearchPlan, str]:
+    """The SearchPlan for a request and where it came from.
 
-def recommender_agent(llm: LLM) -> Agent:
-    return Agent(
-        role="Recommender",
-        goal="Output a final recommendation JSON with top pick, 2 runner-ups, and reasoning.",
-        backstory="Explains choices clearly and concisely.",
-        llm=llm,
-        verbose=True,
-    )
+    A given plan is used as-is. Otherwise the rule parser runs first and the planner LLM is
+    only called when its confidence is below PLANNER_MIN_CONFIDENCE (PLANNER=llm always
+    calls it, PLANNER=rules never does). `before_llm` receives the rule plan right before
+    that call. Structured `constraints` override either result.
+    """
+    if plan is not None:
+        source = "given"
+    else:
+        mode = os.getenv("PLANNER", "auto").lower()
+        guess, confidence = rule_plan(user_input)
+        if mode == "rules" or (mode != "llm" and confidence >= float(os.getenv("PLANNER_MIN_CONFIDENCE", "0.6"))):
+            plan, source = guess, "rules"
+        else:
+            if before_llm is not None:
+                before_llm(apply_constraints(guess, constraints))
+            plan, source = plan_stage(chat, user_input, fallback=guess), "llm"
+    PLANS_TOTAL.inc(source=source)
+    return apply_constraints(plan, constraints), source
 
-# ---- Tasks ----
-def make_tasks(planner: Agent, searcher: Agent, extractor: Agent, analyst: Agent, reviewer: Agent, recommender: Agent):
-    plan_task = Task(
-        description="""
-Given the user_input, produce a JSON SearchPlan {query, brand?, max_price?, min_rating?, features[]}.
-Prefer EGP and Egypt-specific terms. Keep query short and specific.
-""",
-        expected_output="A compact JSON object for SearchPlan.",
-        agent=planner,
-        output_json=SearchPlan.model_json_schema(),  # hint
-    )
+def rank_stage(products: List[Product], plan: SearchPlan, k: int = 5) -> List[Product]:
+    return rank_products(products, plan.brand, plan.max_price, plan.min_rating, k=k)
 
-    search_task = Task(
-        description="""
-Use Tavily to search for product pages on Amazon.eg, Jumia Egypt, and Noon Egypt based on the SearchPlan.query.
-Return a Python list of up to 12 URLs.
-""",
-        expected_output="A list[str] of URLs.",
-        agent=searcher,
-    )
+def plan_search(plan: SearchPlan) -> Callable[..., List[str]]:
+    """search(query, max_results) for SpeculativeSearch: `plan`'s fan-out search with its query replaced by `query`."""
+    return lambda query, max_results=12: search_plan(plan.model_copy(update={"query": query}), max_results=max_results)
 
-    extract_task = Task(
-        description="""
-For each URL, fetch page HTML and extract normalized fields:
-title, price (EGP), rating, review_count, images.
-Return a Python list of Product dicts.
-""",
-        expected_output="A list[Product] serialized as dicts.",
-        agent=extractor,
-    )
+def satisfies(p: Product, plan: SearchPlan) -> bool:
+    """A priced product within the plan's budget, rating floor and brand."""
+    if p.price is None or (plan.max_price is not None and p.price > plan.max_price):
+        return False
+    if plan.min_rating is not None and (p.rating is None or p.rating < plan.min_rating):
+        return False
+    return not plan.brand or mentions_brand(p.title, plan.brand)
 
-    analyze_task = Task(
-        description="""
-Given extracted products and the SearchPlan constraints, rank and shortlist the best 5.
-Return the top 5 as a list of dicts.
-""",
-        expected_output="Top-5 product dicts list.",
-        agent=analyst,
-    )
+EXTRACT_SKIPPED = metrics.counter("shopsmart_extract_skipped_total", "Result pages not waited for, by reason (early_stop/deadline).")
 
-    review_task = Task(
-        description="""
-Summarize pros/cons and suitability for the shortlisted products in 5–8 concise bullet points total.
-""",
-        expected_output="A brief markdown summary string.",
-        agent=reviewer,
-    )
+def unique_products(products: List[Product]) -> List[ProductCluster]:
+    """Cluster cross-marketplace duplicates (MATCH_DEDUPE=false keeps every listing separate)."""
+    if not env_flag("MATCH_DEDUPE"):
+        return [ProductCluster(key=str(p.url), canonical=p, offers=[p]) for p in products]
+    return cluster_products(products)
 
-    recommend_task = Task(
-        description="""
-Choose the single best product for the user.
-Output JSON: {best: Product, runners_up: [Product, Product], reasoning:str}.
-""",
-        expected_output="Recommendation JSON string.",
-        agent=recommender,
-    )
+def candidates_context(ranked: List[Product]) -> str:
+    lines = []
+    for p in ranked:
+        sources = p.extra.get("sources", "")
+        where = f"{p.source} (also: {', '.join(s for s in sources.split(',') if s != p.source)})" if "," in sources else p.source
+        lines.append(f"- {p.title} | {p.price} EGP | {where}")
+    return "\n".join(lines)
 
-    return plan_task, search_task, extract_task, analyze_task, review_task, recommend_task
+def review_prompt(ctx: str) -> str:
+    return f"Summarize pros/cons and who it's for across these products:\n{ctx}\nBe concise."
 
-# ---- Orchestration (glue code that actually executes tools) ----
-def run_pipeline(user_input: str):
-    llm = make_llm()
-    planner = planner_agent(llm)
-    searcher = search_agent(llm)
-    extractor = extractor_agent(llm)
-    analyst = analyst_agent(llm)
-    reviewer = reviewer_agent(llm)
-    recommender = recommender_agent(llm)
-
-    plan_task, search_task, extract_task, analyze_task, review_task, recommend_task = make_tasks(planner, searcher, extractor, analyst, reviewer, recommender)
-
-    crew = Crew(
-        agents=[planner, searcher, extractor, analyst, reviewer, recommender],
-        tasks=[plan_task, search_task, extract_task, analyze_task, review_task, recommend_task],
-        process=Process.sequential,
-        verbose=True,
+def recommend_prompt(plan: SearchPlan, ctx: str) -> str:
+    return (
+        f"Pick the best product for: brand={plan.brand}, max_price={plan.max_price}, min_rating={plan.min_rating}, features={plan.features}.\n"
+        f"Candidates:\n{ctx}\nExplain decision in 3-5 sentences."
     )
 
-    # Step 1: plan
-    plan_res = planner.llm.call(f"User input: {user_input}\nReturn JSON for SearchPlan with keys query, brand, max_price, min_rating, features.")
-    # naive JSON extraction
-    import json, re
+def merged_prompt(plan: SearchPlan, ctx: str) -> str:
+    return (
+        f"Candidates:\n{ctx}\n\n"
+        f"1. Summarize pros/cons and who it's for across these products. Be concise.\n"
+        f"2. Pick the best product for: brand={plan.brand}, max_price={plan.max_price}, min_rating={plan.min_rating}, "
+        f"features={plan.features}. Explain decision in 3-5 sentences.\n"
+        'Return only JSON: {"summary": <answer 1>, "reasoning": <answer 2>}'
+    )
+
+def split_merged(text: str) -> Tuple[str, str]:
+    """(summary, reasoning) from a merged reply; unparsable replies become the summary."""
     try:
-        plan_json_str = re.search(r"{[\s\S]*}", plan_res).group(0)
-        plan_data = json.loads(plan_json_str)
+        data = json.loads(re.search(r"{[\s\S]*}", text).group(0))
+        return str(data.get("summary") or ""), str(data.get("reasoning") or "")
     except Exception:
-        plan_data = {"query": user_input, "brand": None, "max_price": None, "min_rating": None, "features": []}
-    plan = SearchPlan(**plan_data)
+        return text, ""
+
+_llm_pool: Optional[ThreadPoolExecutor] = None
+_llm_pool_lock = threading.Lock()
 
-    # Step 2: search with Tavily
-    urls = search_products(plan.query, max_results=12)
+def llm_pool() -> ThreadPoolExecutor:
+    """Shared threads for concurrent LLM calls (LLM_CONCURRENCY, default 8)."""
+    global _llm_pool
+    if _llm_pool is None:
+        with _llm_pool_lock:
+            if _llm_pool is None:
+                _llm_pool = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_CONCURRENCY", "8")), thread_name_prefix="llm")
+    return _llm_pool
 
-    # Step 3: extract
-    products = []
-    for u in urls:
+def _stream_into(chat, stage: str, prompt: str, out: "queue.Queue", cancel: threading.Event) -> None:
+    """Worker: push (stage, delta, None) per delta, then (stage, None, error-or-None)."""
+    try:
+        gen = stream_call(chat, prompt)
+        try:
+            for delta in gen:
+                if cancel.is_set():
+                    break
+                out.put((stage, delta, None))
+        finally:
+            gen.close()
+        out.put((stage, None, None))
+    except Exception as e:
+        out.put((stage, None, e))
+
+def narrate(chat, plan: SearchPlan, ctx: str, timeout: Optional[float] = None,
+            merge: Optional[bool] = None) -> Generator[LLMText, None, Tuple[str, str, Dict[str, str]]]:
+    """Reviewer summary and recommender reasoning, run concurrently.
+
+    Yields LLMText deltas as they arrive from either call (interleaved) and returns
+    (summary, reasoning, errors). Each call gets LLM_TIMEOUT seconds; a call that runs
+    over is cancelled at its next delta and keeps the text streamed so far. Closing the
+    generator cancels both. With merge (LLM_MERGE_REVIEW) one structured call answers both.
+    """
+    timeout = timeout if timeout is not None else float(os.getenv("LLM_TIMEOUT", "60"))
+    merge = merge if merge is not None else env_flag("LLM_MERGE_REVIEW", "false")
+    errors: Dict[str, str] = {}
+    if merge:
+        fut = llm_pool().submit(chat.call, merged_prompt(plan, ctx))
         try:
-            p = extract_product(u)
-            if p:
-                products.append(p)
-        except Exception:
-            continue
+            summary, reasoning = split_merged(fut.result(timeout=timeout))
+        except FutureTimeout:
+            fut.cancel()
+            summary, reasoning, errors = "", "", {"summary": "timeout", "reasoning": "timeout"}
+        except Exception as e:
+            summary, reasoning = "", ""
+            errors = {"summary": f"{type(e).__name__}: {e}", "reasoning": f"{type(e).__name__}: {e}"}
+        for stage, text in (("summary", summary), ("reasoning", reasoning)):
+            if text:
+                yield LLMText(stage=stage, delta=text)
+        return summary, reasoning, errors
 
-    # Step 4: rank
-    from .core.ranker import rank_products
-    ranked = rank_products(products, plan.brand, plan.max_price, plan.min_rating)[:5]
+    prompts = {"summary": review_prompt(ctx), "reasoning": recommend_prompt(plan, ctx)}
+    out: "queue.Queue" = queue.Queue()
+    cancels = {stage: threading.Event() for stage in prompts}
+    parts: Dict[str, List[str]] = {stage: [] for stage in prompts}
+    for stage, prompt in prompts.items():
+        llm_pool().submit(_stream_into, chat, stage, prompt, out, cancels[stage])
+    pending = set(prompts)
+    deadline = time.monotonic() + timeout
+    try:
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                for stage in pending:
+                    errors[stage] = "timeout"
+                break
+            try:
+                stage, delta, err = out.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if delta is None:
+                pending.discard(stage)
+                if err is not None:
+                    errors[stage] = f"{type(err).__name__}: {err}"
+                continue
+            parts[stage].append(delta)
+            yield LLMText(stage=stage, delta=delta)
+    finally:
+        for ev in cancels.values():
+            ev.set()
+    return "".join(parts["summary"]), "".join(parts["reasoning"]), errors
 
-    # Step 5: review (LLM summarization over titles/price)
-    ctx = "\n".join([f"- {p.title} | {p.price} EGP | {p.source}" for p in ranked])
-    summary = reviewer.llm.call(f"Summarize pros/cons and who it's for across these products:\n{ctx}\nBe concise.")
+def narrate_all(chat, plan: SearchPlan, ctx: str, **kwargs) -> Tuple[str, str, Dict[str, str]]:
+    """Blocking form of narrate: (summary, reasoning, errors)."""
+    gen = narrate(chat, plan, ctx, **kwargs)
+    while True:
+        try:
+            next(gen)
+        except StopIteration as done:
+            return done.value
 
-    # Step 6: recommend
+def build_result(plan: SearchPlan, urls: List[str], products: List[Product], ranked: List[Product], summary: str, reasoning: str,
+                 clusters: Optional[List[ProductCluster]] = None, timings: Optional[Dict[str, float]] = None,
+                 errors: Optional[Dict[str, str]] = None, skipped: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
     best = ranked[0].model_dump() if ranked else None
     runners = [p.model_dump() for p in ranked[1:3]]
-    reasoning = recommender.llm.call(
-        f"Pick the best product for: brand={plan.brand}, max_price={plan.max_price}, min_rating={plan.min_rating}, features={plan.features}.\n"
-        f"Candidates:\n{ctx}\nExplain decision in 3-5 sentences."
-    )
     return {
         "plan": plan.model_dump(),
         "urls": urls,
         "products": [p.model_dump() for p in products],
+        "clusters": [c.model_dump() for c in clusters or []],
         "top5": [p.model_dump() for p in ranked],
         "summary": summary,
-        "recommendation": {"best": best, "runners_up": runners, "reasoning": reasoning}
+        "recommendation": {"best": best, "runners_up": runners, "reasoning": reasoning},
+        "timings": timings or {},
+        "errors": errors or {},
+        "skipped": skipped or [],
     }
+
+def iter_pipeline(user_input: str, max_workers: Optional[int] = None, per_domain: Union[int, Dict[str, int], None] = None,
+                  cache_bypass: Optional[bool] = None, plan: Optional[SearchPlan] = None,
+                  constraints: Optional[Dict[str, Any]] = None, budget: Optional[Budget] = None) -> Iterator[PipelineEvent]:
+    """Run the pipeline, yielding typed events as each stage makes progress.
+
+    Order: PlanReady, UrlsFound, then ProductExtracted per page (completion order) interleaved
+    with provisional RankingUpdated whenever the top-5 changes, a final RankingUpdated,
+    LLMText deltas for the summary and the reasoning (generated concurrently, so the two
+    stages interleave), and PipelineDone with the same
+    dict run_pipeline returns. result["timings"] holds milliseconds per stage (wall time,
+    so it includes time the consumer spends between events).
+
+    `plan` skips planning entirely; `constraints` (brand, max_price, min_rating, features)
+    are applied on top of whatever plan the rules or the LLM produce. While the planner LLM
+    runs, a speculative search (and the first extractions) can start on the rule parser's
+    query (SPECULATIVE_SEARCH); its URLs are used when the planned query is close enough.
+
+    `budget` (default: PIPELINE_DEADLINE / STAGE_BUDGETS) bounds extraction and the LLM
+    calls. Extraction also stops once the top-5 is filled with products that satisfy the
+    plan and has not changed for EARLY_STOP_STABLE pages (EARLY_STOP); pages not waited
+    for are listed in result["skipped"] with the reason.
+    """
+    budget = budget or Budget()
+    trace = metrics.Trace()
+    chat = cached_llm(make_llm(), bypass=cache_bypass)
+
+    # Step 1: plan (overlapped with a speculative search when the LLM planner is needed)
+    spec: Optional[SpeculativeSearch] = None
+
+    def speculate(guess: SearchPlan) -> None:
+        nonlocal spec
+        if env_flag("SPECULATIVE_SEARCH"):
+            spec = SpeculativeSearch(guess.query, plan_search(guess), extract_product)
+
+    with trace.span("plan"):
+        plan, plan_source = resolve_plan(chat, user_input, plan, constraints, before_llm=speculate)
+    yield PlanReady(plan=plan, source=plan_source)
+
+    # Step 2: answer from the local catalog when it has enough fresh matches, else fan out Tavily searches
+    catalog = get_catalog()
+    max_age = float(os.getenv("CATALOG_MAX_AGE", "21600"))
+    with trace.span("search"):
+        local = catalog.search(plan, limit=12, max_age=max_age) if catalog else []
+        if len(local) >= int(os.getenv("CATALOG_MIN_RESULTS", "8")):
+            urls = [str(p.url) for p in local]
+            known = dict(zip(urls, local))
+            if spec is not None:
+                spec.cancel()
+        else:
+            urls = spec.resolve(plan.query)[0] if spec is not None else None
+            if urls is None:
+                urls = search_plan(plan, max_results=12, timeout=budget.timeout("search"))
+            known = catalog.fresh(urls, max_age) if catalog else {}
+    yield UrlsFound(urls=urls)
+
+    # Step 3: extract the gaps (concurrently, capped per marketplace), re-ranking as products arrive
+    slots: List[Optional[Product]] = [None] * len(urls)
+    seen: List[bool] = [False] * len(urls)
+    top: List[Product] = []
+    stable = 0
+    early_stop = env_flag("EARLY_STOP")
+    stable_needed = int(os.getenv("EARLY_STOP_STABLE", "2"))
+
+    def progress(i: int, u: str, p: Optional[Product]) -> Iterator[PipelineEvent]:
+        nonlocal top, stable
+        slots[i], seen[i] = p, True
+        yield ProductExtracted(index=i, url=u, product=p)
+        stable += 1
+        if p is None:
+            return
+        provisional = rank_stage([c.canonical for c in unique_products([x for x in slots if x])], plan)
+        if [str(x.url) for x in provisional] != [str(x.url) for x in top]:
+            top, stable = provisional, 0
+            yield RankingUpdated(top=provisional)
+
+    def settled() -> bool:
+        return early_stop and len(top) >= 5 and stable >= stable_needed and all(satisfies(p, plan) for p in top)
+
+    with trace.span("extract"):
+        deadline = budget.deadline("extract")
+        for i, u in enumerate(urls):
+            if u in known:
+                yield from progress(i, u, known[u])
+        # pages the speculative run already started: finished ones now, in-flight ones after the rest
+        started = {u: f for u, f in (spec.products() if spec else {}).items() if u not in known and not f.cancelled()}
+        later = []
+        for i, u in enumerate(urls):
+            if u in started:
+                if started[u].done():
+                    yield from progress(i, u, started[u].result())
+                else:
+                    later.append(i)
+        todo = [i for i, u in enumerate(urls) if u not in known and u not in started]
+        for j, u, p in iter_extract([urls[i] for i in todo], max_workers=max_workers, per_domain=per_domain,
+                                    deadline=deadline, stop=settled):
+            yield from progress(todo[j], u, p)
+        for i in later:
+            if settled():
+                break
+            try:
+                p = started[urls[i]].result(timeout=None if math.isinf(deadline) else max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                continue
+            yield from progress(i, urls[i], p)
+        reason = "early_stop" if settled() else "deadline"
+        skipped = [{"url": u, "reason": reason} for i, u in enumerate(urls) if not seen[i]]
+        if skipped:
+            EXTRACT_SKIPPED.inc(len(skipped), reason=reason)
+        products = [p for p in slots if p]
+        if catalog is not None:
+            catalog.bulk_upsert([slots[i] for i, u in enumerate(urls) if u not in known and slots[i]])
+            catalog.record_hits([str(p.url) for p in products])
+
+    # Step 4: merge cross-marketplace duplicates, then rank unique items
+    with trace.span("rank"):
+        clusters = unique_products(products)
+        ranked = rank_stage([c.canonical for c in clusters], plan)
+    yield RankingUpdated(top=ranked, final=True)
+
+    # Steps 5+6: review and recommend concurrently (both only need the ranking and the plan)
+    with trace.span("narrate"):
+        timeout = budget.timeout("narrate", float(os.getenv("LLM_TIMEOUT", "60")))
+        summary, reasoning, errors = yield from narrate(chat, plan, candidates_context(ranked), timeout=timeout)
+    yield PipelineDone(result=build_result(plan, urls, products, ranked, summary, reasoning, clusters, trace.as_dict(), errors,
+                                           skipped))
+
+def run_pipeline(user_input: str, max_workers: Optional[int] = None, per_domain: Union[int, Dict[str, int], None] = None,
+                 cache_bypass: Optional[bool] = None, plan: Optional[SearchPlan] = None,
+                 constraints: Optional[Dict[str, Any]] = None, budget: Optional[Budget] = None) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    for event in iter_pipeline(user_input, max_workers=max_workers, per_domain=per_domain, cache_bypass=cache_bypass,
+                               plan=plan, constraints=constraints, budget=budget):
+        if isinstance(event, PipelineDone):
+            result = event.result
+    return result
@@ -0,0 +1,261 @@
+"""Voice input: buffer WebRTC audio frames in memory, cut utterances, hand them to a recognizer.
+
+    voice = VoiceSession()                  # one per Streamlit session
+    voice.push_frames(frames)               # av.AudioFrame batches from the WebRTC receiver
+    for text in voice.transcribe():         # recognized text of each finished utterance
+        ...
+
+Frames are downmixed and resampled to 16 kHz mono float32 into a preallocated ring buffer;
+an energy VAD finds utterance boundaries as audio arrives. Utterances go to the recognizer
+as an in-memory WAV / speech_recognition.AudioData, with no temp files.
+"""
+from __future__ import annotations
+import io
+import os
+import threading
+import wave
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol
+
+import numpy as np
+
+RATE = 16000
+
+def to_float(samples: np.ndarray) -> np.ndarray:
+    """PCM samples of any integer or float dtype as float32 in [-1, 1]."""
+    if samples.dtype.kind == "f":
+        return samples.astype(np.float32, copy=False)
+    info = np.iinfo(samples.dtype)
+    if info.min == 0:  # unsigned (u8) PCM is offset by half the range
+        return ((samples.astype(np.float32) - (info.max + 1) / 2) / ((info.max + 1) / 2)).astype(np.float32)
+    return (samples.astype(np.float32) / -float(info.min)).astype(np.float32)
+
+def downmix(samples: np.ndarray, channels: int, planar: bool = False) -> np.ndarray:
+    """Average channels into mono: planar is (channels, n), packed is interleaved (1, n * channels) or flat."""
+    x = to_float(np.asarray(samples))
+    if channels <= 1:
+        return x.reshape(-1)
+    if planar:
+        return x.reshape(channels, -1).mean(axis=0)
+    return x.reshape(-1, channels).mean(axis=1)
+
+def resample(x: np.ndarray, src_rate: int, dst_rate: int = RATE) -> np.ndarray:
+    """Linear-interpolation resampling (plenty for speech recognition), vectorized with np.interp."""
+    if src_rate == dst_rate or len(x) == 0:
+        return x.astype(np.float32, copy=False)
+    n = int(round(len(x) * dst_rate / src_rate))
+    t = np.arange(n, dtype=np.float64) * (src_rate / dst_rate)
+    return np.interp(t, np.arange(len(x), dtype=np.float64), x).astype(np.float32)
+
+class RingBuffer:
+    """Fixed-size float32 sample buffer addressed by absolute sample position.
+
+    `total` counts every sample ever written; positions older than `total - capacity`
+    have been overwritten and reads clip to what is still held.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buf = np.zeros(capacity, dtype=np.float32)
+        self.total = 0
+
+    @property
+    def oldest(self) -> int:
+        return max(0, self.total - self.capacity)
+
+    def write(self, x: np.ndarray) -> None:
+        self.total += len(x)  # every sample advances the clock, even ones overwritten straight away
+        x = x[-self.capacity:]
+        start = (self.total - len(x)) % self.capacity
+        first = min(len(x), self.capacity - start)
+        self.buf[start:start + first] = x[:first]
+        self.buf[:len(x) - first] = x[first:]
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """Copy of samples [start, end) (absolute positions), clipped to those still buffered."""
+        start, end = max(start, self.oldest), min(end, self.total)
+        if end <= start:
+            return np.zeros(0, dtype=np.float32)
+        a, b = start % self.capacity, end % self.capacity
+        if a < b or (b == 0 and a > 0):
+            return self.buf[a:b or self.capacity].copy()
+        return np.concatenate([self.buf[a:], self.buf[:b]])
+
+def to_pcm16(x: np.ndarray) -> bytes:
+    return (np.clip(x, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+def to_wav_bytes(x: np.ndarray, rate: int = RATE) -> bytes:
+    """Mono 16-bit WAV file contents, built in memory."""
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(to_pcm16(x))
+    return out.getvalue()
+
+def to_audio_data(x: np.ndarray, rate: int = RATE) -> Any:
+    """speech_recognition.AudioData for float samples (no file round-trip)."""
+    import speech_recognition as sr
+    return sr.AudioData(to_pcm16(x), rate, 2)
+
+class EnergyVAD:
+    """Frame-energy voice activity detector with an adaptive noise floor.
+
+    A frame is speech when its RMS exceeds max(min_rms, ratio x noise floor). An utterance
+    starts on the first speech frame and ends after `silence_ms` without one; it is cut at
+    `max_seconds`, and ones shorter than `min_ms` of speech are dropped.
+    """
+
+    def __init__(self, rate: int = RATE, frame_ms: int = 20, min_rms: Optional[float] = None, ratio: float = 3.0,
+                 silence_ms: Optional[int] = None, min_ms: int = 250, max_seconds: float = 15.0, pad_ms: int = 200):
+        self.rate = rate
+        self.frame = rate * frame_ms // 1000
+        self.min_rms = min_rms if min_rms is not None else float(os.getenv("VOICE_VAD_MIN_RMS", "0.01"))
+        self.ratio = ratio
+        self.silence_frames = (silence_ms if silence_ms is not None else int(os.getenv("VOICE_SILENCE_MS", "600"))) // frame_ms
+        self.min_frames = max(1, min_ms // frame_ms)
+        self.max_frames = int(max_seconds * 1000 / frame_ms)
+        self.pad = rate * pad_ms // 1000
+        self.noise = self.min_rms / ratio
+        self.pos = 0           # absolute sample position analysed so far
+        self.start: Optional[int] = None
+        self.voiced = 0
+        self.quiet = 0
+
+    def process(self, ring: RingBuffer) -> List[tuple]:
+        """Analyse whole frames written since the last call; (start, end) sample ranges of finished utterances."""
+        n = (ring.total - self.pos) // self.frame
+        if n <= 0:
+            return []
+        frames = ring.read(self.pos, self.pos + n * self.frame)
+        base = self.pos
+        self.pos += n * self.frame
+        if len(frames) < n * self.frame:  # fell behind the ring; skip what was overwritten
+            base = self.pos - len(frames) // self.frame * self.frame
+            frames = frames[-(len(frames) // self.frame * self.frame):] if len(frames) >= self.frame else frames[:0]
+        rms = np.sqrt(np.mean(frames.reshape(-1, self.frame) ** 2, axis=1)) if len(frames) else np.zeros(0)
+        out = []
+        for k, level in enumerate(rms.tolist()):
+            at = base + k * self.frame
+            speech = level > max(self.min_rms, self.noise * self.ratio)
+            if self.start is None:
+                if speech:
+                    self.start, self.voiced, self.quiet = at, 1, 0
+                else:
+                    self.noise = 0.95 * self.noise + 0.05 * level
+                continue
+            self.voiced += speech
+            self.quiet = 0 if speech else self.quiet + 1
+            length = (at + self.frame - self.start) // self.frame
+            if self.quiet >= self.silence_frames or length >= self.max_frames:
+                end = at + self.frame * (1 - self.quiet)  # end of the last speech frame
+                if self.voiced >= self.min_frames:
+                    out.append((self.start - self.pad, end + self.pad))
+                self.start = None
+        return out
+
+    def flush(self) -> List[tuple]:
+        """End the utterance in progress (e.g. when the microphone stops)."""
+        if self.start is None:
+            return []
+        start, voiced = self.start, self.voiced
+        self.start = None
+        return [(start - self.pad, self.pos)] if voiced >= self.min_frames else []
+
+class SpeechBackend(Protocol):
+    def recognize(self, audio: Any, language: str) -> str: ...
+
+class GoogleBackend:
+    """Google Web Speech API via speech_recognition (network)."""
+
+    def recognize(self, audio: Any, language: str) -> str:
+        import speech_recognition as sr
+        return sr.Recognizer().recognize_google(audio, language=language)
+
+class SphinxBackend:
+    """CMU PocketSphinx via speech_recognition: fully local, needs the pocketsphinx package."""
+
+    def recognize(self, audio: Any, language: str) -> str:
+        import speech_recognition as sr
+        return sr.Recognizer().recognize_sphinx(audio, language=language)
+
+class WhisperBackend:
+    """Local Whisper model via speech_recognition: needs openai-whisper (VOICE_WHISPER_MODEL, default base)."""
+
+    def recognize(self, audio: Any, language: str) -> str:
+        import speech_recognition as sr
+        return sr.Recognizer().recognize_whisper(audio, model=os.getenv("VOICE_WHISPER_MODEL", "base"),
+                                                 language=language.split("-")[0].lower() or None)
+
+_backends: Dict[str, Callable[[], SpeechBackend]] = {"google": GoogleBackend, "sphinx": SphinxBackend, "whisper": WhisperBackend}
+
+def register_recognizer(name: str, factory: Callable[[], SpeechBackend]) -> None:
+    """Make a recognizer backend selectable by name (VOICE_RECOGNIZER)."""
+    _backends[name] = factory
+
+def get_recognizer(name: Optional[str] = None) -> SpeechBackend:
+    name = (name or os.getenv("VOICE_RECOGNIZER", "google")).lower()
+    if name not in _backends:
+        raise ValueError(f"unknown VOICE_RECOGNIZER {name!r}; choose from {', '.join(sorted(_backends))}")
+    return _backends[name]()
+
+class VoiceSession:
+    """Per-session audio ingestion: ring buffer + VAD + recognizer. Safe to feed from one thread and read from another."""
+
+    def __init__(self, rate: int = RATE, buffer_seconds: float = 30.0, vad: Optional[EnergyVAD] = None,
+                 recognizer: Optional[SpeechBackend] = None, language: Optional[str] = None):
+        self.rate = rate
+        self.ring = RingBuffer(int(rate * buffer_seconds))
+        self.vad = vad or EnergyVAD(rate)
+        self.recognizer = recognizer
+        self.language = language or os.getenv("VOICE_LANGUAGE", "en-US")
+        self._ready: List[np.ndarray] = []
+        self._lock = threading.Lock()
+        self.errors: List[str] = []
+
+    def push(self, samples: np.ndarray, rate: int, channels: int = 1, planar: bool = False) -> None:
+        """Add raw samples (any PCM dtype, interleaved unless `planar`) captured at `rate`."""
+        x = resample(downmix(samples, channels, planar), rate, self.rate)
+        with self._lock:
+            self.ring.write(x)
+            for start, end in self.vad.process(self.ring):
+                self._ready.append(self.ring.read(start, end))
+
+    def push_frames(self, frames: Iterable[Any]) -> None:
+        """Add av.AudioFrame objects (what streamlit-webrtc's audio receiver returns)."""
+        chunks, fmt = [], None
+        for f in frames:
+            key = (f.sample_rate, len(f.layout.channels), f.format.is_planar)
+            if fmt is not None and key != fmt:
+                self.push(np.concatenate(chunks, axis=-1), *fmt)
+                chunks = []
+            fmt = key
+            chunks.append(f.to_ndarray())
+        if chunks:
+            self.push(np.concatenate(chunks, axis=-1), *fmt)
+
+    def flush(self) -> None:
+        with self._lock:
+            for start, end in self.vad.flush():
+                self._ready.append(self.ring.read(start, end))
+
+    def utterances(self) -> List[np.ndarray]:
+        """Finished utterances (16 kHz mono float32) since the last call."""
+        with self._lock:
+            ready, self._ready = self._ready, []
+        return ready
+
+    def transcribe(self) -> List[str]:
+        """Recognize each finished utterance; failures are kept in `errors` and skipped, unintelligible audio dropped."""
+        backend = self.recognizer or get_recognizer()
+        texts = []
+        for x in self.utterances():
+            try:
+                text = backend.recognize(to_audio_data(x, self.rate), self.language)
+            except Exception as e:  # RequestError, missing backend package...
+                if type(e).__name__ != "UnknownValueError":  # noise the recognizer couldn't make out
+                    self.errors.append(f"{type(e).__name__}: {e}")
+                continue
+            if text:
+                texts.append(text)
+        return texts
@@ -0,0 +1,166 @@
+"""Batch runner: precompute recommendations for many queries.
+
+    python -m shopsmart.batch queries.jsonl -o results.jsonl --concurrency 8
+
+Input lines are {"id": ..., "query": ...} objects or bare JSON strings (id = line number).
+Each result is appended to the output as soon as its query finishes; rerunning with the same
+output skips ids that already have a result, so a crashed batch resumes where it stopped.
+Product URLs shared between queries are fetched and extracted once per batch.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from .agents import resolve_plan, rank_stage, unique_products, candidates_context, narrate_all, build_result
+from .core import metrics
+from .core.catalog import get_catalog
+from .core.models import Product
+from .core.utils import product_key
+from .llm import make_llm, cached_llm
+from .tools.scrapers import extract_product
+from .tools.tavily_tool import search_plan
+
+def read_queries(path: str) -> Iterator[Tuple[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                yield str(n), item
+            else:
+                yield str(item.get("id", n)), item["query"]
+
+def completed_ids(path: str) -> Set[str]:
+    """Ids already written successfully to `path` (a torn last line from a crash is ignored)."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in rec:
+                done.add(str(rec["id"]))
+    return done
+
+class BatchRunner:
+    def __init__(self, output: str, concurrency: int = 8, extract_workers: int = 16, summaries: bool = True):
+        self.output = output
+        self.concurrency = max(1, concurrency)
+        self.summaries = summaries
+        self._extract_pool = ThreadPoolExecutor(max_workers=max(1, extract_workers), thread_name_prefix="batch-extract")
+        self._pages: Dict[str, Future] = {}
+        self._pages_lock = threading.Lock()
+        self._out_lock = threading.Lock()
+        self.url_refs = 0
+        self.done = 0
+        self.failed = 0
+
+    def _safe_extract(self, url: str) -> Optional[Product]:
+        try:
+            return extract_product(url)
+        except Exception:
+            return None
+
+    def extract_shared(self, url: str) -> Future:
+        """One extraction per product (utils.product_key) per batch; later callers share the same future."""
+        key = product_key(url)
+        with self._pages_lock:
+            self.url_refs += 1
+            fut = self._pages.get(key)
+            if fut is None:
+                fut = self._pages[key] = self._extract_pool.submit(self._safe_extract, url)
+            return fut
+
+    def run_query(self, qid: str, query: str) -> Dict[str, Any]:
+        trace = metrics.Trace()
+        chat = cached_llm(make_llm())
+        with trace.span("plan"):
+            plan, _ = resolve_plan(chat, query)
+        with trace.span("search"):
+            urls = search_plan(plan, max_results=12)
+        with trace.span("extract"):
+            futures = [self.extract_shared(u) for u in urls]
+            products: List[Product] = [p for p in (f.result() for f in futures) if p]
+            catalog = get_catalog()
+            if catalog is not None:
+                catalog.bulk_upsert(products)
+        with trace.span("rank"):
+            clusters = unique_products(products)
+            ranked = rank_stage([c.canonical for c in clusters], plan)
+        summary = reasoning = ""
+        errors: Dict[str, str] = {}
+        if self.summaries and ranked:
+            with trace.span("narrate"):
+                summary, reasoning, errors = narrate_all(chat, plan, candidates_context(ranked))
+        result = build_result(plan, urls, products, ranked, summary, reasoning, clusters, trace.as_dict(), errors)
+        return {"id": qid, "query": query, **result}
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        with self._out_lock, open(self.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+
+    def run(self, queries: Iterator[Tuple[str, str]]) -> Dict[str, float]:
+        skip = completed_ids(self.output)
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-query") as pool:
+            running: Dict[Future, Tuple[str, str]] = {}
+
+            def drain() -> None:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    qid, query = running.pop(fut)
+                    try:
+                        self._write(fut.result())
+                        self.done += 1
+                    except Exception as e:
+                        self._write({"id": qid, "query": query, "error": f"{type(e).__name__}: {e}"})
+                        self.failed += 1
+
+            for qid, query in queries:
+                if qid in skip:
+                    continue
+                # keep a bounded window of queries in flight so huge inputs stream through
+                while len(running) >= self.concurrency * 2:
+                    drain()
+                running[pool.submit(self.run_query, qid, query)] = (qid, query)
+            while running:
+                drain()
+        self._extract_pool.shutdown(wait=True)
+        elapsed = time.perf_counter() - t0
+        return {
+            "queries": self.done,
+            "failed": self.failed,
+            "skipped": len(skip),
+            "seconds": round(elapsed, 2),
+            "queries_per_minute": round(self.done * 60 / elapsed, 2) if elapsed else 0.0,
+            "url_refs": self.url_refs,
+            "pages_extracted": len(self._pages),
+        }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m shopsmart.batch", description="Run the pipeline over a JSONL file of queries.")
+    ap.add_argument("queries", help="input JSONL: {\"id\", \"query\"} objects or bare strings")
+    ap.add_argument("-o", "--output", required=True, help="output JSONL (appended; existing ids are skipped)")
+    ap.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "8")), help="queries in flight")
+    ap.add_argument("--extract-workers", type=int, default=int(os.getenv("BATCH_EXTRACT_WORKERS", "16")), help="shared page extraction threads")
+    ap.add_argument("--no-summaries", action="store_true", help="skip the reviewer/recommender LLM calls")
+    args = ap.parse_args(argv)
+    metrics.start_server()
+    runner = BatchRunner(args.output, concurrency=args.concurrency, extract_workers=args.extract_workers, summaries=not args.no_summaries)
+    stats = runner.run(read_queries(args.queries))
+    print(json.dumps(stats), file=sys.stderr)
+    return 0 if not stats["failed"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
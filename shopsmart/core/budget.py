@@ -0,0 +1,43 @@
+from __future__ import annotations
+import math
+import os
+import time
+from typing import Dict, Optional
+
+def _parse_budgets(raw: str) -> Dict[str, float]:
+    """Parse STAGE_BUDGETS: "extract=15,narrate=20" (seconds per stage)."""
+    out = {}
+    for part in (raw or "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip().lower()] = float(v)
+    return out
+
+class Budget:
+    """Latency budget for one pipeline run: an overall deadline plus optional per-stage caps.
+
+    A stage gets whichever ends first: its own cap (counted from when it starts) or the
+    overall deadline. `total` <= 0 means no overall deadline.
+    """
+
+    def __init__(self, total: Optional[float] = None, stages: Optional[Dict[str, float]] = None):
+        total = total if total is not None else float(os.getenv("PIPELINE_DEADLINE", "40"))
+        self.start = time.monotonic()
+        self.end = self.start + total if total > 0 else math.inf
+        self.stages = stages if stages is not None else _parse_budgets(os.getenv("STAGE_BUDGETS", "extract=15"))
+
+    def remaining(self) -> float:
+        return self.end - time.monotonic()
+
+    def deadline(self, stage: str) -> float:
+        """Absolute time.monotonic() by which `stage`, starting now, must finish (inf when unbounded)."""
+        cap = self.stages.get(stage)
+        return min(self.end, time.monotonic() + cap) if cap is not None else self.end
+
+    def timeout(self, stage: str, default: Optional[float] = None) -> Optional[float]:
+        """Seconds `stage` may take from now (never negative), or `default` when nothing bounds it."""
+        left = self.deadline(stage) - time.monotonic()
+        if math.isinf(left):
+            return default
+        left = max(0.0, left)
+        return min(left, default) if default is not None else left
@@ -0,0 +1,175 @@
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+from . import metrics
+from .models import Product
+from .utils import product_key
+
+def cache_dir() -> str:
+    path = os.path.expanduser(os.getenv("SHOPSMART_CACHE_DIR", "~/.cache/shopsmart"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def env_flag(name: str, default: str = "true") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "y")
+
+class SqliteCache:
+    """Small key/value store on SQLite with per-read max-age and size-bounded LRU eviction.
+
+    Values are bytes; callers decide encoding. `max_bytes` bounds the sum of stored value
+    sizes, evicting least-recently-read entries first. Hit/miss counters are per instance.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at)")
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Tuple[bytes, float]]:
+        """Return (value, stored_at) or None when missing or older than max_age seconds."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (max_age is not None and now - row[1] > max_age):
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0], row[1]
+
+    def set(self, key: str, value: bytes, stored_at: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, stored_at, accessed_at, size) VALUES (?, ?, ?, ?, ?)",
+                (key, value, stored_at or now, now, len(value)),
+            )
+            self._total += len(value) - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+
+    def keys(self, prefix: str = "", max_age: Optional[float] = None) -> List[str]:
+        """Keys starting with `prefix`, optionally only those newer than max_age seconds."""
+        cutoff = time.time() - max_age if max_age is not None else 0
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key FROM entries WHERE key >= ? AND key < ? AND stored_at >= ?",
+                (prefix, prefix + "\uffff", cutoff),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            row = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total -= row[0]
+
+    def _evict(self, target: int) -> None:
+        rows = self._db.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall()
+        drop = []
+        for key, size in rows:
+            if self._total <= target:
+                break
+            drop.append((key,))
+            self._total -= size
+        self._db.executemany("DELETE FROM entries WHERE key = ?", drop)
+        self.evictions += len(drop)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self._total,
+        }
+
+class PageCache:
+    """Raw HTML (zlib-compressed) and parsed Product records keyed by product key (utils.product_key).
+
+    Price-bearing fields go stale after `price_ttl`; title/images stay usable until
+    `static_ttl`, so a re-extraction can backfill them and a failed fetch can still serve
+    a record (flagged extra["stale"]="true").
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None,
+                 price_ttl: Optional[float] = None, static_ttl: Optional[float] = None):
+        self.store = SqliteCache(
+            path or os.path.join(cache_dir(), "pages.sqlite"),
+            max_bytes=max_bytes or int(os.getenv("PAGE_CACHE_MAX_MB", "256")) * 1024 * 1024,
+        )
+        self.price_ttl = price_ttl if price_ttl is not None else float(os.getenv("PAGE_CACHE_PRICE_TTL", "3600"))
+        self.static_ttl = static_ttl if static_ttl is not None else float(os.getenv("PAGE_CACHE_STATIC_TTL", str(7 * 86400)))
+
+    def get_html(self, url: str) -> Optional[str]:
+        row = self.store.get("html:" + product_key(url), max_age=self.price_ttl)
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def put_html(self, url: str, html: str) -> None:
+        self.store.set("html:" + product_key(url), zlib.compress(html.encode("utf-8"), 6))
+
+    def get_product(self, url: str) -> Tuple[Optional[Product], bool]:
+        """Return (product, price_fresh); product is None once even static fields expired."""
+        row = self.store.get("product:" + product_key(url), max_age=self.static_ttl)
+        if row is None:
+            return None, False
+        return Product.model_validate_json(row[0]), time.time() - row[1] <= self.price_ttl
+
+    def put_product(self, url: str, product: Product) -> None:
+        self.store.set("product:" + product_key(url), product.model_dump_json().encode("utf-8"))
+
+    def stats(self) -> Dict[str, float]:
+        return self.store.stats()
+
+def merge_static(fresh: Product, cached: Optional[Product]) -> Product:
+    """Backfill static fields the fresh parse missed from a cached record."""
+    if cached is None:
+        return fresh
+    update = {}
+    if (not fresh.title or fresh.title == "Unknown") and cached.title:
+        update["title"] = cached.title
+    if not fresh.images and cached.images:
+        update["images"] = cached.images
+    return fresh.model_copy(update=update) if update else fresh
+
+_page_cache: Optional[PageCache] = None
+_page_cache_lock = threading.Lock()
+
+def get_page_cache() -> Optional[PageCache]:
+    """Process-wide page cache, or None when PAGE_CACHE is disabled."""
+    global _page_cache
+    if not env_flag("PAGE_CACHE"):
+        return None
+    if _page_cache is None:
+        with _page_cache_lock:
+            if _page_cache is None:
+                _page_cache = PageCache()
+    return _page_cache
+
+def set_page_cache(cache: Optional[PageCache]) -> None:
+    global _page_cache
+    _page_cache = cache
+
+metrics.register_cache("page", lambda: _page_cache.stats() if _page_cache is not None else None)
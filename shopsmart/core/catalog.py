@@ -0,0 +1,200 @@
+from __future__ import annotations
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from .cache import cache_dir, env_flag
+from .matching import brand_of, title_tokens
+from .models import Product, SearchPlan
+from .utils import product_key
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT NOT NULL,
+    brand TEXT,
+    price REAL,
+    rating REAL,
+    review_count INTEGER,
+    source TEXT,
+    fetched_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS products_fetched ON products(fetched_at);
+"""
+# external-content index over products, addressed by rowid and kept in sync by triggers
+_FTS_SCHEMA = """
+DROP TRIGGER IF EXISTS products_ai;
+DROP TRIGGER IF EXISTS products_ad;
+DROP TRIGGER IF EXISTS products_au;
+DROP TABLE IF EXISTS products_fts;
+CREATE VIRTUAL TABLE products_fts USING fts5(title, brand, content='products', content_rowid='rowid', tokenize='unicode61');
+CREATE TRIGGER products_ai AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts (rowid, title, brand) VALUES (new.rowid, new.title, new.brand);
+END;
+CREATE TRIGGER products_ad AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, title, brand) VALUES ('delete', old.rowid, old.title, old.brand);
+END;
+CREATE TRIGGER products_au AFTER UPDATE OF title, brand ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, title, brand) VALUES ('delete', old.rowid, old.title, old.brand);
+    INSERT INTO products_fts (rowid, title, brand) VALUES (new.rowid, new.title, new.brand);
+END;
+INSERT INTO products_fts (products_fts) VALUES ('rebuild');
+"""
+
+# words that describe the budget/marketplace rather than the product
+_STOPWORDS = {"under", "below", "less", "than", "max", "egp", "le", "pounds", "price", "with", "for", "and", "the",
+              "best", "cheap", "buy", "in", "egypt", "amazon", "jumia", "noon", "stars", "star", "rating", "rated"}
+_word_re = re.compile(r"\w+", re.UNICODE)
+
+def fts_query(text: str) -> str:
+    """AND of quoted prefix terms; bare numbers (budgets) and filler words are dropped."""
+    terms = []
+    for w in _word_re.findall(text.lower()):
+        if w in _STOPWORDS or w.isdigit() or len(w) < 2:
+            continue
+        terms.append(f'"{w}"*')
+    return " AND ".join(terms)
+
+class Catalog:
+    """Persistent product catalog (SQLite + FTS5) keyed by product key (ASIN / SKU / catalog ID).
+
+    Every extracted Product is upserted with its fetch time; `search` answers a SearchPlan
+    from the index (full-text match on title/brand plus price, rating and freshness filters).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(cache_dir(), "catalog.sqlite")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        cols = {r[1] for r in self._db.execute("PRAGMA table_info(products)")}
+        if "hits" not in cols:  # catalogs created before popularity tracking
+            self._db.execute("ALTER TABLE products ADD COLUMN hits INTEGER NOT NULL DEFAULT 0")
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            self._rekey()
+        if version < 2:  # the index used to be a standalone FTS table looked up by key
+            self._db.executescript(_FTS_SCHEMA)
+        self._db.execute("PRAGMA user_version = 2")
+
+    def _rekey(self) -> None:
+        """Move rows of catalogs keyed by canonical URL to their product key; URL variants collapse into one.
+
+        Runs before the full-text index is rebuilt, so only products is touched.
+        """
+        for key, url in self._db.execute("SELECT key, url FROM products").fetchall():
+            new = product_key(url)
+            if new != key:
+                self._db.execute("UPDATE OR REPLACE products SET key = ? WHERE key = ?", (new, key))
+
+    def _rows(self, products: Iterable[Product], fetched_at: Optional[float]):
+        now = fetched_at or time.time()
+        for p in products:
+            key = p.key
+            yield (key, str(p.url), p.title, brand_of(title_tokens(p.title)), p.price, p.rating, p.review_count,
+                   p.source, now, p.model_dump_json())
+
+    def bulk_upsert(self, products: Iterable[Product], fetched_at: Optional[float] = None) -> int:
+        rows = list(self._rows(products, fetched_at))
+        if not rows:
+            return 0
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT INTO products (key, url, title, brand, price, rating, review_count, source, fetched_at, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET url=excluded.url, "
+                    "title=excluded.title, brand=excluded.brand, price=excluded.price, rating=excluded.rating, "
+                    "review_count=excluded.review_count, source=excluded.source, fetched_at=excluded.fetched_at, data=excluded.data",
+                    rows,
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def upsert(self, product: Product, fetched_at: Optional[float] = None) -> None:
+        self.bulk_upsert([product], fetched_at)
+
+    def get(self, url: str, max_age: Optional[float] = None) -> Optional[Product]:
+        with self._lock:
+            row = self._db.execute("SELECT data, fetched_at FROM products WHERE key = ?", (product_key(url),)).fetchone()
+        if row is None or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+        return Product.model_validate_json(row[0])
+
+    def fresh(self, urls: Iterable[str], max_age: Optional[float] = None) -> Dict[str, Product]:
+        """url -> stored Product for every url with a record newer than max_age."""
+        out = {}
+        for u in urls:
+            p = self.get(u, max_age)
+            if p is not None:
+                out[u] = p
+        return out
+
+    def search(self, plan: SearchPlan, limit: int = 12, max_age: Optional[float] = None) -> List[Product]:
+        match = fts_query(" ".join([plan.query, plan.brand or ""]))
+        if not match:
+            return []
+        sql = ["SELECT p.data FROM products_fts f JOIN products p ON p.rowid = f.rowid WHERE products_fts MATCH ?"]
+        args: List[object] = [match]
+        if max_age is not None:
+            sql.append("AND p.fetched_at >= ?")
+            args.append(time.time() - max_age)
+        if plan.max_price is not None:
+            sql.append("AND p.price IS NOT NULL AND p.price <= ?")
+            args.append(plan.max_price)
+        if plan.min_rating is not None:
+            sql.append("AND p.rating IS NOT NULL AND p.rating >= ?")
+            args.append(plan.min_rating)
+        sql.append("ORDER BY bm25(products_fts) LIMIT ?")
+        args.append(limit)
+        with self._lock:
+            rows = self._db.execute(" ".join(sql), args).fetchall()
+        return [Product.model_validate_json(r[0]) for r in rows]
+
+    def record_hits(self, urls: Iterable[str]) -> None:
+        """Count how often products are served; the refresh scheduler favours popular ones."""
+        with self._lock:
+            self._db.executemany("UPDATE products SET hits = hits + 1 WHERE key = ?", [(product_key(u),) for u in urls])
+
+    def mark_fresh(self, url: str, fetched_at: Optional[float] = None) -> None:
+        """Reset a record's age without rewriting it (page unchanged since last fetch)."""
+        with self._lock:
+            self._db.execute("UPDATE products SET fetched_at = ? WHERE key = ?", (fetched_at or time.time(), product_key(url)))
+
+    def refresh_candidates(self) -> List[Tuple[str, str, float, int]]:
+        """(key, url, fetched_at, hits) for every stored product."""
+        with self._lock:
+            return self._db.execute("SELECT key, url, fetched_at, hits FROM products").fetchall()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            n = self._db.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        return {"products": n}
+
+_catalog: Optional[Catalog] = None
+_catalog_lock = threading.Lock()
+
+def get_catalog() -> Optional[Catalog]:
+    """Process-wide catalog, or None when CATALOG is disabled."""
+    global _catalog
+    if not env_flag("CATALOG"):
+        return None
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = Catalog()
+    return _catalog
+
+def set_catalog(catalog: Optional[Catalog]) -> None:
+    global _catalog
+    _catalog = catalog
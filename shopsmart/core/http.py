@@ -0,0 +1,237 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from . import metrics
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9,ar;q=0.8",
+    "Accept-Encoding": "gzip, deflate",
+}
+try:  # requests/urllib3 only decode br when a brotli package is importable
+    import brotli  # noqa: F401
+    DEFAULT_HEADERS["Accept-Encoding"] = "gzip, deflate, br"
+except ImportError:
+    pass
+
+FETCH_SECONDS = metrics.histogram("shopsmart_fetch_seconds", "HTTP GET latency per host (rate-limit wait excluded).")
+FETCH_BYTES = metrics.histogram("shopsmart_fetch_bytes", "Response body size per host.", metrics.SIZE_BUCKETS)
+FETCH_TOTAL = metrics.counter("shopsmart_fetch_total", "HTTP GETs per host and outcome (2xx/3xx/4xx/5xx/error/circuit_open).")
+
+class FetchError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        # 4xx are deterministic (except 429 throttling); 5xx and transport errors may pass on retry
+        if self.status is None:
+            return True
+        return self.status == 429 or self.status >= 500
+
+class CircuitOpenError(FetchError):
+    @property
+    def retryable(self) -> bool:
+        return False
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/sec refill up to `burst`; acquire() blocks until one is free.
+
+    `rate=None` means unlimited (every acquire succeeds at once). A rate of 0 refills nothing:
+    only the initial `burst` tokens (possibly none) are ever handed out.
+    """
+
+    def __init__(self, rate: Optional[float], burst: int):
+        self.rate = rate
+        self.capacity = max(0 if rate == 0 else 1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate <= 0:
+            self.updated = now
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available right now; never blocks."""
+        if self.rate is None:
+            return True
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        if self.rate is None:
+            return
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if self.rate <= 0:
+                    raise RuntimeError("token bucket with rate 0 is exhausted and never refills")
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; after `reset_after` seconds lets one probe through."""
+
+    def __init__(self, threshold: int, reset_after: float):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._prober: Optional[int] = None  # thread that holds the half-open probe
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing, self._prober = True, threading.get_ident()
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give up this thread's probe without a verdict (the request died of something unrelated to the host)."""
+        with self._lock:
+            if self._probing and self._prober == threading.get_ident():
+                self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.threshold > 0 and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+class HttpClient:
+    """Shared keep-alive HTTP client with per-host rate limits and circuit breakers.
+
+    One requests.Session holds a urllib3 connection pool per host, so repeated product
+    fetches against the same marketplaces reuse TCP/TLS connections. `resolve` maps a host
+    to another base URL (e.g. a local replay server) while keeping the Host header, limits
+    and breakers of the original host, like curl --resolve.
+    """
+
+    def __init__(
+        self,
+        headers: Optional[Dict[str, str]] = None,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        pool_size: Optional[int] = None,
+        breaker_threshold: Optional[int] = None,
+        breaker_reset: Optional[float] = None,
+        resolve: Optional[Dict[str, str]] = None,
+    ):
+        self.rate = rate if rate is not None else float(os.getenv("FETCH_RATE_PER_HOST", "2"))
+        self.burst = burst if burst is not None else int(os.getenv("FETCH_BURST_PER_HOST", "4"))
+        self.breaker_threshold = breaker_threshold if breaker_threshold is not None else int(os.getenv("FETCH_BREAKER_THRESHOLD", "5"))
+        self.breaker_reset = breaker_reset if breaker_reset is not None else float(os.getenv("FETCH_BREAKER_RESET", "30"))
+        pool_size = pool_size if pool_size is not None else int(os.getenv("FETCH_POOL_SIZE", "10"))
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.resolve = {h.lower(): base.rstrip("/") for h, base in (resolve or {}).items()}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            if host not in self._buckets:
+                # FETCH_RATE_PER_HOST=0 turns per-host limiting off (a fetch client that never fetches is no use)
+                self._buckets[host] = TokenBucket(self.rate if self.rate > 0 else None, self.burst)
+            return self._buckets[host]
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            return self._breakers[host]
+
+    def _route(self, url: str, host: str, kwargs: Dict) -> str:
+        base = self.resolve.get(host)
+        if base is None:
+            return url
+        parts = urlparse(url)
+        kwargs["headers"] = {**(kwargs.get("headers") or {}), "Host": host}
+        return base + (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+    def get(self, url: str, timeout: float = 20, **kwargs) -> requests.Response:
+        host = urlparse(url).netloc.lower()
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            FETCH_TOTAL.inc(domain=host, outcome="circuit_open")
+            raise CircuitOpenError(f"Circuit open for {host}, skipping {url}")
+        try:
+            self.bucket(host).acquire()
+            t0 = time.perf_counter()
+            try:
+                resp = self.session.get(self._route(url, host, kwargs), timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                breaker.record_failure()
+                FETCH_TOTAL.inc(domain=host, outcome="error")
+                raise FetchError(f"{type(e).__name__} for {url}: {e}") from e
+            if metrics.enabled():
+                FETCH_SECONDS.observe(time.perf_counter() - t0, domain=host)
+                if not kwargs.get("stream"):  # streamed bodies are measured by whoever reads them
+                    FETCH_BYTES.observe(len(resp.content), domain=host)
+                FETCH_TOTAL.inc(domain=host, outcome=f"{resp.status_code // 100}xx")
+            if resp.status_code == 429 or resp.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        finally:
+            breaker.release()  # no-op once recorded; frees a half-open probe that died of anything else
+        if resp.status_code >= 400:
+            resp.close()
+            raise FetchError(f"HTTP {resp.status_code} for {url}", status=resp.status_code)
+        return resp
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> HttpClient:
+    """Process-wide client shared by every fetch."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+def set_client(client: Optional[HttpClient]) -> None:
+    global _client
+    _client = client
@@ -0,0 +1,171 @@
+from __future__ import annotations
+import os
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+from .models import Product, ProductCluster
+
+KNOWN_BRANDS = {
+    "apple", "samsung", "xiaomi", "redmi", "poco", "oppo", "realme", "vivo", "honor", "huawei", "infinix", "tecno",
+    "itel", "nokia", "motorola", "oneplus", "google", "sony", "lg", "lenovo", "hp", "dell", "asus", "acer", "msi",
+    "anker", "oraimo", "jbl", "beats", "bose", "soundcore", "baseus", "ugreen", "logitech", "philips", "braun",
+    "tornado", "toshiba", "sharp", "fresh", "zanussi", "kenwood", "black+decker", "canon", "nikon", "garmin",
+    "amazfit", "haylou", "lenovo", "microsoft", "nintendo", "playstation", "xbox", "tp-link", "sandisk", "kingston",
+}
+# product lines that marketplaces often list without the maker's name
+BRAND_ALIASES = {
+    "iphone": "apple", "ipad": "apple", "macbook": "apple", "airpods": "apple", "imac": "apple",
+    "galaxy": "samsung", "redmi": "xiaomi", "poco": "xiaomi", "pixel": "google", "playstation": "sony",
+    "ps5": "sony", "thinkpad": "lenovo", "ideapad": "lenovo", "pavilion": "hp", "zenbook": "asus", "vivobook": "asus",
+}
+# edition words that make a different product even when every other token matches
+VARIANT_WORDS = {"pro", "max", "plus", "ultra", "mini", "lite", "fe", "se", "neo", "prime", "air"}
+_UNITS = r"(gb|tb|mah|w|mp|hz|mm|l|kg)"
+# inches need the unit glued on ("6.1in", '6.1"') or spelled out, so "2 in 1" is not a spec
+_spec_re = re.compile(r"(\d+(?:\.\d+)?)(?:\s?" + _UNITS + r"\b|\s?inch(?:es)?\b|in\b|\s?\")", re.I)
+_token_re = re.compile(r"[a-z0-9+\-]+")
+
+def title_tokens(title: str) -> List[str]:
+    return _token_re.findall((title or "").lower())
+
+def brand_names(brand: str) -> List[str]:
+    """A maker's name plus its product-line aliases: "Apple" -> ["apple", "iphone", "ipad", ...]."""
+    key = brand.lower()
+    return [key] + [alias for alias, maker in BRAND_ALIASES.items() if maker == key]
+
+def mentions_brand(title: str, brand: str) -> bool:
+    """Whether `title` names `brand` or one of its product lines ("iPhone 15" mentions Apple)."""
+    title = (title or "").lower()
+    return any(name in title for name in brand_names(brand))
+
+def brand_of(tokens: Sequence[str]) -> str:
+    """The maker named in the first few tokens ("iPhone" -> "apple"), else the first token."""
+    for t in tokens[:6]:
+        if t in BRAND_ALIASES:
+            return BRAND_ALIASES[t]
+        if t in KNOWN_BRANDS:
+            return t
+    return tokens[0] if tokens else ""
+
+def spec_tokens(title: str) -> Tuple[str, ...]:
+    """Normalized numeric specs, e.g. "128 GB" -> "128gb"; inch variants collapse to "in"."""
+    return tuple(sorted({num + (unit.lower() or "in") for num, unit in _spec_re.findall(title or "")}))
+
+def normalize_specs(title: str) -> str:
+    """Title with each spec written one way ("128 GB" -> "128gb"), so listings compare token for token."""
+    return _spec_re.sub(lambda m: f" {m.group(1)}{(m.group(2) or 'in').lower()} ", title or "")
+
+def model_tokens(tokens: Sequence[str]) -> Set[str]:
+    """Alphanumeric model codes such as "a55", "s24", "wh-1000xm5" (spec tokens excluded)."""
+    out = set()
+    for t in tokens:
+        if any(c.isdigit() for c in t) and any(c.isalpha() for c in t) and not _spec_re.fullmatch(t):
+            out.add(t)
+    return out
+
+def spec_conflict(a: Sequence[str], b: Sequence[str]) -> bool:
+    """Both titles state a value of the same kind and neither's values cover the other's (128gb vs 256gb).
+
+    A title that just omits a spec ("8GB RAM") is not a conflict.
+    """
+    kinds: Dict[str, Tuple[Set[str], Set[str]]] = defaultdict(lambda: (set(), set()))
+    for side, specs in enumerate((a, b)):
+        for spec in specs:
+            kinds[re.sub(r"^[\d.]+", "", spec)][side].add(spec)
+    return any(x and y and not (x <= y or y <= x) for x, y in kinds.values())
+
+def block_key(title: str) -> str:
+    """Cheap blocking key: brand + first model token (specs stripped). Only titles sharing a key are compared."""
+    toks = title_tokens(_spec_re.sub(" ", title or ""))
+    brand = brand_of(toks)
+    model = next((t for t in toks if any(c.isdigit() for c in t)), "")
+    return f"{brand}|{model}"
+
+class _DisjointSet:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+def _canonical(offers: List[Product]) -> Product:
+    """Cheapest priced offer, backfilled with the best-reviewed offer's rating and any images."""
+    priced = [o for o in offers if o.price is not None]
+    base = min(priced, key=lambda o: o.price) if priced else offers[0]
+    update: Dict[str, object] = {}
+    if base.rating is None:
+        rated = [o for o in offers if o.rating is not None]
+        if rated:
+            top = max(rated, key=lambda o: o.review_count or 0)
+            update.update(rating=top.rating, review_count=top.review_count)
+    if not base.images:
+        imgs = next((o.images for o in offers if o.images), None)
+        if imgs:
+            update["images"] = imgs
+    sources = sorted({o.source for o in offers if o.source})
+    update["extra"] = {**base.extra, "offers": str(len(offers)), "sources": ",".join(sources)}
+    return base.model_copy(update=update)
+
+def cluster_products(products: List[Product], threshold: Optional[float] = None) -> List[ProductCluster]:
+    """Group listings of the same item across marketplaces.
+
+    Listings sharing a product key are always merged. Titles are blocked by brand (with
+    aliases such as iPhone -> Apple) + model token, then each block is scored in one batched
+    rapidfuzz cdist call (token_set_ratio). Pairs above `threshold` are merged unless each
+    names a model code the other lacks (keeps "Galaxy A55" and "Galaxy A35" apart), their
+    edition words differ ("iPhone 15" vs "iPhone 15 Pro") or they state conflicting specs
+    (128GB vs 256GB).
+    Clusters come back in order of first appearance.
+    """
+    if threshold is None:
+        threshold = float(os.getenv("MATCH_THRESHOLD", "88"))
+    n = len(products)
+    ds = _DisjointSet(n)
+    blocks: Dict[str, List[int]] = defaultdict(list)
+    titles = [(p.title or "").lower() for p in products]
+    for i, t in enumerate(titles):
+        blocks[block_key(t)].append(i)
+    tokens = [title_tokens(t) for t in titles]
+    models = [model_tokens(toks) for toks in tokens]
+    variants = [VARIANT_WORDS.intersection(toks) for toks in tokens]
+    specs = [spec_tokens(t) for t in titles]
+    cleaned = [utils.default_process(normalize_specs(t)) for t in titles]
+    first_of: Dict[str, int] = {}
+    for i, p in enumerate(products):  # the same marketplace listing under two URLs
+        ds.union(first_of.setdefault(p.key, i), i)
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        block_titles = [cleaned[i] for i in members]
+        scores = process.cdist(block_titles, block_titles, scorer=fuzz.token_set_ratio, dtype=np.uint8, workers=-1)
+        rows, cols = np.nonzero(np.triu(scores >= threshold, k=1))
+        for a, b in zip(rows.tolist(), cols.tolist()):
+            i, j = members[a], members[b]
+            # each side naming a model code the other lacks means different models
+            if (models[i] - models[j]) and (models[j] - models[i]):
+                continue
+            if variants[i] != variants[j] or spec_conflict(specs[i], specs[j]):
+                continue
+            ds.union(i, j)
+    groups: Dict[int, List[int]] = {}
+    for i in range(n):
+        groups.setdefault(ds.find(i), []).append(i)
+    clusters = []
+    for root, idxs in groups.items():
+        offers = [products[i] for i in idxs]
+        clusters.append(ProductCluster(key=products[root].key, canonical=_canonical(offers), offers=offers))
+    return clusters
+
+def dedupe_products(products: List[Product], threshold: Optional[float] = None) -> List[Product]:
+    """One canonical Product per cluster, in first-appearance order."""
+    return [c.canonical for c in cluster_products(products, threshold)]
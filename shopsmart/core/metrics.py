@@ -0,0 +1,235 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_enabled = os.getenv("METRICS", "true").lower() in ("1", "true", "yes", "y")
+
+def enabled() -> bool:
+    return _enabled
+
+def set_enabled(on: bool) -> None:
+    global _enabled
+    _enabled = on
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _esc(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt(labels: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in items) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self.values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1.0, **labels) -> None:
+        if not _enabled:
+            return
+        key = _key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{_fmt(k)} {v:g}" for k, v in sorted(self.values.items())]
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(buckets)
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not _enabled:
+            return
+        key = _key(labels)
+        with self._lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0.0] * (len(self.buckets) + 2)
+            row[bisect_left(self.buckets, value)] += 1
+            row[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, row in sorted(self.values.items()):
+                acc = 0.0
+                for bound, n in zip(self.buckets, row):
+                    acc += n
+                    lines.append(f"{self.name}_bucket{_fmt(key, ('le', f'{bound:g}'))} {acc:g}")
+                acc += row[len(self.buckets)]
+                lines.append(f"{self.name}_bucket{_fmt(key, ('le', '+Inf'))} {acc:g}")
+                lines.append(f"{self.name}_sum{_fmt(key)} {row[-1]:g}")
+                lines.append(f"{self.name}_count{_fmt(key)} {acc:g}")
+        return lines
+
+class Gauge:
+    """Value read from a callback at scrape time (queue depth, pool size...)."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        self.name, self.help, self.fn = name, help, fn
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.fn():g}"]
+
+_metrics: List[object] = []
+_caches: Dict[str, Callable[[], Optional[Dict[str, float]]]] = {}
+
+def counter(name: str, help: str) -> Counter:
+    m = Counter(name, help)
+    _metrics.append(m)
+    return m
+
+def histogram(name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    m = Histogram(name, help, buckets)
+    _metrics.append(m)
+    return m
+
+def gauge(name: str, help: str, fn: Callable[[], float]) -> Gauge:
+    m = Gauge(name, help, fn)
+    _metrics.append(m)
+    return m
+
+def register_cache(name: str, stats: Callable[[], Optional[Dict[str, float]]]) -> None:
+    """Report a cache's hits/misses/hit rate at scrape time; `stats` returns None while it doesn't exist."""
+    _caches[name] = stats
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    out = {}
+    for name, fn in _caches.items():
+        s = fn()
+        if s is not None:
+            out[name] = s
+    return out
+
+STAGE_SECONDS = histogram("shopsmart_stage_seconds", "Wall time per pipeline stage and instrumented call.")
+
+class _Span:
+    __slots__ = ("stage", "labels", "trace", "t0", "elapsed")
+
+    def __init__(self, stage: str, labels: Dict[str, object], trace: Optional["Trace"] = None):
+        self.stage, self.labels, self.trace = stage, labels, trace
+        self.elapsed = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.elapsed = time.perf_counter() - self.t0
+        STAGE_SECONDS.observe(self.elapsed, stage=self.stage, **self.labels)
+        if self.trace is not None:
+            self.trace.add(self.stage, self.elapsed)
+
+class _NoopSpan:
+    __slots__ = ()
+    elapsed = 0.0
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+_NOOP = _NoopSpan()
+
+def span(stage: str, **labels):
+    """Time a block into shopsmart_stage_seconds{stage=...}; a shared no-op when metrics are off."""
+    if not _enabled:
+        return _NOOP
+    return _Span(stage, labels)
+
+class Trace:
+    """Per-request timing breakdown: stage -> milliseconds, summed over repeated spans.
+
+    Spans measure wall time, so in a generator they include time the consumer spends
+    between events.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+
+    def span(self, stage: str, **labels):
+        if not _enabled:
+            return _NOOP
+        return _Span(stage, labels, self)
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds * 1000
+
+    def as_dict(self) -> Dict[str, float]:
+        if not _enabled:
+            return {}
+        return {**{k: round(v, 1) for k, v in self.timings.items()}, "total": round((time.perf_counter() - self.t0) * 1000, 1)}
+
+def render() -> str:
+    """Every metric in Prometheus text exposition format."""
+    lines: List[str] = []
+    for m in _metrics:
+        lines += m.render()
+    caches = cache_stats()
+    for field, kind, help in (("hits", "counter", "Cache hits."), ("misses", "counter", "Cache misses."),
+                              ("hit_rate", "gauge", "Cache hit ratio since start.")):
+        name = f"shopsmart_cache_{field}" + ("_total" if kind == "counter" else "")
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{cache="{c}"}} {s.get(field, 0):g}' for c, s in sorted(caches.items())]
+    return "\n".join(lines) + "\n"
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+def start_server(port: Optional[int] = None, host: str = "127.0.0.1") -> Optional[int]:
+    """Serve GET /metrics on a daemon thread (once per process); METRICS_PORT when port is None.
+
+    Returns the bound port, or None when no port is configured.
+    """
+    global _server
+    if port is None:
+        raw = os.getenv("METRICS_PORT", "")
+        if not raw:
+            return None
+        port = int(raw)
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server.server_address[1]
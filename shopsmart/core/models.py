@@ -1,6 +1,7 @@
 from __future__ import annotations
 from pydantic import BaseModel, Field, HttpUrl
-from typing import Optional, List, Dict
+from typing import Any, Dict, List, Literal, Optional, Union
+from .utils import product_key
 
 class Product(BaseModel):
     title: str
@@ -14,9 +15,52 @@ class Product(BaseModel):
     source: Optional[str] = None  # 'amazon.eg' | 'jumia.com.eg' | 'noon.com/egypt-en'
     extra: Dict[str, str] = {}
 
+    @property
+    def key(self) -> str:
+        """Marketplace identity (ASIN / SKU / catalog ID, else canonical URL) used by caches and the catalog."""
+        return product_key(str(self.url))
+
+class ProductCluster(BaseModel):
+    """Listings of the same item (possibly across marketplaces) with one canonical record."""
+    key: str
+    canonical: Product
+    offers: List[Product] = []
+
 class SearchPlan(BaseModel):
     query: str
     brand: Optional[str] = None
     max_price: Optional[float] = None
     min_rating: Optional[float] = None
     features: List[str] = []
+
+# ---- Pipeline events (yielded by agents.iter_pipeline) ----
+class PlanReady(BaseModel):
+    kind: Literal["plan"] = "plan"
+    plan: SearchPlan
+    source: Literal["given", "rules", "llm"] = "llm"
+
+class UrlsFound(BaseModel):
+    kind: Literal["urls"] = "urls"
+    urls: List[str]
+
+class ProductExtracted(BaseModel):
+    kind: Literal["product"] = "product"
+    index: int
+    url: str
+    product: Optional[Product] = None  # None when the page failed or wasn't a product
+
+class RankingUpdated(BaseModel):
+    kind: Literal["ranking"] = "ranking"
+    top: List[Product]
+    final: bool = False
+
+class LLMText(BaseModel):
+    kind: Literal["llm_text"] = "llm_text"
+    stage: Literal["summary", "reasoning"]
+    delta: str
+
+class PipelineDone(BaseModel):
+    kind: Literal["done"] = "done"
+    result: Dict[str, Any]
+
+PipelineEvent = Union[PlanReady, UrlsFound, ProductExtracted, RankingUpdated, LLMText, PipelineDone]
@@ -0,0 +1,144 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from .matching import BRAND_ALIASES, KNOWN_BRANDS, spec_tokens
+from .models import SearchPlan
+
+# Arabic-Indic and Extended (Persian) digits, plus the Arabic decimal/thousands separators
+_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹٫٬", "01234567890123456789.,")
+
+_NUM = r"(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)\s*(k)?"
+_CURRENCY = r"(?:egp|le|l\.e\.?|pounds?|جنيه|ج\.?م)"
+# a number followed by a unit ("256gb", "1 tb", "65w", '6.1"') is a spec, never a price
+_NOT_SPEC = r"(?!\d|[.,]\d|\s?(?:gb|tb|mb|mah|hz|w|mp|mm|inch|kg)\b|in\b|\s?\")"
+_PRICE = _NUM + _NOT_SPEC + r"\s*" + _CURRENCY + r"?"
+# (pattern, ambiguous): bare "max"/"up to" is as often part of a product name ("pro max") as a budget
+_budget_res = [
+    (re.compile(r"\bbudget(?:\s+(?:of|is))?\s*:?\s*(?:(?:max(?:imum)?|up to|upto|under|below)\s*)?" + _PRICE, re.I), False),
+    (re.compile(r"\b(?:under|below|less than|cheaper than|within)\s*:?\s*" + _PRICE, re.I), False),
+    (re.compile(r"\b(?:max(?:imum)?|up to|upto)\s*:?\s*" + _NUM + _NOT_SPEC + r"\s*" + _CURRENCY + r"\b", re.I), False),
+    (re.compile(r"(?:<=?)\s*" + _PRICE, re.I), False),
+    (re.compile(r"(?:أقل من|اقل من|تحت|بحد أقصى|في حدود)\s*" + _PRICE, re.I), False),
+    (re.compile(r"\bbetween\s*\d[\d,.]*\s*(?:and|-)\s*" + _PRICE, re.I), False),
+    (re.compile(r"\b" + _NUM + r"\s*" + _CURRENCY + r"\b", re.I), False),
+    (re.compile(r"\b(?:max(?:imum)?|up to|upto)\s*:?\s*" + _NUM + _NOT_SPEC, re.I), True),
+]
+_rating_res = [
+    re.compile(r"\b([0-5](?:\.\d)?)\s*\+\s*(?:stars?|★)?", re.I),
+    re.compile(r"\b(?:at least|min(?:imum)?|rated|rating(?: of| above| over)?)\s*:?\s*([0-5](?:\.\d)?)\s*(?:stars?|★)?(?:\s*(?:and up|or more|or above))?", re.I),
+    re.compile(r"\b([0-5](?:\.\d)?)\s*(?:stars?|★)\s*(?:and up|or more|or above|\+)?", re.I),
+    re.compile(r"([0-5](?:\.\d)?)\s*نجوم", re.I),
+]
+FEATURE_WORDS = {
+    "anc": "anc", "noise cancelling": "anc", "noise canceling": "anc", "wireless": "wireless", "bluetooth": "bluetooth",
+    "5g": "5g", "fast charging": "fast charging", "waterproof": "waterproof", "usb-c": "usb-c", "type-c": "usb-c",
+    "dual sim": "dual sim", "amoled": "amoled", "oled": "oled", "4k": "4k", "gaming": "gaming", "magsafe": "magsafe",
+}
+_feature_re = re.compile(r"\b(" + "|".join(re.escape(k) for k in sorted(FEATURE_WORDS, key=len, reverse=True)) + r")\b", re.I)
+# brand names that are also everyday words ("sharp knife", "fresh juice"); they only count next to a product word or model code
+COMMON_WORD_BRANDS = {"apple", "fresh", "sharp", "honor", "tornado", "beats", "google"}
+PRODUCT_WORDS = {
+    "phone", "phones", "mobile", "smartphone", "tablet", "laptop", "notebook", "watch", "smartwatch", "earbuds", "buds",
+    "headphones", "headset", "speaker", "tv", "television", "screen", "monitor", "charger", "router", "camera", "fridge",
+    "refrigerator", "freezer", "microwave", "oven", "cooker", "heater", "fan", "conditioner", "washer", "washing",
+    "dishwasher", "blender", "mixer", "iron", "kettle", "vacuum", "shaver", "trimmer",
+}
+_model_code_re = re.compile(r"[a-z]+\d+[a-z0-9]*")
+# requests the rules can't turn into a product search on their own
+_VAGUE = {"gift", "something", "anything", "recommend", "suggest", "which", "what", "ideas", "compare", "vs", "versus"}
+_FILLER = {"egp", "le", "i", "want", "need", "looking", "for", "a", "an", "the", "with", "and", "please", "buy", "me", "to", "in", "egypt"}
+_word_re = re.compile(r"[^\W_]+(?:[+\-][^\W_]+)*", re.UNICODE)
+_arabic_re = re.compile(r"[؀-ۿ]")
+
+def _num(value: str, k: Optional[str]) -> float:
+    n = float(value.replace(",", ""))
+    return n * 1000 if k else n
+
+def _cut(text: str, m: re.Match) -> str:
+    return text[:m.start()] + " " + text[m.end():]
+
+def _brand_name(brand: str) -> str:
+    return brand.upper() if len(brand) <= 3 else brand.title()
+
+def find_brand(words: List[str]) -> Tuple[Optional[str], bool]:
+    """(maker, ambiguous) for a tokenized request; product lines resolve to their maker ("iphone" -> apple).
+
+    Brands that are also common words count only with a product word or model code nearby,
+    and are reported as ambiguous.
+    """
+    common = None
+    for w in words:
+        if w in BRAND_ALIASES:
+            return BRAND_ALIASES[w], False
+        if w in KNOWN_BRANDS:
+            if w not in COMMON_WORD_BRANDS:
+                return w, False
+            common = common or w
+    if common and any(w in PRODUCT_WORDS or _model_code_re.fullmatch(w) for w in words):
+        return common, True
+    return None, False
+
+def rule_plan(text: str) -> Tuple[SearchPlan, float]:
+    """Parse a shopping request without an LLM; returns the plan and a 0..1 confidence.
+
+    Recognizes budgets ("under 2000 EGP", "2k", "تحت ٢٠٠٠ جنيه"), minimum ratings
+    ("4+ stars", "at least 4.5"), brands from the matching lexicon (see find_brand) and common feature
+    words. Numbers with a unit ("256gb", "1tb") are specs, never budgets, and a bare
+    "max"/"up to" only counts as one with a currency after it or a budget word before it.
+    Confidence drops for vague requests, ambiguous budgets, leftover price-like numbers, Arabic
+    product words (Tavily wants the product name) and long free-form text.
+    """
+    rest = " " + text.translate(_DIGITS) + " "
+    max_price = min_rating = None
+    vague_budget = False
+    for rx, ambiguous in _budget_res:
+        m = rx.search(rest)
+        if m:
+            max_price = _num(m.group(1), m.group(2))
+            vague_budget = ambiguous
+            rest = _cut(rest, m)
+            break
+    for rx in _rating_res:
+        m = rx.search(rest)
+        if m and 0 < float(m.group(1)) <= 5:
+            min_rating = float(m.group(1))
+            rest = _cut(rest, m)
+            break
+    features = sorted({FEATURE_WORDS[f.lower()] for f in _feature_re.findall(rest)} | set(spec_tokens(rest)))
+    words = _word_re.findall(rest.lower())
+    brand, vague_brand = find_brand(words)
+    query = " ".join(rest.split())
+
+    confidence = 1.0
+    content = [w for w in words if w not in _FILLER]
+    if not content:
+        confidence = 0.0
+    if any(w in _VAGUE for w in words) or "for my" in rest.lower():
+        confidence -= 0.5
+    if any(w.isdigit() and float(w) >= 500 for w in words):
+        confidence -= 0.5  # a price we couldn't attach to a budget phrase
+    if vague_budget:
+        confidence -= 0.5  # "max 300" with no currency: a budget, or part of the product name?
+    if vague_brand:
+        confidence -= 0.5  # "apple watch" is Apple, but let the LLM confirm everyday words as brands
+    if _arabic_re.search(query):
+        confidence -= 0.5
+    if len(words) > 12:
+        confidence -= 0.3
+    plan = SearchPlan(query=query or text.strip(), brand=_brand_name(brand) if brand else None,
+                      max_price=max_price, min_rating=min_rating, features=features)
+    return plan, max(0.0, confidence)
+
+def apply_constraints(plan: SearchPlan, constraints: Optional[Dict[str, Any]]) -> SearchPlan:
+    """Overlay structured constraints (e.g. the app's sidebar fields) on a plan; empty values are ignored."""
+    if not constraints:
+        return plan
+    update: Dict[str, Any] = {}
+    for field in ("query", "brand", "max_price", "min_rating"):
+        value = constraints.get(field)
+        if value not in (None, "", 0):
+            update[field] = value
+    extra: List[str] = [f.strip() for f in constraints.get("features") or [] if f and f.strip()]
+    if extra:
+        update["features"] = list(dict.fromkeys([*plan.features, *extra]))
+    return plan.model_copy(update=update) if update else plan
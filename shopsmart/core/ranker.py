@@ -1,5 +1,7 @@
 from __future__ import annotations
-from typing import List
+from typing import Dict, List, Optional
+import numpy as np
+from .matching import brand_names, mentions_brand
 from .models import Product
 
 def score_product(p: Product, prefer_brand: str | None, max_price: float | None, min_rating: float | None) -> float:
@@ -13,9 +15,76 @@ def score_product(p: Product, prefer_brand: str | None, max_price: float | None,
         score += min(p.rating / 5.0 * 3.0, 3.0)
         if min_rating is not None and p.rating >= min_rating:
             score += 1.0
-    if prefer_brand and prefer_brand.lower() in (p.title or '').lower():
+    if prefer_brand and mentions_brand(p.title, prefer_brand):
         score += 2.0
     return score
 
-def rank_products(products: List[Product], prefer_brand: str | None, max_price: float | None, min_rating: float | None) -> List[Product]:
-    return sorted(products, key=lambda p: score_product(p, prefer_brand, max_price, min_rating), reverse=True)
+class ProductBatch:
+    """Columnar view of a product list: NaN marks a missing price/rating/review_count."""
+
+    def __init__(self, products: List[Product]):
+        self.products = list(products)
+        n = len(self.products)
+        self.price = np.fromiter((np.nan if p.price is None else p.price for p in self.products), dtype=np.float64, count=n)
+        self.rating = np.fromiter((np.nan if p.rating is None else p.rating for p in self.products), dtype=np.float64, count=n)
+        self.review_count = np.fromiter((np.nan if p.review_count is None else p.review_count for p in self.products), dtype=np.float64, count=n)
+        self.titles = np.array([(p.title or '').lower() for p in self.products], dtype=str) if n else np.array([], dtype=str)
+        self._brand_masks: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def brand_mask(self, brand: str | None) -> np.ndarray:
+        if not brand:
+            return np.zeros(len(self), dtype=bool)
+        key = brand.lower()
+        if key not in self._brand_masks:
+            mask = np.zeros(len(self), dtype=bool)
+            for name in brand_names(key) if len(self) else ():
+                mask |= np.char.find(self.titles, name) >= 0
+            self._brand_masks[key] = mask
+        return self._brand_masks[key]
+
+def score_batch(batch: ProductBatch, prefer_brand: str | None, max_price: float | None, min_rating: float | None) -> np.ndarray:
+    """Vectorized score_product; same rules, applied in the same order, so results are bit-identical."""
+    score = np.zeros(len(batch), dtype=np.float64)
+    has_price = ~np.isnan(batch.price)
+    if max_price is not None:
+        in_budget = has_price & (batch.price <= max_price)
+    else:
+        in_budget = np.zeros(len(batch), dtype=bool)
+    score += np.where(in_budget, 3.0, np.where(has_price, 1.0, 0.0))
+    has_rating = ~np.isnan(batch.rating)
+    score += np.where(has_rating, np.minimum(np.nan_to_num(batch.rating) / 5.0 * 3.0, 3.0), 0.0)
+    if min_rating is not None:
+        score += np.where(has_rating & (batch.rating >= min_rating), 1.0, 0.0)
+    score += np.where(batch.brand_mask(prefer_brand), 2.0, 0.0)
+    return score
+
+def top_k_indices(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """Indices of the k best scores, best first; ties keep input order, like a stable sort."""
+    n = len(scores)
+    idx = np.arange(n)
+    if k is None or k >= n:
+        return np.lexsort((idx, -scores))
+    if k <= 0:
+        return idx[:0]
+    threshold = np.partition(scores, n - k)[n - k]
+    above = idx[scores > threshold]
+    ties = idx[scores == threshold][: k - len(above)]
+    chosen = np.concatenate([above, ties])
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
+
+def rank_batch(batch: ProductBatch, prefer_brand: str | None, max_price: float | None, min_rating: float | None, k: Optional[int] = None) -> List[Product]:
+    order = top_k_indices(score_batch(batch, prefer_brand, max_price, min_rating), k)
+    return [batch.products[i] for i in order]
+
+# below this size building NumPy columns costs more than scoring in Python
+SCALAR_CUTOFF = 64
+
+def rank_products(products: List[Product], prefer_brand: str | None, max_price: float | None, min_rating: float | None, k: Optional[int] = None) -> List[Product]:
+    """Products best-first; with `k`, only the top k (partial selection instead of a full sort)."""
+    if len(products) < SCALAR_CUTOFF:
+        ranked = sorted(products, key=lambda p: score_product(p, prefer_brand, max_price, min_rating), reverse=True)
+        return ranked if k is None else ranked[:max(k, 0)]
+    return rank_batch(ProductBatch(products), prefer_brand, max_price, min_rating, k)
@@ -1,29 +1,151 @@
 from __future__ import annotations
-import re, time, os, math, json
-from urllib.parse import urlparse
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+import codecs, re, time, os, math, json
+from typing import Callable, Dict, Optional, Protocol, Tuple
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 import requests
-
-DEFAULT_HEADERS = {
-    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
-    "Accept-Language": "en-US,en;q=0.9,ar;q=0.8",
-}
-
-class FetchError(Exception):
-    pass
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception
+from . import metrics
+from .http import DEFAULT_HEADERS, FETCH_BYTES, FetchError, CircuitOpenError, get_client
 
 def domain_of(url: str) -> str:
     return urlparse(url).netloc.lower()
 
-@retry(reraise=True, stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8))
-def fetch(url: str, timeout: int = 20) -> str:
+TRACKING_PARAMS = {"ref", "ref_", "tag", "psc", "smid", "spm", "gclid", "fbclid", "qid", "sr", "keywords", "crid", "sprefix"}
+
+def _untracked(query: str):
+    return [(k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+            if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")]
+
+def canonical_url(url: str) -> str:
+    """Normalize a URL for use as a cache key: lowercase host, no fragment, no tracking params."""
+    parts = urlparse(url.strip())
+    query = sorted(_untracked(parts.query))
+    path = parts.path.rstrip("/") or "/"
+    return urlunparse((parts.scheme.lower() or "https", parts.netloc.lower(), path, "", urlencode(query), ""))
+
+# marketplace product IDs: Amazon ASIN, Jumia's numeric SKU ending the slug, Noon's catalog ID before /p/
+_ASIN_RE = re.compile(r"/(?:dp|gp/product|gp/aw/d|gp/offer-listing|product-reviews|exec/obidos/asin)/([A-Z0-9]{10})(?:/|$)", re.I)
+_JUMIA_SKU_RE = re.compile(r"-(\d{4,})\.html$")
+_NOON_ID_RE = re.compile(r"/([A-Z0-9]{6,})/p/?$", re.I)
+
+def _marketplace_id(url: str) -> Optional[Tuple[str, str]]:
+    parts = urlparse(url.strip())
+    host, path = parts.netloc.lower(), parts.path
+    if "amazon." in host:
+        m = _ASIN_RE.search(path)
+        return ("amazon", m.group(1).upper()) if m else None
+    if "jumia." in host:
+        m = _JUMIA_SKU_RE.search(path)
+        return ("jumia", m.group(1)) if m else None
+    if "noon.com" in host:
+        m = _NOON_ID_RE.search(path)
+        return ("noon", m.group(1).upper()) if m else None
+    return None
+
+def product_key(url: str) -> str:
+    """Stable identity of a product page: "amazon:<ASIN>", "jumia:<SKU>", "noon:<ID>", else the canonical URL.
+
+    /dp/, /gp/product/ and slugged Amazon links, or Jumia/Noon links that differ only in
+    slug or query string, map to the same key.
+    """
+    mid = _marketplace_id(url)
+    return f"{mid[0]}:{mid[1]}" if mid else canonical_url(url)
+
+def canonical_product_url(url: str) -> str:
+    """The URL to fetch for a product: tracking params and fragment dropped, Amazon links reduced to /dp/<ASIN>."""
+    parts = urlparse(url.strip())
+    scheme, host = parts.scheme.lower() or "https", parts.netloc.lower()
+    mid = _marketplace_id(url)
+    if mid and mid[0] == "amazon":
+        return f"{scheme}://{host}/dp/{mid[1]}"
+    return urlunparse((scheme, host, parts.path or "/", parts.params, urlencode(_untracked(parts.query)), ""))
+
+def _is_retryable(e: BaseException) -> bool:
+    return isinstance(e, FetchError) and e.retryable
+
+FETCH_RETRIES = metrics.counter("shopsmart_fetch_retries_total", "Fetch attempts retried after a retryable failure, per host.")
+
+def _count_retry(state) -> None:
+    url = state.args[0] if state.args else state.kwargs.get("url", "")
+    FETCH_RETRIES.inc(domain=domain_of(url))
+
+# 4xx and open circuits fail fast; 5xx/429/timeouts get jittered exponential backoff
+_fetch_retry = retry(reraise=True, stop=stop_after_attempt(3), wait=wait_random_exponential(multiplier=0.5, max=4),
+                     retry=retry_if_exception(_is_retryable), before_sleep=_count_retry)
+
+def _check_fetch_allowed() -> None:
     if os.getenv("ALLOW_WEB_FETCH", "true").lower() not in ("1","true","yes","y"):
-        raise FetchError("Web fetch disabled by ALLOW_WEB_FETCH")
-    resp = requests.get(url, headers=DEFAULT_HEADERS, timeout=timeout)
-    if resp.status_code >= 400:
-        raise FetchError(f"HTTP {resp.status_code} for {url}")
+        raise FetchError("Web fetch disabled by ALLOW_WEB_FETCH", status=0)
+
+@_fetch_retry
+def fetch(url: str, timeout: int = 20) -> str:
+    _check_fetch_allowed()
+    resp = get_client().get(url, timeout=timeout)
     return resp.text
 
+@_fetch_retry
+def fetch_conditional(url: str, etag: str | None = None, last_modified: str | None = None, timeout: int = 20) -> Tuple[str | None, Dict[str, str]]:
+    """Conditional GET: returns (None, validators) on 304 Not Modified, else (html, validators)."""
+    _check_fetch_allowed()
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    resp = get_client().get(url, timeout=timeout, headers=headers)
+    validators = {k: resp.headers[h] for k, h in (("etag", "ETag"), ("last_modified", "Last-Modified")) if h in resp.headers}
+    if resp.status_code == 304:
+        return None, {"etag": etag or "", "last_modified": last_modified or "", **validators}
+    return resp.text, validators
+
+class StreamScanner(Protocol):
+    """Consumes decoded text as it arrives; feed() returns True once nothing more is needed."""
+    def feed(self, text: str) -> bool: ...
+
+FETCH_STREAM_TOTAL = metrics.counter("shopsmart_fetch_stream_total", "Streamed fetches per host by why reading stopped (found/cap/eof).")
+_charset_re = re.compile(r"charset=[\"']?([\w.:-]+)", re.I)
+
+def _decoder(resp: requests.Response):
+    # pages without a declared charset are UTF-8 in practice (requests would assume ISO-8859-1)
+    m = _charset_re.search(resp.headers.get("Content-Type", ""))
+    try:
+        return codecs.getincrementaldecoder(m.group(1) if m else "utf-8")(errors="replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+@_fetch_retry
+def fetch_stream(url: str, scanner: Callable[[], StreamScanner], max_bytes: Optional[int] = None,
+                 timeout: int = 20, chunk_size: int = 16384) -> Tuple[StreamScanner, str]:
+    """Stream a page into a fresh scanner (one per attempt), decompressing and decoding chunk by chunk.
+
+    Reading stops as soon as the scanner has what it needs, or once `max_bytes` of decoded
+    body have arrived; the connection is then closed rather than drained. Returns the
+    scanner and why reading stopped: "found", "cap" or "eof".
+    """
+    _check_fetch_allowed()
+    resp = get_client().get(url, timeout=timeout, stream=True)
+    sc, decoder, read, reason = scanner(), _decoder(resp), 0, "eof"
+    try:
+        for chunk in resp.iter_content(chunk_size):
+            read += len(chunk)
+            if sc.feed(decoder.decode(chunk)):
+                reason = "found"
+                break
+            if max_bytes and read >= max_bytes:
+                reason = "cap"
+                break
+        else:
+            sc.feed(decoder.decode(b"", final=True))
+        wire = resp.raw.tell() if hasattr(resp.raw, "tell") else read
+    except requests.RequestException as e:
+        raise FetchError(f"{type(e).__name__} while streaming {url}: {e}") from e
+    finally:
+        resp.close()
+    host = domain_of(url)
+    FETCH_BYTES.observe(wire, domain=host)
+    FETCH_STREAM_TOTAL.inc(domain=host, stop=reason)
+    return sc, reason
+
 _price_re = re.compile(r"(\d+[\,\.]?\d*)")
 
 def parse_price_to_float(text: str) -> float | None:
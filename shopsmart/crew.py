@@ -0,0 +1,144 @@
+"""crewai Agent/Task/Crew definitions for a full agentic run.
+
+Importing this module imports crewai; the regular pipeline in .agents never does, so the
+request path stays free of crewai/litellm start-up cost. Use run_crew() for a real Crew run.
+"""
+from __future__ import annotations
+from crewai import Agent, Task, Crew, Process, LLM
+from .core.models import SearchPlan
+from .llm import make_llm
+
+def planner_agent(llm: LLM) -> Agent:
+    return Agent(
+        role="Shopping Planner",
+        goal="Turn user input into a precise search plan with budget, brand, features, and rating thresholds.",
+        backstory="Expert prompt engineer and retail analyst who crafts actionable search queries.",
+        llm=llm,
+        verbose=True,
+    )
+
+def search_agent(llm: LLM) -> Agent:
+    return Agent(
+        role="Marketplace Searcher",
+        goal="Use Tavily to find the most relevant product URLs on Amazon.eg, Jumia, and Noon (Egypt).",
+        backstory="Specialist in web search for Egyptian marketplaces.",
+        llm=llm,
+        verbose=True,
+    )
+
+def extractor_agent(llm: LLM) -> Agent:
+    return Agent(
+        role="Product Extractor",
+        goal="Fetch pages and extract normalized product info (title, price EGP, rating, images).",
+        backstory="Schema.org and DOM parsing expert.",
+        llm=llm,
+        verbose=True,
+    )
+
+def analyst_agent(llm: LLM) -> Agent:
+    return Agent(
+        role="Product Analyst",
+        goal="Compare products based on constraints and quality to shortlist top candidates.",
+        backstory="E-commerce analyst valuing quality and price fairness.",
+        llm=llm,
+        verbose=True,
+    )
+
+def reviewer_agent(llm: LLM) -> Agent:
+    return Agent(
+        role="Reviewer",
+        goal="Summarize strengths/weaknesses, tradeoffs, and who each product is for.",
+        backstory="Reads product pages and synthesizes key points for buyers.",
+        llm=llm,
+        verbose=True,
+    )
+
+def recommender_agent(llm: LLM) -> Agent:
+    return Agent(
+        role="Recommender",
+        goal="Output a final recommendation JSON with top pick, 2 runner-ups, and reasoning.",
+        backstory="Explains choices clearly and concisely.",
+        llm=llm,
+        verbose=True,
+    )
+
+# ---- Tasks ----
+def make_tasks(planner: Agent, searcher: Agent, extractor: Agent, analyst: Agent, reviewer: Agent, recommender: Agent, user_input: str = ""):
+    plan_task = Task(
+        description="""
+Given the user_input, produce a JSON SearchPlan {query, brand?, max_price?, min_rating?, features[]}.
+Prefer EGP and Egypt-specific terms. Keep query short and specific.
+""" + (f"user_input: {user_input}\n" if user_input else ""),
+        expected_output="A compact JSON object for SearchPlan.",
+        agent=planner,
+        output_json=SearchPlan.model_json_schema(),  # hint
+    )
+
+    search_task = Task(
+        description="""
+Use Tavily to search for product pages on Amazon.eg, Jumia Egypt, and Noon Egypt based on the SearchPlan.query.
+Return a Python list of up to 12 URLs.
+""",
+        expected_output="A list[str] of URLs.",
+        agent=searcher,
+    )
+
+    extract_task = Task(
+        description="""
+For each URL, fetch page HTML and extract normalized fields:
+title, price (EGP), rating, review_count, images.
+Return a Python list of Product dicts.
+""",
+        expected_output="A list[Product] serialized as dicts.",
+        agent=extractor,
+    )
+
+    analyze_task = Task(
+        description="""
+Given extracted products and the SearchPlan constraints, rank and shortlist the best 5.
+Return the top 5 as a list of dicts.
+""",
+        expected_output="Top-5 product dicts list.",
+        agent=analyst,
+    )
+
+    review_task = Task(
+        description="""
+Summarize pros/cons and suitability for the shortlisted products in 5–8 concise bullet points total.
+""",
+        expected_output="A brief markdown summary string.",
+        agent=reviewer,
+    )
+
+    recommend_task = Task(
+        description="""
+Choose the single best product for the user.
+Output JSON: {best: Product, runners_up: [Product, Product], reasoning:str}.
+""",
+        expected_output="Recommendation JSON string.",
+        agent=recommender,
+    )
+
+    return plan_task, search_task, extract_task, analyze_task, review_task, recommend_task
+
+def build_crew(llm: LLM | None = None, user_input: str = "") -> Crew:
+    llm = llm or make_llm(crew=True)
+    planner = planner_agent(llm)
+    searcher = search_agent(llm)
+    extractor = extractor_agent(llm)
+    analyst = analyst_agent(llm)
+    reviewer = reviewer_agent(llm)
+    recommender = recommender_agent(llm)
+
+    plan_task, search_task, extract_task, analyze_task, review_task, recommend_task = make_tasks(planner, searcher, extractor, analyst, reviewer, recommender, user_input)
+
+    return Crew(
+        agents=[planner, searcher, extractor, analyst, reviewer, recommender],
+        tasks=[plan_task, search_task, extract_task, analyze_task, review_task, recommend_task],
+        process=Process.sequential,
+        verbose=True,
+    )
+
+def run_crew(user_input: str):
+    """Let the crewai agents run the whole task chain themselves (slow; mostly for experiments)."""
+    return build_crew(user_input=user_input).kickoff()
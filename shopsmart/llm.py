@@ -0,0 +1,184 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from .core import metrics
+from .core.cache import SqliteCache, cache_dir, env_flag
+
+def llm_settings() -> Dict[str, Optional[str]]:
+    """Provider, model and key for the configured LLM_PROVIDER."""
+    provider = os.getenv("LLM_PROVIDER", "openai").lower()
+    if provider == "anthropic":
+        return {"provider": provider, "model": os.getenv("ANTHROPIC_MODEL","claude-3-haiku-20240307"), "api_key": os.getenv("ANTHROPIC_API_KEY")}
+    if provider == "google":
+        return {"provider": provider, "model": os.getenv("GOOGLE_MODEL","gemini-2.0-flash-lite"), "api_key": os.getenv("GOOGLE_API_KEY")}
+    # default openai
+    return {"provider": "openai", "model": os.getenv("OPENAI_MODEL","gpt-4o-mini"), "api_key": os.getenv("OPENAI_API_KEY")}
+
+Prompt = Union[str, List[Dict[str, str]]]
+
+def _messages(prompt: Prompt) -> List[Dict[str, str]]:
+    return [{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt
+
+class ChatLLM:
+    """Minimal litellm client exposing the `call` interface the pipeline needs.
+
+    litellm itself is imported on first use, so building one is free at request time.
+    """
+
+    def __init__(self, model: str, api_key: Optional[str] = None):
+        self.model = model
+        self.api_key = api_key
+
+    def call(self, prompt: Prompt, **kwargs) -> str:
+        import litellm
+        with metrics.span("llm_call", model=self.model):
+            resp = litellm.completion(model=self.model, api_key=self.api_key, messages=_messages(prompt), **kwargs)
+        return resp.choices[0].message.content or ""
+
+    def stream(self, prompt: Prompt, **kwargs) -> Iterator[str]:
+        import litellm
+        with metrics.span("llm_stream", model=self.model):
+            resp = litellm.completion(model=self.model, api_key=self.api_key, messages=_messages(prompt), stream=True, **kwargs)
+            for chunk in resp:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+_llms: Dict[Tuple[str, str, Optional[str], bool], Any] = {}
+_llms_lock = threading.Lock()
+
+def make_llm(crew: bool = False) -> Any:
+    """LLM client for the configured provider, built once per process and settings.
+
+    The default is a ChatLLM; `crew=True` returns a crewai LLM (imports crewai) for Agents.
+    """
+    s = llm_settings()
+    key = (s["provider"], s["model"], s["api_key"], crew)
+    with _llms_lock:
+        if key not in _llms:
+            if crew:
+                from crewai import LLM
+                _llms[key] = LLM(model=s["model"], api_key=s["api_key"])
+            else:
+                _llms[key] = ChatLLM(model=s["model"], api_key=s["api_key"])
+        return _llms[key]
+
+def set_llm(llm: Any, crew: bool = False) -> None:
+    """Install (or with None, drop) the LLM make_llm returns for the current settings."""
+    s = llm_settings()
+    key = (s["provider"], s["model"], s["api_key"], crew)
+    with _llms_lock:
+        if llm is None:
+            _llms.pop(key, None)
+        else:
+            _llms[key] = llm
+
+def stream_call(llm: Any, prompt: str) -> Iterator[str]:
+    """Yield the reply to `prompt` as text deltas.
+
+    Uses the LLM's own `stream` when it has one, otherwise streams through litellm with the
+    LLM's model/api_key; objects without a model fall back to one blocking `call`.
+    """
+    stream = getattr(llm, "stream", None)
+    if callable(stream):
+        yield from stream(prompt)
+        return
+    model = getattr(llm, "model", None)
+    if not model:
+        yield llm.call(prompt)
+        return
+    import litellm
+    resp = litellm.completion(
+        model=model,
+        api_key=getattr(llm, "api_key", None),
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+    )
+    for chunk in resp:
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+class CachedLLM:
+    """Wraps an LLM so identical prompts for the same provider+model are answered from disk.
+
+    Only `call` is intercepted; every other attribute passes through to the wrapped LLM.
+    `bypass=True` (or LLM_CACHE_BYPASS=true) skips both lookup and store, for debugging.
+    """
+
+    def __init__(self, llm: Any, provider: Optional[str] = None, model: Optional[str] = None,
+                 store: Optional[SqliteCache] = None, ttl: Optional[float] = None, bypass: Optional[bool] = None):
+        self.llm = llm
+        self.provider = provider or llm_settings()["provider"]
+        self.model = model or getattr(llm, "model", None) or llm_settings()["model"]
+        self.store = store or llm_store()
+        self.ttl = ttl if ttl is not None else float(os.getenv("LLM_CACHE_TTL", "86400"))
+        self.bypass = bypass if bypass is not None else env_flag("LLM_CACHE_BYPASS", "false")
+        self.bypassed = 0
+
+    def key(self, prompt: Any, **kwargs) -> str:
+        payload = json.dumps([self.provider, self.model, prompt, kwargs], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def call(self, prompt: Any, **kwargs) -> str:
+        if self.bypass:
+            self.bypassed += 1
+            return self.llm.call(prompt, **kwargs)
+        key = self.key(prompt, **kwargs)
+        row = self.store.get(key, max_age=self.ttl)
+        if row is not None:
+            return row[0].decode("utf-8")
+        text = self.llm.call(prompt, **kwargs)
+        if isinstance(text, str) and text.strip():
+            self.store.set(key, text.encode("utf-8"))
+        return text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Streaming counterpart of `call`: a hit yields the cached text in one piece."""
+        if self.bypass:
+            self.bypassed += 1
+            yield from stream_call(self.llm, prompt)
+            return
+        key = self.key(prompt)
+        row = self.store.get(key, max_age=self.ttl)
+        if row is not None:
+            yield row[0].decode("utf-8")
+            return
+        parts = []
+        for delta in stream_call(self.llm, prompt):
+            parts.append(delta)
+            yield delta
+        text = "".join(parts)
+        if text.strip():
+            self.store.set(key, text.encode("utf-8"))
+
+    def stats(self) -> Dict[str, float]:
+        return {**self.store.stats(), "bypassed": self.bypassed}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+_llm_store: Optional[SqliteCache] = None
+_llm_store_lock = threading.Lock()
+
+def llm_store() -> SqliteCache:
+    global _llm_store
+    if _llm_store is None:
+        with _llm_store_lock:
+            if _llm_store is None:
+                _llm_store = SqliteCache(
+                    os.path.join(cache_dir(), "llm.sqlite"),
+                    max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024,
+                )
+    return _llm_store
+
+metrics.register_cache("llm", lambda: _llm_store.stats() if _llm_store is not None else None)
+
+def cached_llm(llm: Any, bypass: Optional[bool] = None) -> Any:
+    """Wrap `llm` in a CachedLLM on the shared store, unless LLM_CACHE is off."""
+    if not env_flag("LLM_CACHE"):
+        return llm
+    return CachedLLM(llm, bypass=bypass)
@@ -0,0 +1,257 @@
+"""Background price refresher for products already in the local catalog.
+
+    python -m shopsmart.refresh            # run forever
+    python -m shopsmart.refresh --once     # one pass, then print stats
+
+Products are revisited in order of staleness x popularity, within a per-marketplace request
+budget. Pages are re-fetched with conditional GETs (ETag / Last-Modified); unchanged pages
+only bump their freshness, changed ones are re-extracted and upserted, and every observed
+price change is appended to a compact per-product history. Failed fetches back off
+exponentially and are dropped after REFRESH_MAX_FAILURES in a row.
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+from .core.cache import cache_dir, get_page_cache
+from .core.catalog import Catalog, get_catalog
+from .core.http import TokenBucket
+from .core.utils import fetch_conditional
+from .tools.extraction import marketplace_of
+from .tools.scrapers import parse_product
+
+class PriceHistory:
+    """Parallel float64 arrays of (timestamp, price); a point is added only when the price moves."""
+
+    def __init__(self, ts: Optional[array] = None, prices: Optional[array] = None):
+        self.ts = ts if ts is not None else array("d")
+        self.prices = prices if prices is not None else array("d")
+
+    def append(self, ts: float, price: float) -> bool:
+        if self.prices and self.prices[-1] == price:
+            return False
+        self.ts.append(ts)
+        self.prices.append(price)
+        return True
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def to_bytes(self) -> Tuple[bytes, bytes]:
+        return self.ts.tobytes(), self.prices.tobytes()
+
+    @classmethod
+    def from_bytes(cls, ts: bytes, prices: bytes) -> "PriceHistory":
+        a, b = array("d"), array("d")
+        a.frombytes(ts)
+        b.frombytes(prices)
+        return cls(a, b)
+
+class RefreshStore:
+    """Validators, body hash and price history per product, in refresh.sqlite."""
+
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or os.path.join(cache_dir(), "refresh.sqlite"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body_hash TEXT, "
+            "checked_at REAL, ts BLOB NOT NULL DEFAULT x'', prices BLOB NOT NULL DEFAULT x'', "
+            "failures INTEGER NOT NULL DEFAULT 0, retry_at REAL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(state)")}
+        if "failures" not in columns:  # refresh.sqlite from before backoff
+            self._db.execute("ALTER TABLE state ADD COLUMN failures INTEGER NOT NULL DEFAULT 0")
+            self._db.execute("ALTER TABLE state ADD COLUMN retry_at REAL")
+
+    def get(self, key: str) -> Dict[str, object]:
+        with self._lock:
+            row = self._db.execute("SELECT etag, last_modified, body_hash, checked_at, ts, prices FROM state WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return {"etag": None, "last_modified": None, "body_hash": None, "checked_at": None, "history": PriceHistory()}
+        return {"etag": row[0], "last_modified": row[1], "body_hash": row[2], "checked_at": row[3],
+                "history": PriceHistory.from_bytes(row[4], row[5])}
+
+    def put(self, key: str, etag: Optional[str], last_modified: Optional[str], body_hash: Optional[str], history: PriceHistory) -> None:
+        ts, prices = history.to_bytes()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO state (key, etag, last_modified, body_hash, checked_at, ts, prices) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, etag, last_modified, body_hash, time.time(), ts, prices),
+            )
+
+    def history(self, key: str) -> PriceHistory:
+        return self.get(key)["history"]
+
+    def fail(self, key: str, backoff: float, max_backoff: float) -> int:
+        """Record a failed refresh; the next attempt waits backoff x 2^(failures-1), at most max_backoff. Returns failures."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO state (key) VALUES (?)", (key,))
+            failures = self._db.execute("SELECT failures FROM state WHERE key = ?", (key,)).fetchone()[0] + 1
+            self._db.execute("UPDATE state SET failures = ?, retry_at = ?, checked_at = ? WHERE key = ?",
+                             (failures, now + min(max_backoff, backoff * 2 ** (failures - 1)), now, key))
+        return failures
+
+    def backoffs(self) -> Dict[str, Tuple[int, float, float]]:
+        """(failures, retry_at, failed_at) for every product whose last refresh failed."""
+        with self._lock:
+            rows = self._db.execute("SELECT key, failures, retry_at, checked_at FROM state WHERE failures > 0").fetchall()
+        return {key: (failures, retry_at, failed_at) for key, failures, retry_at, failed_at in rows}
+
+class RefreshScheduler:
+    """Refreshes catalog products within a per-marketplace request budget.
+
+    `per_domain_per_minute` (REFRESH_PER_DOMAIN_PER_MINUTE) caps requests per marketplace;
+    0 pauses refreshing. `unlimited=True` drops the cap altogether (tests, one-off backfills).
+    """
+
+    def __init__(self, catalog: Optional[Catalog] = None, store: Optional[RefreshStore] = None,
+                 per_domain_per_minute: Optional[float] = None, interval: Optional[float] = None, min_age: Optional[float] = None,
+                 unlimited: bool = False):
+        self.catalog = catalog or get_catalog() or Catalog()
+        self.store = store or RefreshStore()
+        rate = per_domain_per_minute if per_domain_per_minute is not None else float(os.getenv("REFRESH_PER_DOMAIN_PER_MINUTE", "20"))
+        self.rate: Optional[float] = None if unlimited else max(0.0, rate) / 60.0
+        self.interval = interval if interval is not None else float(os.getenv("REFRESH_INTERVAL", "60"))
+        # records younger than this are not worth a request yet
+        self.min_age = min_age if min_age is not None else float(os.getenv("REFRESH_MIN_AGE", "900"))
+        self.backoff = float(os.getenv("REFRESH_BACKOFF", "300"))
+        self.max_backoff = float(os.getenv("REFRESH_BACKOFF_MAX", "86400"))
+        self.max_failures = int(os.getenv("REFRESH_MAX_FAILURES", "6"))
+        self._budgets: Dict[str, TokenBucket] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # running totals, except backing_off / given_up: how many products the latest queue() skipped for each
+        self.stats = {"checked": 0, "not_modified": 0, "unchanged_body": 0, "changed": 0, "price_points": 0, "errors": 0, "deferred": 0,
+                      "backing_off": 0, "given_up": 0}
+
+    def budget(self, market: str) -> TokenBucket:
+        if market not in self._budgets:
+            burst = max(1, int(self.rate * 60)) if self.rate else 0
+            self._budgets[market] = TokenBucket(self.rate, burst)
+        return self._budgets[market]
+
+    def queue(self, now: Optional[float] = None) -> List[Tuple[float, str, str]]:
+        """Heap of (-priority, key, url); priority = age in seconds x (1 + times served).
+
+        Products whose last refresh failed wait out their backoff. After `max_failures` in a
+        row they are left alone until something else (a pipeline run) fetches them again.
+        """
+        now = now or time.time()
+        backoffs = self.store.backoffs()
+        heap = []
+        backing_off = given_up = 0
+        for key, url, fetched_at, hits in self.catalog.refresh_candidates():
+            age = now - fetched_at
+            if age < self.min_age:
+                continue
+            if key in backoffs:
+                failures, retry_at, failed_at = backoffs[key]
+                if failures >= self.max_failures and fetched_at <= failed_at:
+                    given_up += 1
+                    continue
+                if failures < self.max_failures and retry_at > now:
+                    backing_off += 1
+                    continue
+            heap.append((-(age * (1 + hits)), key, url))
+        self.stats.update(backing_off=backing_off, given_up=given_up)
+        heapq.heapify(heap)
+        return heap
+
+    def refresh(self, key: str, url: str) -> None:
+        state = self.store.get(key)
+        history: PriceHistory = state["history"]
+        try:
+            html, validators = fetch_conditional(url, etag=state["etag"], last_modified=state["last_modified"])
+        except Exception:
+            self.store.fail(key, self.backoff, self.max_backoff)
+            raise
+        self.stats["checked"] += 1
+        etag = validators.get("etag") or state["etag"]
+        last_modified = validators.get("last_modified") or state["last_modified"]
+        if html is None:
+            self.stats["not_modified"] += 1
+            self.catalog.mark_fresh(url)
+            self.store.put(key, etag, last_modified, state["body_hash"], history)
+            return
+        body_hash = hashlib.sha1(html.encode("utf-8", "replace")).hexdigest()
+        if body_hash == state["body_hash"]:
+            # server ignored the validators but the page is byte-identical
+            self.stats["unchanged_body"] += 1
+            self.catalog.mark_fresh(url)
+            self.store.put(key, etag, last_modified, body_hash, history)
+            return
+        self.stats["changed"] += 1
+        product = parse_product(html, url)
+        cache = get_page_cache()
+        if cache is not None:
+            cache.put_html(url, html)
+        if product is not None:
+            self.catalog.upsert(product)
+            if cache is not None:
+                cache.put_product(url, product)
+            if product.price is not None and history.append(time.time(), product.price):
+                self.stats["price_points"] += 1
+        self.store.put(key, etag, last_modified, body_hash, history)
+
+    def run_once(self, max_requests: Optional[int] = None) -> Dict[str, int]:
+        """One pass over the queue, most urgent first, skipping marketplaces out of budget."""
+        heap = self.queue()
+        done = 0
+        while heap and (max_requests is None or done < max_requests) and not self._stop.is_set():
+            _, key, url = heapq.heappop(heap)
+            if not self.budget(marketplace_of(url)).try_acquire():
+                self.stats["deferred"] += 1
+                continue
+            try:
+                self.refresh(key, url)
+            except Exception:
+                self.stats["errors"] += 1
+            done += 1
+        return dict(self.stats)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self) -> "RefreshScheduler":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="price-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m shopsmart.refresh", description="Keep catalog prices fresh in the background.")
+    ap.add_argument("--once", action="store_true", help="run a single pass and exit")
+    ap.add_argument("--max-requests", type=int, default=None)
+    args = ap.parse_args(argv)
+    scheduler = RefreshScheduler()
+    if args.once:
+        print(json.dumps(scheduler.run_once(args.max_requests)), file=sys.stderr)
+        return 0
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""Pipeline job service: a bounded worker pool with admission control and single-flight coalescing.
+
+    job = get_service().submit("airpods pro under 9000")
+    for event in job.events():      # replays what already happened, then follows live
+        ...
+    result = job.result()
+
+Identical requests (query up to case and spacing + constraints + LLM provider/model) submitted while
+one is queued or running, or within PIPELINE_SHARE_SECONDS after it finished, attach to
+that job instead of starting another Tavily + fetch + LLM run.
+"""
+from __future__ import annotations
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import numpy as np
+from .agents import iter_pipeline
+from .core import metrics
+from .core.models import PipelineDone, PipelineEvent
+from .llm import llm_settings
+
+JOBS_TOTAL = metrics.counter("shopsmart_jobs_total", "Pipeline job submissions by outcome (started/coalesced/rejected).")
+JOB_WAIT = metrics.histogram("shopsmart_job_queue_wait_seconds", "Time a pipeline job waited for a worker.")
+
+class ServiceBusy(Exception):
+    """The job queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, depth: int, retry_after: float):
+        super().__init__(f"{depth} pipeline jobs already queued; retry in ~{retry_after:.0f}s")
+        self.depth = depth
+        self.retry_after = retry_after
+
+class Job:
+    """One pipeline run shared by every request that coalesced onto it."""
+
+    def __init__(self, id: str, key: str, query: str):
+        self.id, self.key, self.query = id, key, query
+        self.status = "queued"  # queued -> running -> done | failed
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.subscribers = 1
+        self.error: Optional[BaseException] = None
+        self._events: List[PipelineEvent] = []
+        self._cond = threading.Condition()
+
+    @property
+    def wait_seconds(self) -> float:
+        """Time spent queued (so far, if still waiting)."""
+        return (self.started_at or time.time()) - self.submitted_at
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def _push(self, event: PipelineEvent) -> None:
+        with self._cond:
+            self._events.append(event)
+            self._cond.notify_all()
+
+    def _set(self, status: str, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self.status = status
+            self.error = error
+            if status == "running":
+                self.started_at = time.time()
+            else:
+                self.finished_at = time.time()
+            self._cond.notify_all()
+
+    def poll(self, since: int = 0, timeout: Optional[float] = None) -> List[PipelineEvent]:
+        """Events from index `since` on, waiting up to `timeout` seconds for one when there are none yet."""
+        with self._cond:
+            if len(self._events) <= since and not self.finished and timeout != 0:
+                self._cond.wait(timeout)
+            return self._events[since:]
+
+    def events(self, timeout: Optional[float] = None) -> Iterator[PipelineEvent]:
+        """Every event from the start, then live ones until the job finishes; re-raises a pipeline failure.
+
+        `timeout` bounds the wait for each next event (TimeoutError when it passes).
+        """
+        i = 0
+        while True:
+            batch = self.poll(i, timeout)
+            if not batch:
+                if self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                if timeout is not None:
+                    raise TimeoutError(f"no pipeline event within {timeout}s")
+                continue
+            i += len(batch)
+            yield from batch
+
+    def result(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """The run_pipeline result dict once the job is done."""
+        out: Dict[str, Any] = {}
+        for event in self.events(timeout):
+            if isinstance(event, PipelineDone):
+                out = event.result
+        return out
+
+class PipelineService:
+    """Runs pipelines on `workers` threads; at most `max_queue` distinct jobs may wait for one."""
+
+    def __init__(self, workers: Optional[int] = None, max_queue: Optional[int] = None, share_seconds: Optional[float] = None,
+                 runner: Callable[..., Iterator[PipelineEvent]] = iter_pipeline):
+        self.workers = workers or int(os.getenv("PIPELINE_WORKERS", "4"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("PIPELINE_MAX_QUEUE", "32"))
+        self.share_seconds = share_seconds if share_seconds is not None else float(os.getenv("PIPELINE_SHARE_SECONDS", "10"))
+        self._runner = runner
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pipeline")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}   # coalescing key -> latest job
+        self._by_id: Dict[str, Job] = {}
+        self._ids = itertools.count(1)
+        self._waits: List[float] = []     # recent queue waits (seconds)
+        self._run_seconds: List[float] = []
+        self.counts = {"started": 0, "coalesced": 0, "rejected": 0, "done": 0, "failed": 0}
+
+    @staticmethod
+    def job_key(query: str, constraints: Optional[Dict[str, Any]] = None, **opts) -> str:
+        s = llm_settings()
+        extra = {k: v for k, v in {**(constraints or {}), **opts}.items() if v not in (None, "", [], 0)}
+        # word order matters here ("case for iphone" is not "iphone for case"), unlike the search cache's key
+        query = " ".join(query.lower().split())
+        return f"{s['provider']}|{s['model']}|{query}|{json.dumps(extra, sort_keys=True, default=str)}"
+
+    def _queued(self) -> int:
+        return sum(1 for j in self._by_id.values() if j.status == "queued")
+
+    def _running(self) -> int:
+        return sum(1 for j in self._by_id.values() if j.status == "running")
+
+    def _prune(self, now: float) -> None:
+        for key, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.share_seconds:
+                del self._jobs[key]
+        for id, job in list(self._by_id.items()):
+            if job.finished and now - job.finished_at > max(self.share_seconds, 300):
+                del self._by_id[id]
+
+    def submit(self, query: str, constraints: Optional[Dict[str, Any]] = None, **opts) -> Job:
+        """Attach to an identical in-flight (or just finished) job, or queue a new one.
+
+        Raises ServiceBusy when a new job is needed and `max_queue` jobs are already waiting.
+        `opts` go to iter_pipeline (max_workers, per_domain, cache_bypass, plan).
+        """
+        key = self.job_key(query, constraints, **opts)
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            job = self._jobs.get(key)
+            if job is not None and (not job.finished or (job.status == "done" and now - job.finished_at <= self.share_seconds)):
+                job.subscribers += 1
+                self.counts["coalesced"] += 1
+                JOBS_TOTAL.inc(outcome="coalesced")
+                return job
+            depth = self._queued()
+            if self.max_queue and depth >= self.max_queue:
+                self.counts["rejected"] += 1
+                JOBS_TOTAL.inc(outcome="rejected")
+                raise ServiceBusy(depth, self._eta(depth))
+            job = Job(f"job-{next(self._ids)}", key, query)
+            self._jobs[key] = self._by_id[job.id] = job
+            self.counts["started"] += 1
+            JOBS_TOTAL.inc(outcome="started")
+        self._pool.submit(self._run, job, query, constraints, opts)
+        return job
+
+    def _run(self, job: Job, query: str, constraints: Optional[Dict[str, Any]], opts: Dict[str, Any]) -> None:
+        job._set("running")
+        JOB_WAIT.observe(job.wait_seconds)
+        error: Optional[BaseException] = None
+        try:
+            for event in self._runner(query, constraints=constraints, **opts):
+                job._push(event)
+        except Exception as e:  # surfaced to subscribers by Job.events()
+            error = e
+        status = "failed" if error is not None else "done"
+        # book-keeping first, so stats() is current by the time waiters wake up
+        with self._lock:
+            self.counts[status] += 1
+            self._waits = (self._waits + [job.wait_seconds])[-500:]
+            self._run_seconds = (self._run_seconds + [time.time() - job.started_at])[-500:]
+        job._set(status, error)
+
+    def _eta(self, ahead: int) -> float:
+        """Rough seconds until a job queued behind `ahead` others starts."""
+        run = float(np.median(self._run_seconds)) if self._run_seconds else 10.0
+        return run * (ahead // self.workers + 1)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._by_id.get(job_id)
+
+    def position(self, job: Job) -> int:
+        """Jobs queued ahead of `job` (0 once it runs)."""
+        with self._lock:
+            if job.status != "queued":
+                return 0
+            return sum(1 for j in self._by_id.values() if j.status == "queued" and j.submitted_at < job.submitted_at)
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth, running jobs, submission counts and queue-wait percentiles (ms)."""
+        with self._lock:
+            out: Dict[str, float] = {"queued": self._queued(), "running": self._running(), "workers": self.workers, **self.counts}
+            waits = list(self._waits)
+        if waits:
+            a = np.asarray(waits) * 1000
+            out.update(wait_p50_ms=float(np.percentile(a, 50)), wait_p90_ms=float(np.percentile(a, 90)),
+                       wait_max_ms=float(a.max()))
+        return out
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+_service: Optional[PipelineService] = None
+_service_lock = threading.Lock()
+
+def get_service() -> PipelineService:
+    """Process-wide job service (one per Streamlit server, shared by every session)."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = PipelineService()
+    return _service
+
+def set_service(service: Optional[PipelineService]) -> None:
+    global _service
+    _service = service
+
+metrics.gauge("shopsmart_jobs_queued", "Pipeline jobs waiting for a worker.", lambda: _service.stats()["queued"] if _service else 0)
+metrics.gauge("shopsmart_jobs_running", "Pipeline jobs running.", lambda: _service.stats()["running"] if _service else 0)
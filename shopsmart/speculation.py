@@ -0,0 +1,105 @@
+"""Speculative search: start Tavily (and the first extractions) while the planner LLM runs.
+
+The speculative query is the rule parser's cleaned-up input. When the LLM plan arrives its
+query is compared with the speculative one; close enough and the speculative URLs (and
+any products already extracted from them) are used, otherwise a fresh search is issued.
+"""
+from __future__ import annotations
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from rapidfuzz import fuzz
+from .core import metrics
+from .core.models import Product
+from .tools.tavily_tool import normalize_query
+
+SPECULATION_TOTAL = metrics.counter("shopsmart_speculation_total", "Speculative searches by outcome (hit/miss/error).")
+SPECULATION_SIMILARITY = metrics.histogram("shopsmart_speculation_similarity", "Planned vs speculative query similarity (0-100).",
+                                           (50, 60, 70, 75, 80, 85, 90, 95, 100))
+
+_stats = {"hits": 0, "misses": 0, "errors": 0}
+_stats_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def speculation_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=int(os.getenv("SPECULATIVE_WORKERS", "8")), thread_name_prefix="speculate")
+    return _pool
+
+def speculation_stats() -> Dict[str, float]:
+    """Process-wide hits/misses/errors and hit rate, for tuning SPECULATIVE_THRESHOLD."""
+    with _stats_lock:
+        s = dict(_stats)
+    decided = s["hits"] + s["misses"]
+    return {**s, "hit_rate": s["hits"] / decided if decided else 0.0}
+
+def similarity(speculative: str, planned: str) -> float:
+    """token_set_ratio: a planned query that only drops words from the user's own text scores 100."""
+    return fuzz.token_set_ratio(normalize_query(speculative), normalize_query(planned))
+
+class SpeculativeSearch:
+    """One in-flight speculative search, plus extraction of its first `extract_first` URLs."""
+
+    def __init__(self, query: str, search: Callable[..., List[str]], extract: Callable[[str], Optional[Product]],
+                 max_results: int = 12, extract_first: Optional[int] = None, threshold: Optional[float] = None):
+        self.query = query
+        self.max_results = max_results
+        self.threshold = threshold if threshold is not None else float(os.getenv("SPECULATIVE_THRESHOLD", "80"))
+        self._search = search
+        self._extract = extract
+        self._extract_first = extract_first if extract_first is not None else int(os.getenv("SPECULATIVE_EXTRACT", "4"))
+        self._products: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self.future = speculation_pool().submit(self._run)
+
+    def _safe_extract(self, url: str) -> Optional[Product]:
+        try:
+            return self._extract(url)
+        except Exception:
+            return None
+
+    def _run(self) -> List[str]:
+        urls = self._search(self.query, max_results=self.max_results)
+        with self._lock:
+            if not self._cancelled:
+                for u in urls[:self._extract_first]:
+                    self._products[u] = speculation_pool().submit(self._safe_extract, u)
+        return urls
+
+    def resolve(self, planned_query: str) -> Tuple[Optional[List[str]], float]:
+        """(speculative URLs, similarity) when they can stand in for `planned_query`'s search, else (None, similarity)."""
+        score = similarity(self.query, planned_query)
+        SPECULATION_SIMILARITY.observe(score)
+        outcome = "miss"
+        urls = None
+        if score >= self.threshold:
+            try:
+                urls = self.future.result()
+                outcome = "hit"
+            except Exception:
+                outcome = "error"
+        if outcome != "hit":
+            self.cancel()
+        SPECULATION_TOTAL.inc(outcome=outcome)
+        with _stats_lock:
+            _stats[{"hit": "hits", "miss": "misses", "error": "errors"}[outcome]] += 1
+        return urls, score
+
+    def products(self) -> Dict[str, Future]:
+        """url -> Future[Optional[Product]] for the speculatively extracted pages."""
+        with self._lock:
+            return dict(self._products)
+
+    def cancel(self) -> None:
+        """Stop anything not started yet; finished work stays in the page cache."""
+        with self._lock:
+            self._cancelled = True
+            self.future.cancel()
+            for fut in self._products.values():
+                fut.cancel()
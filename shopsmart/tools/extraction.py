@@ -0,0 +1,198 @@
+from __future__ import annotations
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from ..core import metrics
+from ..core.models import Product
+from ..core.utils import domain_of
+from .scrapers import extract_product, AMAZON_DOMAINS, JUMIA_DOMAINS, NOON_DOMAINS
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PER_DOMAIN = 4
+
+def marketplace_of(url: str) -> str:
+    """Group a URL under its marketplace so per-site limits apply across www/bare hosts."""
+    host = domain_of(url)
+    if host in AMAZON_DOMAINS:
+        return "amazon.eg"
+    if host in JUMIA_DOMAINS:
+        return "jumia.com.eg"
+    if host in NOON_DOMAINS:
+        return "noon.com"
+    return host
+
+def _parse_limits(raw: str) -> Tuple[int, Dict[str, int]]:
+    """Parse EXTRACT_PER_DOMAIN: either "4" or "amazon.eg=2,noon.com=3[,default=4]"."""
+    default, limits = DEFAULT_PER_DOMAIN, {}
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            k, v = part.split("=", 1)
+            if k.strip() == "default":
+                default = int(v)
+            else:
+                limits[k.strip().lower()] = int(v)
+        else:
+            default = int(part)
+    return default, limits
+
+def _resolve_config(max_workers: Optional[int], per_domain: Union[int, Dict[str, int], None]):
+    if max_workers is None:
+        max_workers = int(os.getenv("EXTRACT_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+    if per_domain is None:
+        default, limits = _parse_limits(os.getenv("EXTRACT_PER_DOMAIN", ""))
+    elif isinstance(per_domain, int):
+        default, limits = per_domain, {}
+    else:
+        default, limits = per_domain.get("default", DEFAULT_PER_DOMAIN), dict(per_domain)
+    return max(1, max_workers), max(1, default), limits
+
+HEDGE_TOTAL = metrics.counter("shopsmart_extract_hedges_total", "Hedged (duplicate) page extractions by marketplace and winner.")
+
+# recent extraction latencies per marketplace, for the hedge delay
+_latencies: Dict[str, Deque[float]] = {}
+_latencies_lock = threading.Lock()
+
+def _record_latency(market: str, seconds: float) -> None:
+    with _latencies_lock:
+        _latencies.setdefault(market, deque(maxlen=64)).append(seconds)
+
+def hedge_after(market: str) -> float:
+    """Seconds before a still-running page gets a duplicate request.
+
+    The marketplace's recent p90 extraction time (EXTRACT_HEDGE_PERCENTILE), never below
+    EXTRACT_HEDGE_MIN; EXTRACT_HEDGE_AFTER until eight samples exist.
+    """
+    with _latencies_lock:
+        samples = list(_latencies.get(market, ()))
+    if len(samples) < 8:
+        return float(os.getenv("EXTRACT_HEDGE_AFTER", "2.0"))
+    pct = float(np.percentile(samples, float(os.getenv("EXTRACT_HEDGE_PERCENTILE", "90"))))
+    return max(float(os.getenv("EXTRACT_HEDGE_MIN", "0.5")), pct)
+
+def iter_extract(
+    urls: List[str],
+    max_workers: Optional[int] = None,
+    per_domain: Union[int, Dict[str, int], None] = None,
+    deadline: Optional[float] = None,
+    stop: Optional[Callable[[], bool]] = None,
+    max_hedges: Optional[int] = None,
+) -> Iterator[Tuple[int, str, Optional[Product]]]:
+    """Extract products concurrently, yielding (index, url, product) as each page completes.
+
+    Concurrency is capped globally (max_workers) and per marketplace (per_domain) so a
+    single site never sees more than its share of parallel requests; URLs are dispatched
+    in order as slots free up. Failed pages yield None.
+
+    A page still running after hedge_after(its marketplace) gets one duplicate request
+    (at most `max_hedges`, EXTRACT_HEDGES, per call) when its marketplace is below its cap;
+    duplicates, and losers still finishing, count toward that cap. Whichever copy finishes
+    first wins. The
+    iterator ends early at `deadline` (a time.monotonic() value) or once `stop()` returns
+    True, yielding pages that already finished but not waiting for the rest; pages it
+    never yielded were skipped.
+    """
+    if not urls:
+        return
+    max_workers, default, limits = _resolve_config(max_workers, per_domain)
+    max_hedges = max_hedges if max_hedges is not None else int(os.getenv("EXTRACT_HEDGES", "2"))
+    deadline = deadline if deadline is not None else math.inf
+    markets = [marketplace_of(u) for u in urls]
+    in_flight: Dict[str, int] = {}
+    pending = list(range(len(urls)))
+
+    def work(u: str, market: str) -> Optional[Product]:
+        t0 = time.monotonic()
+        try:
+            return extract_product(u)
+        except Exception:
+            return None
+        finally:
+            _record_latency(market, time.monotonic() - t0)
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)) + max(0, max_hedges), thread_name_prefix="extract")
+    running: Dict[object, int] = {}
+    started: Dict[int, float] = {}
+    hedged: Dict[int, object] = {}  # index -> the duplicate's future
+    draining: Dict[object, int] = {}  # losing copies still holding a marketplace slot
+    resolved = set()
+
+    def dispatch():
+        # submit in URL order, skipping marketplaces already at their cap
+        for i in list(pending):
+            if len(started) - len(resolved) >= max_workers:
+                break
+            m = markets[i]
+            if in_flight.get(m, 0) >= limits.get(m, default):
+                continue
+            in_flight[m] = in_flight.get(m, 0) + 1
+            pending.remove(i)
+            started[i] = time.monotonic()
+            running[pool.submit(work, urls[i], m)] = i
+
+    def hedge(now: float) -> float:
+        """Duplicate overdue pages; returns seconds until the next one is due."""
+        due = math.inf
+        for i in [i for i in started if i not in resolved and i not in hedged]:
+            if len(hedged) >= max_hedges:
+                break
+            m = markets[i]
+            at = started[i] + hedge_after(m)
+            if at > now:
+                due = min(due, at - now)
+            elif in_flight.get(m, 0) < limits.get(m, default):  # at its cap: retried once a request there ends
+                in_flight[m] += 1
+                hedged[i] = pool.submit(work, urls[i], m)
+                running[hedged[i]] = i
+        return due
+
+    try:
+        while True:
+            ending = stop is not None and stop()
+            if not ending:
+                dispatch()
+            if not running:
+                return
+            now = time.monotonic()
+            ending = ending or now >= deadline
+            # when ending, only collect pages that have already finished
+            wake = 0.0 if ending else min(deadline - now, hedge(now))
+            done, _ = wait([*running, *draining], timeout=None if math.isinf(wake) else max(0.0, wake), return_when=FIRST_COMPLETED)
+            for fut in done:
+                i = running.pop(fut, None)
+                if i is None:
+                    i = draining.pop(fut)
+                in_flight[markets[i]] -= 1
+                if i in resolved:
+                    continue
+                p = fut.result()
+                if p is None and any(j == i for j in running.values()):
+                    continue  # one copy failed; give the other its chance
+                if i in hedged:
+                    HEDGE_TOTAL.inc(marketplace=markets[i], winner="hedge" if fut is hedged[i] else "primary")
+                resolved.add(i)
+                yield i, urls[i], p
+            for fut in [f for f, i in running.items() if i in resolved]:
+                draining[fut] = running.pop(fut)  # losing duplicates finish in the background
+            if ending:
+                return
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def extract_products(
+    urls: List[str],
+    max_workers: Optional[int] = None,
+    per_domain: Union[int, Dict[str, int], None] = None,
+) -> List[Product]:
+    """Concurrent equivalent of extracting each URL in turn; results keep the input URL order."""
+    slots: List[Optional[Product]] = [None] * len(urls)
+    for i, _, p in iter_extract(urls, max_workers=max_workers, per_domain=per_domain):
+        slots[i] = p
+    return [p for p in slots if p]
@@ -1,22 +1,45 @@
 from __future__ import annotations
-from bs4 import BeautifulSoup
-from typing import List, Optional, Dict
-import re, json
-import extruct
-from w3lib.html import get_base_url
+from typing import Iterator, List, Optional, Dict, Tuple
+import os, re, json, threading
+import lxml.html
+from lxml import etree
+from ..core import metrics
 from ..core.models import Product
-from ..core.utils import fetch, parse_price_to_float, domain_of
+from ..core.utils import fetch, fetch_stream, parse_price_to_float, domain_of, FetchError
+from ..core.cache import env_flag, get_page_cache, merge_static
 
 AMAZON_DOMAINS = {"amazon.eg", "www.amazon.eg"}
 JUMIA_DOMAINS = {"jumia.com.eg", "www.jumia.com.eg"}
 NOON_DOMAINS = {"noon.com", "www.noon.com"}
 
-def _extract_jsonld(html: str, url: str) -> Dict:
-    base_url = get_base_url(html, url)
-    data = extruct.extract(html, base_url=base_url, syntaxes=["json-ld"], errors="log")
-    items = data.get("json-ld", []) if data else []
-    for it in items:
-        if isinstance(it, dict) and it.get("@type") in ("Product","ProductGroup"):
+_LDJSON_RE = re.compile(
+    r"<script[^>]*?type\s*=\s*[\"']?application/ld\+json[^>]*>(.*?)</script\s*>", re.I | re.S
+)
+
+def _jsonld_items(html: str) -> Iterator[Dict]:
+    """Yield JSON-LD objects straight from <script> blocks, without building a DOM."""
+    for m in _LDJSON_RE.finditer(html):
+        raw = m.group(1).strip()
+        if raw.startswith("<!--"):
+            raw = raw[4:].rsplit("-->", 1)[0]
+        raw = raw.replace("<![CDATA[", "").replace("]]>", "")
+        try:
+            data = json.loads(raw, strict=False)
+        except ValueError:
+            continue
+        stack = data if isinstance(data, list) else [data]
+        for it in stack:
+            if isinstance(it, dict):
+                yield it
+                graph = it.get("@graph")
+                if isinstance(graph, list):
+                    yield from (g for g in graph if isinstance(g, dict))
+
+def _extract_jsonld(html: str, url: str = "") -> Dict:
+    for it in _jsonld_items(html):
+        kind = it.get("@type")
+        kinds = kind if isinstance(kind, list) else [kind]
+        if any(k in ("Product","ProductGroup") for k in kinds):
             return it
     return {}
 
@@ -67,45 +90,105 @@ def _from_jsonld(ld: Dict, url: str, source: str) -> Optional[Product]:
     )
     return p
 
-def _from_dom(html: str, url: str, source: str) -> Product:
-    soup = BeautifulSoup(html, "lxml")
-    title = soup.select_one("meta[property='og:title']") or soup.select_one("title")
-    title_text = title.get("content") if title and title.has_attr("content") else (title.get_text(strip=True) if title else "Unknown")
-    # Heuristics for price across sites
-    candidates = []
-    for sel in [
-        "[data-asin-price]", "#priceblock_ourprice", "#priceblock_dealprice", "[data-old-price]",
-        ".price ._price", ".-fs24", ".price-number", ".product-price", "meta[itemprop='price']",
-        "span[data-price]", "span.price", "div.price"
-    ]:
-        node = soup.select_one(sel)
-        if node:
-            candidates.append(node.get("content") if node.has_attr("content") else node.get_text(" ", strip=True))
-    price = None
-    for c in candidates:
-        price = parse_price_to_float(c)
-        if price:
-            break
-    # Rating
-    rating = None
-    for sel in ["i[data-hook='average-star-rating'] span", "span[data-hook='rating-out-of-text']", ".rating-stars", ".rating .-fs16", "span.rating__value"]:
-        node = soup.select_one(sel)
-        if node:
-            m = re.search(r"(\d[\d\. ]*)", node.get_text(" ", strip=True))
-            if m:
-                try:
-                    rating = float(m.group(1).replace(" ", ""))
-                except Exception:
-                    pass
-            if rating:
-                break
-    # Images
-    images = []
-    for im in soup.select("img"):
-        src = im.get("src") or im.get("data-src")
-        if src and src.startswith("http"):
-            images.append(src)
-    images = images[:5]
+def _cls(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+# CSS heuristics from the original BeautifulSoup version, precompiled once as XPath.
+_PRICE_XPATHS = {
+    "data-asin-price": "//*[@data-asin-price]",
+    "priceblock_ourprice": "//*[@id='priceblock_ourprice']",
+    "priceblock_dealprice": "//*[@id='priceblock_dealprice']",
+    "data-old-price": "//*[@data-old-price]",
+    "price _price": f"//*[{_cls('price')}]//*[{_cls('_price')}]",
+    "-fs24": f"//*[{_cls('-fs24')}]",
+    "price-number": f"//*[{_cls('price-number')}]",
+    "product-price": f"//*[{_cls('product-price')}]",
+    "itemprop price": "//meta[@itemprop='price']",
+    "span data-price": "//span[@data-price]",
+    "span.price": f"//span[{_cls('price')}]",
+    "div.price": f"//div[{_cls('price')}]",
+}
+_RATING_XPATHS = {
+    "average-star-rating": "//i[@data-hook='average-star-rating']//span",
+    "rating-out-of-text": "//span[@data-hook='rating-out-of-text']",
+    "rating-stars": f"//*[{_cls('rating-stars')}]",
+    "rating -fs16": f"//*[{_cls('rating')}]//*[{_cls('-fs16')}]",
+    "rating__value": f"//span[{_cls('rating__value')}]",
+}
+_AMAZON_PRICE = ["data-asin-price", "priceblock_ourprice", "priceblock_dealprice"]
+_JUMIA_PRICE = ["-fs24", "data-old-price", "price _price"]
+_NOON_PRICE = ["price-number", "product-price"]
+# per-site order: that marketplace's own selectors first, then the generic fallbacks
+_SITE_PRICE_ORDER = {
+    source: first + [k for k in _PRICE_XPATHS if k not in first]
+    for source, first in (("amazon.eg", _AMAZON_PRICE), ("jumia.com.eg", _JUMIA_PRICE), ("noon.com/egypt-en", _NOON_PRICE))
+}
+_SITE_RATING_ORDER = {
+    "amazon.eg": ["average-star-rating", "rating-out-of-text", "rating-stars", "rating -fs16", "rating__value"],
+    "jumia.com.eg": ["rating -fs16", "rating-stars", "rating__value", "average-star-rating", "rating-out-of-text"],
+    "noon.com/egypt-en": ["rating__value", "rating-stars", "rating -fs16", "average-star-rating", "rating-out-of-text"],
+}
+_COMPILED = {k: etree.XPath(v) for k, v in {**_PRICE_XPATHS, **_RATING_XPATHS}.items()}
+_TITLE_XPATH = etree.XPath("(//meta[@property='og:title'] | //title)")
+_rating_re = re.compile(r"(\d[\d\. ]*)")
+_parser = threading.local()
+
+def _html_tree(html: str):
+    # lxml parsers must not be shared between threads; parse bytes so <?xml encoding?> is tolerated
+    if not hasattr(_parser, "p"):
+        _parser.p = lxml.html.HTMLParser(encoding="utf-8")
+    try:
+        return lxml.html.document_fromstring(html.encode("utf-8", "replace"), parser=_parser.p)
+    except (etree.ParserError, ValueError):
+        return None
+
+def _node_text(node) -> str:
+    if node.get("content") is not None:
+        return node.get("content")
+    return " ".join(t.strip() for t in node.itertext() if t.strip())
+
+def _first(tree, key: str):
+    """First match in document order. libxml2 evaluates the whole expression either way (a
+    trailing [1] does not stop the walk), so the saving is in trying fewer selectors."""
+    found = _COMPILED[key](tree)
+    return found[0] if found else None
+
+def _from_dom(html: str, url: str, source: str, tree=None) -> Product:
+    tree = tree if tree is not None else _html_tree(html)
+    title_text, price, rating, images = "Unknown", None, None, []
+    if tree is not None:
+        titles = _TITLE_XPATH(tree)
+        og = next((t for t in titles if t.tag == "meta"), None)
+        if og is not None and og.get("content") is not None:
+            title_text = og.get("content")
+        elif titles:
+            title_text = "".join(t.strip() for t in titles[0].itertext()) or "Unknown"
+        # Heuristics for price across sites; stop at the first selector that parses
+        for key in _SITE_PRICE_ORDER.get(source, list(_PRICE_XPATHS)):
+            node = _first(tree, key)
+            if node is not None:
+                price = parse_price_to_float(_node_text(node))
+                if price:
+                    break
+        # Rating
+        for key in _SITE_RATING_ORDER.get(source, list(_RATING_XPATHS)):
+            node = _first(tree, key)
+            if node is not None:
+                m = _rating_re.search(" ".join(t.strip() for t in node.itertext() if t.strip()))
+                if m:
+                    try:
+                        rating = float(m.group(1).replace(" ", ""))
+                    except Exception:
+                        pass
+                if rating:
+                    break
+        # Images: first five absolute URLs
+        for im in tree.iter("img"):
+            src = im.get("src") or im.get("data-src")
+            if src and src.startswith("http"):
+                images.append(src)
+                if len(images) == 5:
+                    break
     return Product(
         title=title_text,
         url=url,
@@ -119,20 +202,156 @@ def _from_dom(html: str, url: str, source: str) -> Product:
         extra={"jsonld": "false"}
     )
 
-def extract_product(url: str) -> Optional[Product]:
-    html = fetch(url)
+_LD_OPEN_RE = re.compile(r"<script[^>]*?type\s*=\s*[\"']?application/ld\+json[^>]*>", re.I)
+_SCRIPT_CLOSE_RE = re.compile(r"</script\s*>", re.I)
+_HEAD_CLOSE_RE = re.compile(r"</head\s*>", re.I)
+# raw-markup hints that the price region has started (same selectors as the DOM heuristics)
+_PRICE_MARKERS = {
+    "amazon.eg": ("data-asin-price", "priceblock_ourprice", "priceblock_dealprice", "corePrice", "a-price"),
+    "jumia.com.eg": ("-fs24", "data-old-price", "-prc"),
+    "noon.com/egypt-en": ("price-number", "priceNow", "product-price"),
+}
+
+class PageScanner:
+    """Stop condition for streamed product pages, fed decoded text chunk by chunk.
+
+    Complete once a JSON-LD Product block has fully arrived, or once </head> and the
+    marketplace's price markup have been seen plus `tail` more characters (rating and
+    images sit just after the price). Only each new chunk (plus a small overlap) is
+    scanned; the text is joined when a JSON-LD block closes and at the end.
+    """
+
+    OVERLAP = 64
+
+    def __init__(self, url: str, tail: int = 16384):
+        self.markers = _PRICE_MARKERS.get(source_of(url) or "", ())
+        self.tail = tail
+        self.parts: List[str] = []
+        self.size = 0
+        self.found: Optional[str] = None
+        self._window_tail = ""
+        self._ld_open: List[int] = []
+        self._last_open = -1
+        self._head_end: Optional[int] = None
+        self._price_at: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def feed(self, chunk: str) -> bool:
+        if self.found or not chunk:
+            return bool(self.found)
+        base = self.size - len(self._window_tail)
+        window = self._window_tail + chunk
+        self.parts.append(chunk)
+        self.size += len(chunk)
+        self._window_tail = window[-self.OVERLAP:]
+        for m in _LD_OPEN_RE.finditer(window):
+            if base + m.end() > self._last_open:
+                self._last_open = base + m.end()
+                self._ld_open.append(self._last_open)
+        if self._ld_open:
+            closes = [base + m.start() for m in _SCRIPT_CLOSE_RE.finditer(window)]
+            if any(c > self._ld_open[0] for c in closes):
+                last = max(closes)
+                self._ld_open = [o for o in self._ld_open if o > last]
+                if _extract_jsonld(self.text):
+                    self.found = "jsonld"
+                    return True
+        if self._head_end is None:
+            m = _HEAD_CLOSE_RE.search(window)
+            if m:
+                self._head_end = base + m.end()
+        if self._price_at is None:
+            hits = [i for i in (window.find(k) for k in self.markers) if i >= 0]
+            if hits:
+                self._price_at = base + min(hits)
+        if (self._head_end is not None and self._price_at is not None and not self._ld_open
+                and self.size >= self._price_at + self.tail):
+            self.found = "dom"
+        return bool(self.found)
+
+def max_bytes_for(url: str) -> int:
+    """FETCH_MAX_BYTES for the URL's site: "2097152" or "amazon.eg=1048576,default=2097152"."""
+    host = domain_of(url)
+    host = host[4:] if host.startswith("www.") else host
+    default, caps = 2 * 1024 * 1024, {}
+    for part in os.getenv("FETCH_MAX_BYTES", "").split(","):
+        part = part.strip()
+        if "=" in part:
+            key, value = part.split("=", 1)
+            caps[key.strip().lower()] = int(value)
+        elif part:
+            default = int(part)
+    return caps.get(host, caps.get("default", default))
+
+def fetch_page(url: str) -> str:
+    """Product page HTML: streamed and cut short once the product data is in (FETCH_STREAM), else a full fetch."""
+    if not env_flag("FETCH_STREAM"):
+        return fetch(url)
+    scanner, _ = fetch_stream(url, lambda: PageScanner(url), max_bytes=max_bytes_for(url))
+    return scanner.text
+
+def source_of(url: str) -> Optional[str]:
+    """Marketplace label for a supported product URL, or None (no fetch needed)."""
     source_dom = domain_of(url)
-    jsonld = _extract_jsonld(html, url)
     if source_dom in AMAZON_DOMAINS:
-        prod = _from_jsonld(jsonld, url, "amazon.eg") or _from_dom(html, url, "amazon.eg")
-        return prod
+        return "amazon.eg"
     if source_dom in JUMIA_DOMAINS:
-        prod = _from_jsonld(jsonld, url, "jumia.com.eg") or _from_dom(html, url, "jumia.com.eg")
-        return prod
+        return "jumia.com.eg"
     if source_dom in NOON_DOMAINS:
         # ensure url is Egypt product page
         if "/egypt" not in url and "/egypt-" not in url:
             return None
-        prod = _from_jsonld(jsonld, url, "noon.com/egypt-en") or _from_dom(html, url, "noon.com/egypt-en")
-        return prod
+        return "noon.com/egypt-en"
     return None
+
+def parse_product(html: str, url: str) -> Optional[Product]:
+    source = source_of(url)
+    if source is None:
+        return None
+    with metrics.span("parse", source=source):
+        # fast path: JSON-LD via regex + json, DOM parsed (once) only when that yields nothing
+        jsonld = _extract_jsonld(html, url)
+        return _from_jsonld(jsonld, url, source) or _from_dom(html, url, source)
+
+EXTRACT_TOTAL = metrics.counter("shopsmart_extract_total", "extract_product calls per source and outcome.")
+
+def extract_product(url: str) -> Optional[Product]:
+    source = source_of(url)
+    if source is None:
+        return None
+    with metrics.span("extract", source=source):
+        prod, outcome = _extract(url)
+    EXTRACT_TOTAL.inc(source=source, outcome=outcome if prod is not None else "empty")
+    return prod
+
+def _extract(url: str) -> Tuple[Optional[Product], str]:
+    cache = get_page_cache()
+    cached = None
+    if cache is not None:
+        cached, fresh = cache.get_product(url)
+        if cached is not None and fresh:
+            return cached, "cached"
+        html = cache.get_html(url)
+        if html is not None:
+            prod = parse_product(html, url)
+            if prod:
+                cache.put_product(url, merge_static(prod, cached))
+            return prod, "cached_html"
+    try:
+        html = fetch_page(url)
+    except FetchError:
+        if cached is None:
+            EXTRACT_TOTAL.inc(source=source_of(url), outcome="error")
+            raise
+        # serve the last known record rather than nothing; its price may be out of date
+        return cached.model_copy(update={"extra": {**cached.extra, "stale": "true"}}), "stale"
+    prod = parse_product(html, url)
+    if cache is not None:
+        cache.put_html(url, html)
+        if prod:
+            prod = merge_static(prod, cached)
+            cache.put_product(url, prod)
+    return prod, "fetched"
@@ -1,31 +1,147 @@
 from __future__ import annotations
+import json
+import math
 import os
-from typing import List
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Dict, List, Optional, Sequence, Tuple
+from rapidfuzz import fuzz, process
 from tavily import TavilyClient
+from ..core import metrics
+from ..core.cache import SqliteCache, cache_dir, env_flag
+from ..core.models import SearchPlan
+from ..core.utils import canonical_product_url, product_key
 
 EGYPT_DOMAINS = [
     "www.amazon.eg", "amazon.eg",
     "www.jumia.com.eg", "jumia.com.eg",
     "www.noon.com", "noon.com"
 ]
+# marketplace -> its Tavily include_domains (fan-out searches one marketplace at a time)
+MARKETPLACES = {
+    "amazon.eg": ["www.amazon.eg", "amazon.eg"],
+    "jumia.com.eg": ["www.jumia.com.eg", "jumia.com.eg"],
+    "noon.com": ["www.noon.com", "noon.com"],
+}
 
-def search_products(query: str, max_results: int = 12) -> List[str]:
-    """Use Tavily to search product pages on Amazon.eg, Jumia, Noon (Egypt).
-    Returns a list of URLs.
-    """
-    api_key = os.getenv("TAVILY_API_KEY")
+_clients: Dict[str, TavilyClient] = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_key: Optional[str] = None) -> TavilyClient:
+    """Reuse one TavilyClient per API key instead of building one per search."""
+    api_key = api_key or os.getenv("TAVILY_API_KEY")
+    if not api_key:
+        raise RuntimeError("TAVILY_API_KEY missing")
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = TavilyClient(api_key=api_key)
+        return _clients[api_key]
+
+def set_client(client: Optional[TavilyClient], api_key: Optional[str] = None) -> None:
+    """Install (or with None, drop) the client used for `api_key`, e.g. a local stand-in."""
+    api_key = api_key or os.getenv("TAVILY_API_KEY")
     if not api_key:
         raise RuntimeError("TAVILY_API_KEY missing")
-    client = TavilyClient(api_key=api_key)
-    results = client.search(
-        query=query,
-        search_depth="advanced",
-        max_results=max_results,
-        include_domains=EGYPT_DOMAINS,
-        exclude_domains=None,
-        include_answer=False,
-        include_raw_content=False,
-    )
+    with _clients_lock:
+        if client is None:
+            _clients.pop(api_key, None)
+        else:
+            _clients[api_key] = client
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+
+def normalize_query(query: str) -> str:
+    """Lowercase, tokenize, sort and join so word order and spacing don't matter."""
+    return " ".join(sorted(_token_re.findall(query.lower())))
+
+def _numbers(norm: str) -> List[str]:
+    return [t for t in norm.split() if any(ch.isdigit() for ch in t)]
+
+class SearchCache:
+    """TTL'd cache of search results keyed by normalized query + search parameters.
+
+    With `fuzzy_threshold` > 0, a miss falls back to the closest cached query with the same
+    parameters (rapidfuzz token_sort_ratio), as long as both carry the same numbers, so
+    "under 9000" never reuses results for "under 8000".
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None, fuzzy_threshold: Optional[float] = None):
+        self.store = SqliteCache(path or os.path.join(cache_dir(), "search.sqlite"), max_bytes=32 * 1024 * 1024)
+        self.ttl = ttl if ttl is not None else float(os.getenv("SEARCH_CACHE_TTL", "1800"))
+        self.fuzzy_threshold = fuzzy_threshold if fuzzy_threshold is not None else float(os.getenv("SEARCH_CACHE_FUZZY", "92"))
+        self.fuzzy_hits = 0
+
+    @staticmethod
+    def _prefix(max_results: int, domains: Sequence[str]) -> str:
+        return f"{max_results}|{','.join(sorted(domains))}|"
+
+    def get(self, query: str, max_results: int, domains: Sequence[str]) -> Optional[List[str]]:
+        prefix = self._prefix(max_results, domains)
+        norm = normalize_query(query)
+        row = self.store.get(prefix + norm, max_age=self.ttl)
+        if row is None and self.fuzzy_threshold > 0:
+            choices = [k[len(prefix):] for k in self.store.keys(prefix, max_age=self.ttl)]
+            choices = [c for c in choices if _numbers(c) == _numbers(norm)]
+            best = process.extractOne(norm, choices, scorer=fuzz.token_sort_ratio, score_cutoff=self.fuzzy_threshold)
+            if best is not None:
+                row = self.store.get(prefix + best[0], max_age=self.ttl)
+                if row is not None:
+                    self.fuzzy_hits += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, query: str, max_results: int, domains: Sequence[str], urls: List[str]) -> None:
+        key = self._prefix(max_results, domains) + normalize_query(query)
+        self.store.set(key, json.dumps(urls).encode("utf-8"))
+
+    def stats(self) -> Dict[str, float]:
+        return {**self.store.stats(), "fuzzy_hits": self.fuzzy_hits}
+
+_search_cache: Optional[SearchCache] = None
+
+def get_search_cache() -> Optional[SearchCache]:
+    """Process-wide search cache, or None when SEARCH_CACHE is disabled."""
+    global _search_cache
+    if not env_flag("SEARCH_CACHE"):
+        return None
+    if _search_cache is None:
+        with _clients_lock:
+            if _search_cache is None:
+                _search_cache = SearchCache()
+    return _search_cache
+
+def set_search_cache(cache: Optional[SearchCache]) -> None:
+    global _search_cache
+    _search_cache = cache
+
+metrics.register_cache("search", lambda: _search_cache.stats() if _search_cache is not None else None)
+SEARCH_TOTAL = metrics.counter("shopsmart_search_total", "search_products calls by cache result (hit/miss/off).")
+
+def search_products(query: str, max_results: int = 12, domains: Sequence[str] = EGYPT_DOMAINS,
+                    depth: str = "advanced") -> List[str]:
+    """Use Tavily to search product pages on Amazon.eg, Jumia, Noon (Egypt).
+    Returns a list of URLs, one per distinct product (see utils.product_key), tracking params stripped.
+    """
+    domains = list(domains)
+    cache = get_search_cache()
+    if cache is not None:
+        hit = cache.get(query, max_results, domains)
+        if hit is not None:
+            SEARCH_TOTAL.inc(cache="hit")
+            return hit
+    SEARCH_TOTAL.inc(cache="miss" if cache is not None else "off")
+    client = get_client()
+    with metrics.span("tavily"):
+        results = client.search(
+            query=query,
+            search_depth=depth,
+            max_results=max_results,
+            include_domains=domains,
+            exclude_domains=None,
+            include_answer=False,
+            include_raw_content=False,
+        )
     urls = []
     for item in results.get("results", []):
         u = item.get("url")
@@ -34,11 +150,148 @@ def search_products(query: str, max_results: int = 12) -> List[str]:
             if "noon.com" in u and "/egypt-" not in u and "/egypt_en" not in u and "/egypt-en" not in u:
                 continue
             urls.append(u)
-    # de-duplicate preserving order
+    # one URL per product: /dp/ vs /gp/product/, slug and query variants share a key
     seen = set()
     dedup = []
     for u in urls:
-        if u not in seen:
-            dedup.append(u)
-            seen.add(u)
-    return dedup[:max_results]
+        key = product_key(u)
+        if key not in seen:
+            dedup.append(canonical_product_url(u))
+            seen.add(key)
+    dedup = dedup[:max_results]
+    if cache is not None:
+        cache.put(query, max_results, domains, dedup)
+    return dedup
+
+def query_variants(plan: SearchPlan, limit: Optional[int] = None) -> List[str]:
+    """Distinct phrasings of a plan to search with: the query, then brand- and feature-qualified forms."""
+    limit = limit if limit is not None else int(os.getenv("SEARCH_VARIANTS", "2"))
+    words = set(normalize_query(plan.query).split())
+    brand = plan.brand if plan.brand and plan.brand.lower() not in words else None
+    features = [f for f in plan.features if not set(normalize_query(f).split()) <= words][:2]
+    out = [plan.query]
+    if brand:
+        out.append(f"{brand} {plan.query}")
+    if features:
+        out.append(f"{plan.query} {' '.join(features)}")
+    if brand and features:
+        out.append(f"{brand} {plan.query} {' '.join(features)}")
+    variants, seen = [], set()
+    for q in out:
+        if normalize_query(q) not in seen:
+            seen.add(normalize_query(q))
+            variants.append(q)
+    return variants[:max(1, limit)]
+
+def _quotas(max_results: int, markets: Sequence[str]) -> Dict[str, int]:
+    """SEARCH_QUOTAS ("amazon.eg=5,noon.com=3[,default=4]"); by default an even split of max_results."""
+    default = math.ceil(max_results / max(1, len(markets)))
+    quotas = {}
+    for part in os.getenv("SEARCH_QUOTAS", "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            if k.strip() == "default":
+                default = int(v)
+            else:
+                quotas[k.strip().lower()] = int(v)
+    return {m: quotas.get(m, default) for m in markets}
+
+def rrf_merge(ranked: Sequence[Tuple[str, List[str]]], max_results: int, quotas: Optional[Dict[str, int]] = None,
+              k: int = 60) -> List[str]:
+    """Reciprocal-rank fusion of (marketplace, urls) result lists.
+
+    A product scores sum(1 / (k + rank)) over every list it appears in (keyed by
+    product_key, so variants of one URL pool their votes). The best-scoring products are
+    taken up to each marketplace's quota; slots a marketplace can't fill go to the best
+    leftovers from the others.
+    """
+    scores: Dict[str, float] = {}
+    first: Dict[str, Tuple[str, str]] = {}  # key -> (marketplace, url)
+    for market, urls in ranked:
+        for rank, url in enumerate(urls, start=1):
+            key = product_key(url)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            first.setdefault(key, (market, url))
+    order = sorted(scores, key=lambda key: -scores[key])  # stable: ties keep first appearance
+    taken: Dict[str, int] = {}
+    picked, rest = [], []
+    for key in order:
+        market = first[key][0]
+        if quotas is None or taken.get(market, 0) < quotas.get(market, max_results):
+            taken[market] = taken.get(market, 0) + 1
+            picked.append(key)
+        else:
+            rest.append(key)
+    picked = (picked + rest)[:max_results] if len(picked) < max_results else picked[:max_results]
+    return [first[key][1] for key in picked]
+
+FANOUT_TOTAL = metrics.counter("shopsmart_search_fanout_total", "Fan-out sub-searches by marketplace and outcome (ok/error/late).")
+
+_search_pool: Optional[ThreadPoolExecutor] = None
+
+def search_pool() -> ThreadPoolExecutor:
+    """Shared threads for concurrent sub-searches (SEARCH_WORKERS, default 8)."""
+    global _search_pool
+    if _search_pool is None:
+        with _clients_lock:
+            if _search_pool is None:
+                _search_pool = ThreadPoolExecutor(max_workers=int(os.getenv("SEARCH_WORKERS", "8")), thread_name_prefix="search")
+    return _search_pool
+
+def search_plan(plan: SearchPlan, max_results: int = 12, timeout: Optional[float] = None) -> List[str]:
+    """Search each marketplace with each query variant concurrently and fuse the results.
+
+    Every (marketplace, variant) pair is its own Tavily search (SEARCH_DEPTH, default
+    basic) through the shared client and search cache; results are merged with rrf_merge
+    under per-marketplace quotas. The fan-out gets min(`timeout`, SEARCH_BUDGET) seconds:
+    searches still running then are left to finish into the cache, unless nothing has
+    returned yet, in which case the first to finish is awaited, but never past `timeout`
+    (whatever has been merged by then is returned). SEARCH_FANOUT=false falls back to one
+    search across all marketplaces, under the same `timeout` (no URLs when it passes).
+    """
+    if not env_flag("SEARCH_FANOUT"):
+        if timeout is None:
+            return search_products(plan.query, max_results=max_results)
+        fut = search_pool().submit(search_products, plan.query, max_results)
+        try:
+            return fut.result(timeout=max(0.0, timeout))
+        except FutureTimeout:  # left to finish into the cache
+            FANOUT_TOTAL.inc(marketplace="all", outcome="late")
+            return []
+    limit = float(os.getenv("SEARCH_BUDGET", "5"))
+    start = time.monotonic()
+    deadline = start + (limit if timeout is None else min(timeout, limit))
+    hard = start + timeout if timeout is not None else None
+    depth = os.getenv("SEARCH_DEPTH", "basic")
+    jobs = {}
+    for variant in query_variants(plan):
+        for market, domains in MARKETPLACES.items():
+            # Noon serves several countries; only Egypt pages survive the filter, so ask for them
+            q = f"{variant} egypt" if market == "noon.com" else variant
+            jobs[search_pool().submit(search_products, q, max_results, domains, depth)] = (market, variant)
+    done, pending = wait(jobs, timeout=max(0.0, deadline - time.monotonic()))
+    ranked: List[Tuple[str, List[str]]] = []
+    errors = []
+
+    def collect(futs) -> None:
+        for fut in [f for f in jobs if f in futs]:  # submission order, so ties break the same way every run
+            market = jobs[fut][0]
+            try:
+                ranked.append((market, fut.result()))
+                FANOUT_TOTAL.inc(marketplace=market, outcome="ok")
+            except Exception as e:
+                errors.append(e)
+                FANOUT_TOTAL.inc(marketplace=market, outcome="error")
+
+    collect(done)
+    while pending and not any(urls for _, urls in ranked):
+        left = None if hard is None else hard - time.monotonic()
+        if left is not None and left <= 0:
+            break
+        done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+        collect(done)
+    for fut in pending:
+        FANOUT_TOTAL.inc(marketplace=jobs[fut][0], outcome="late")
+    if errors and not ranked:
+        raise errors[0]
+    return rrf_merge(ranked, max_results, _quotas(max_results, list(MARKETPLACES)), k=int(os.getenv("SEARCH_RRF_K", "60")))
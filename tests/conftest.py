@@ -0,0 +1,13 @@
+import pytest
+from shopsmart import llm
+from shopsmart.core import cache, catalog
+from shopsmart.tools import extraction, tavily_tool
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep every on-disk cache/catalog of a test inside its own tmp dir (and per-test hedge stats)."""
+    monkeypatch.setenv("SHOPSMART_CACHE_DIR", str(tmp_path / "cache"))
+    for mod, attr in ((cache, "_page_cache"), (catalog, "_catalog"), (tavily_tool, "_search_cache"), (llm, "_llm_store")):
+        monkeypatch.setattr(mod, attr, None)
+    monkeypatch.setattr(extraction, "_latencies", {})  # hedge delays start from EXTRACT_HEDGE_AFTER
+    yield
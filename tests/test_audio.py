@@ -0,0 +1,52 @@
+import io
+import wave
+import numpy as np
+import pytest
+from shopsmart import audio
+
+def _tone(seconds, rate=48000, freq=440.0, amp=0.5):
+    t = np.arange(int(seconds * rate)) / rate
+    return (amp * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+def test_ring_buffer_wraps_and_clips_reads():
+    ring = audio.RingBuffer(8)
+    ring.write(np.arange(6, dtype=np.float32))
+    ring.write(np.arange(6, 11, dtype=np.float32))
+    assert ring.total == 11 and ring.oldest == 3
+    assert ring.read(0, 11).tolist() == list(range(3, 11))
+    assert ring.read(7, 10).tolist() == [7, 8, 9]
+    ring.write(np.arange(100, 120, dtype=np.float32))  # longer than the buffer: keeps the tail
+    assert ring.total == 31 and ring.read(0, ring.total).tolist() == list(range(112, 120))
+    assert ring.read(23, 25).tolist() == [112, 113]  # positions still line up with what was written
+    ring.write(np.array([200, 201], dtype=np.float32))
+    assert ring.read(30, 33).tolist() == [119, 200, 201]
+
+def test_downmix_and_resample_interleaved_int16_stereo():
+    left = (_tone(0.5) * 32767).astype(np.int16)
+    stereo = np.stack([left, left], axis=1).reshape(1, -1)  # packed s16, as av gives it
+    mono = audio.resample(audio.downmix(stereo, channels=2), 48000, 16000)
+    assert len(mono) == 8000 and mono.dtype == np.float32
+    assert np.allclose(mono, audio.resample(_tone(0.5), 48000, 16000), atol=1e-3)
+    with wave.open(io.BytesIO(audio.to_wav_bytes(mono))) as w:
+        assert (w.getframerate(), w.getnchannels(), w.getnframes()) == (16000, 1, 8000)
+
+def test_voice_session_cuts_utterances_and_transcribes_offline(monkeypatch):
+    class Lengths:
+        def recognize(self, data, language):
+            return f"{len(data.get_raw_data()) // 2 / data.sample_rate:.1f}s"
+
+    monkeypatch.setattr(audio, "_backends", dict(audio._backends))
+    audio.register_recognizer("lengths", Lengths)
+    monkeypatch.setenv("VOICE_RECOGNIZER", "lengths")  # picked up by transcribe() via get_recognizer()
+    voice = audio.VoiceSession(vad=audio.EnergyVAD(silence_ms=300, pad_ms=0))
+    silence = np.zeros(int(0.5 * 48000), dtype=np.float32)
+    stream = np.concatenate([silence, _tone(1.0), silence, _tone(0.6), silence])
+    for chunk in np.array_split(stream, 40):  # arrives in pieces, like WebRTC frames
+        voice.push(chunk, 48000)
+    assert voice.transcribe() == ["1.0s", "0.6s"]
+    voice.push(_tone(0.4), 48000)
+    assert voice.transcribe() == []
+    voice.flush()
+    assert voice.transcribe() == ["0.4s"] and voice.errors == []
+    with pytest.raises(ValueError, match="lengths"):
+        audio.get_recognizer("nope")
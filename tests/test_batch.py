@@ -0,0 +1,30 @@
+import json
+from shopsmart import batch
+from shopsmart.core.models import Product
+
+class FakeLLM:
+    def call(self, prompt, **kwargs):
+        if "SearchPlan" in prompt:
+            return json.dumps({"query": prompt.split("\n")[0].replace("User input: ", "")})
+        return "ok"
+
+def test_batch_dedupes_urls_and_resumes(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_CACHE", "false")
+    monkeypatch.setattr(batch, "make_llm", FakeLLM)
+    shared = ["https://www.amazon.eg/dp/A1", "https://www.amazon.eg/dp/A2?ref=x"]
+    monkeypatch.setattr(batch, "search_plan", lambda plan, max_results=12: shared + [f"https://www.amazon.eg/dp/{plan.query[-1]}"])
+    fetched = []
+
+    def fake_extract(url):
+        fetched.append(url)
+        return Product(title=url, url=url, price=100.0)
+
+    monkeypatch.setattr(batch, "extract_product", fake_extract)
+    src, out = tmp_path / "q.jsonl", tmp_path / "r.jsonl"
+    src.write_text("\n".join(json.dumps({"id": f"q{i}", "query": f"phone {i}"}) for i in range(4)))
+    out.write_text(json.dumps({"id": "q0", "query": "phone 0", "top5": []}) + "\n")
+    stats = batch.BatchRunner(str(out), concurrency=2).run(batch.read_queries(str(src)))
+    assert stats["queries"] == 3 and stats["skipped"] == 1
+    assert stats["url_refs"] == 9 and stats["pages_extracted"] == 5
+    assert len(fetched) == 5
+    assert {json.loads(l)["id"] for l in out.read_text().splitlines()} == {"q0", "q1", "q2", "q3"}
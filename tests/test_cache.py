@@ -0,0 +1,48 @@
+import time
+from shopsmart.core.cache import SqliteCache, PageCache, set_page_cache
+from shopsmart.core.utils import canonical_url
+from shopsmart.tools import scrapers
+
+PAGE = """<html><head><script type="application/ld+json">
+{"@type": "Product", "name": "Phone X", "offers": {"price": "1999", "priceCurrency": "EGP"}}
+</script></head><body></body></html>"""
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    c = SqliteCache(str(tmp_path / "c.sqlite"), max_bytes=300)
+    c.set("a", b"x" * 100)
+    c.set("b", b"x" * 100)
+    time.sleep(0.01)
+    assert c.get("a") is not None  # touch a so b is the LRU entry
+    c.set("c", b"x" * 150)
+    assert c.get("b") is None
+    assert c.get("a") is not None and c.get("c") is not None
+    assert c.stats()["evictions"] == 1
+
+def test_canonical_url_strips_tracking():
+    assert canonical_url("https://WWW.Amazon.eg/dp/B0X/?ref=sr_1&utm_source=x&th=1#reviews") == "https://www.amazon.eg/dp/B0X?th=1"
+
+def test_extract_product_hits_cache_without_fetching(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(scrapers, "fetch_page", lambda url: calls.append(url) or PAGE)
+    cache = PageCache(path=str(tmp_path / "pages.sqlite"), price_ttl=60, static_ttl=600)
+    set_page_cache(cache)
+    try:
+        url = "https://www.amazon.eg/dp/B0X?ref=abc"
+        first = scrapers.extract_product(url)
+        second = scrapers.extract_product("https://www.amazon.eg/dp/B0X")
+    finally:
+        set_page_cache(None)
+    assert first.price == 1999.0 and second.title == "Phone X"
+    assert len(calls) == 1
+    assert cache.stats()["hits"] >= 1
+
+def test_product_key_collapses_marketplace_url_variants():
+    from shopsmart.core.utils import canonical_product_url, product_key
+    amazon = ["https://www.amazon.eg/dp/B0CV9XQ5VX", "https://www.amazon.eg/gp/product/B0CV9XQ5VX?ref=ppx&psc=1",
+              "https://www.amazon.eg/Samsung-Galaxy-A55/dp/b0cv9xq5vx/ref=sr_1_3?keywords=a55"]
+    assert {product_key(u) for u in amazon} == {"amazon:B0CV9XQ5VX"}
+    assert {canonical_product_url(u) for u in amazon} == {"https://www.amazon.eg/dp/B0CV9XQ5VX"}
+    assert product_key("https://www.jumia.com.eg/redmi-note-13-black-123456.html?utm_source=x") == \
+        product_key("https://www.jumia.com.eg/xiaomi-redmi-note-13-123456.html") == "jumia:123456"
+    assert product_key("https://www.noon.com/egypt-en/iphone-15/N53432547A/p/?o=1") == "noon:N53432547A"
+    assert product_key("https://www.amazon.eg/dp/A1?ref=x") == canonical_url("https://www.amazon.eg/dp/A1")
@@ -0,0 +1,73 @@
+import threading
+import time
+from shopsmart.core.models import Product
+from shopsmart.tools import extraction
+
+def test_extract_products_keeps_order_and_caps_per_domain(monkeypatch):
+    active, peak, lock = {}, {}, threading.Lock()
+
+    def fake_extract(url):
+        m = extraction.marketplace_of(url)
+        with lock:
+            active[m] = active.get(m, 0) + 1
+            peak[m] = max(peak.get(m, 0), active[m])
+        # later URLs finish first so completion order differs from input order
+        time.sleep(0.05 if url.endswith("0") else 0.01)
+        with lock:
+            active[m] -= 1
+        if url.endswith("3"):
+            raise RuntimeError("boom")
+        return Product(title=url, url=url)
+
+    monkeypatch.setattr(extraction, "extract_product", fake_extract)
+    urls = [f"https://www.amazon.eg/dp/{i}" for i in range(5)] + [f"https://www.jumia.com.eg/p-{i}" for i in range(5)]
+    out = extraction.extract_products(urls, max_workers=8, per_domain={"amazon.eg": 2, "default": 3})
+    assert [p.title for p in out] == [u for u in urls if not u.endswith("3")]
+    assert peak["amazon.eg"] <= 2
+    assert peak["jumia.com.eg"] <= 3
+
+def test_iter_extract_hedges_stragglers_and_honours_the_deadline(monkeypatch):
+    monkeypatch.setenv("EXTRACT_HEDGE_AFTER", "0.05")
+    calls = {}
+    lock = threading.Lock()
+
+    def fake(url):
+        with lock:
+            calls[url] = calls.get(url, 0) + 1
+            first = calls[url] == 1
+        if "stuck" in url or ("slow" in url and first):
+            time.sleep(1.0)
+        return Product(title=url, url=url)
+
+    monkeypatch.setattr(extraction, "extract_product", fake)
+    urls = ["https://www.jumia.com.eg/slow-1.html", "https://www.noon.com/egypt-en/x/N1/p/", "https://www.amazon.eg/dp/stuck"]
+    t0 = time.monotonic()
+    got = {u: p for _, u, p in extraction.iter_extract(urls, max_hedges=1, deadline=time.monotonic() + 0.4)}
+    assert time.monotonic() - t0 < 0.8
+    assert set(got) == set(urls[:2]) and calls[urls[0]] == 2 and calls[urls[2]] == 1
+
+def test_iter_extract_stop_keeps_finished_pages_only(monkeypatch):
+    monkeypatch.setattr(extraction, "extract_product", lambda u: time.sleep(0.5 if "slow" in u else 0) or Product(title=u, url=u))
+    urls = [f"https://www.amazon.eg/dp/{i}" for i in range(3)] + ["https://www.amazon.eg/dp/slow"]
+    seen = []
+    for _, u, _ in extraction.iter_extract(urls, max_workers=4, per_domain=4, stop=lambda: len(seen) >= 3, max_hedges=0):
+        seen.append(u)
+    assert sorted(seen) == sorted(urls[:3])
+
+def test_hedges_count_toward_the_marketplace_cap(monkeypatch):
+    monkeypatch.setenv("EXTRACT_HEDGE_AFTER", "0.05")
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def fake(url):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.3 if "slow" in url else 0.02)
+        with lock:
+            active[0] -= 1
+        return Product(title=url, url=url)
+
+    monkeypatch.setattr(extraction, "extract_product", fake)
+    urls = ["https://www.amazon.eg/dp/slow1", "https://www.amazon.eg/dp/slow2"] + [f"https://www.amazon.eg/dp/{i}" for i in range(4)]
+    got = list(extraction.iter_extract(urls, max_workers=8, per_domain=2, max_hedges=2))
+    assert len(got) == 6 and peak[0] <= 2
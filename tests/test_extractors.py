@@ -8,3 +8,35 @@ def test_extract_handles_unknown():
         p = extract_product(url)  # likely None; just ensure no crash
     except Exception as e:
         pytest.fail(f"Extractor crashed: {e}")
+
+def test_parse_product_on_saved_pages():
+    from benchmarks.corpus import load_corpus
+    from shopsmart.tools.scrapers import parse_product
+    by_title = {p.title: p for p in (parse_product(h, u) for u, h in load_corpus(pad_kb=64).items())}
+    assert by_title["Samsung Galaxy A55 5G, 256GB, 8GB RAM, Awesome Navy"].price == 18999.0
+    jumia_graph = by_title["Xiaomi Redmi Note 13 - 8GB RAM - 256GB - Black"]
+    assert jumia_graph.extra["jsonld"] == "true" and jumia_graph.review_count == 311
+    # Jumia DOM: the current price (.-fs24) wins over the struck-through data-old-price
+    assert by_title["Oraimo FreePods 4 ANC True Wireless Earbuds"].price == 1599.0
+    amazon_dom = by_title["Apple AirPods Pro (2nd Generation) with MagSafe Case (USB-C)"]
+    assert (amazon_dom.price, amazon_dom.rating, len(amazon_dom.images)) == (8749.0, 4.7, 2)
+
+@pytest.mark.parametrize("gzip", [False, True])
+def test_streamed_fetch_stops_once_the_product_is_in(gzip):
+    from benchmarks.fakes import ReplayServer, replay_pages
+    from shopsmart.core import http
+    from shopsmart.core.utils import fetch_stream
+    from shopsmart.tools.scrapers import PageScanner, parse_product
+
+    pages = replay_pages(pad_kb=512)
+    with ReplayServer(pages, gzip=gzip) as server:
+        http.set_client(server.client())
+        try:
+            for url, html in pages.items():
+                sc, reason = fetch_stream(url, lambda: PageScanner(url))
+                assert reason == "found" and len(sc.text) < len(html) // 4
+                assert parse_product(sc.text, url) == parse_product(html, url)
+            never = type("Never", (), {"feed": lambda self, text: False})
+            assert fetch_stream(next(iter(pages)), never, max_bytes=64 * 1024)[1] == "cap"
+        finally:
+            http.set_client(None)
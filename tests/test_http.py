@@ -0,0 +1,75 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from tenacity import wait_none
+from shopsmart.core import http
+from shopsmart.core.utils import fetch, fetch_conditional, FetchError, CircuitOpenError
+
+@pytest.fixture
+def server():
+    hits = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits[self.path] = hits.get(self.path, 0) + 1
+            code = int(self.path.strip("/").split("/")[0])
+            if self.headers.get("If-None-Match") == '"v1"':
+                code = 304
+            self.send_response(code)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            self.wfile.write(b"<html>ok</html>")
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    http.set_client(http.HttpClient(rate=0, breaker_threshold=3, breaker_reset=60))
+    yield f"http://127.0.0.1:{srv.server_address[1]}", hits
+    srv.shutdown()
+    http.set_client(None)
+
+def test_fetch_does_not_retry_4xx_but_retries_5xx(server):
+    base, hits = server
+    quick = fetch.retry_with(wait=wait_none())
+    assert quick(f"{base}/200") == "<html>ok</html>"
+    with pytest.raises(FetchError) as e:
+        quick(f"{base}/404")
+    assert e.value.status == 404 and hits["/404"] == 1
+    with pytest.raises(FetchError):
+        quick(f"{base}/503")
+    assert hits["/503"] == 3
+
+def test_circuit_opens_after_repeated_failures(server):
+    base, hits = server
+    quick = fetch.retry_with(wait=wait_none())
+    with pytest.raises(FetchError):
+        quick(f"{base}/500/a")
+    with pytest.raises(CircuitOpenError):
+        quick(f"{base}/200")
+    assert "/200" not in hits
+
+def test_fetch_conditional_returns_none_when_not_modified(server):
+    base, hits = server
+    html, validators = fetch_conditional(f"{base}/200")
+    assert html == "<html>ok</html>" and validators["etag"] == '"v1"'
+    html, validators = fetch_conditional(f"{base}/200", etag=validators["etag"])
+    assert html is None and validators["etag"] == '"v1"'
+
+def test_probe_that_dies_of_an_unexpected_error_frees_the_breaker(server, monkeypatch):
+    base, hits = server
+    client = http.HttpClient(rate=0, breaker_threshold=1, breaker_reset=0)
+    with pytest.raises(FetchError):
+        client.get(f"{base}/500")
+    real_get = client.session.get
+
+    def broken(*args, **kwargs):
+        raise ValueError("bad header")
+
+    monkeypatch.setattr(client.session, "get", broken)
+    with pytest.raises(ValueError):
+        client.get(f"{base}/200")  # the half-open probe
+    monkeypatch.setattr(client.session, "get", real_get)
+    assert client.get(f"{base}/200").text == "<html>ok</html>"
+    assert client.breaker(f"127.0.0.1:{base.rsplit(':', 1)[1]}").state == "closed"
@@ -0,0 +1,71 @@
+import time
+from shopsmart.llm import CachedLLM, cached_llm
+
+class StubLLM:
+    model = "stub/model"
+
+    def __init__(self):
+        self.calls = 0
+
+    def call(self, prompt, **kwargs):
+        self.calls += 1
+        return f"reply {self.calls} to {prompt}"
+
+def test_cached_llm_hits_and_misses():
+    stub = StubLLM()
+    chat = CachedLLM(stub, provider="openai")
+    first = chat.call("best earbuds?")
+    assert chat.call("best earbuds?") == first
+    chat.call("best earbuds?", temperature=0)  # call options are part of the key
+    assert stub.calls == 2
+    assert chat.stats()["hits"] == 1 and chat.stats()["misses"] == 2
+    assert "".join(chat.stream("best earbuds?")) == first
+
+def test_cache_key_includes_provider_and_model():
+    stub = StubLLM()
+    CachedLLM(stub, provider="openai", model="gpt-4o-mini").call("q")
+    assert CachedLLM(stub, provider="openai", model="gpt-4o").call("q") == "reply 2 to q"
+    assert CachedLLM(stub, provider="anthropic", model="gpt-4o-mini").call("q") == "reply 3 to q"
+    assert CachedLLM(stub, provider="openai", model="gpt-4o-mini").call("q") == "reply 1 to q"
+
+def test_cached_replies_expire_after_the_ttl():
+    stub = StubLLM()
+    chat = CachedLLM(stub, provider="openai", ttl=60)
+    chat.call("q")
+    chat.store.set(chat.key("q"), b"stale", stored_at=time.time() - 120)
+    assert chat.call("q") == "reply 2 to q"
+    assert chat.call("q") == "reply 2 to q" and stub.calls == 2
+
+def test_bypass_and_disabled_cache_always_call_the_llm(monkeypatch):
+    stub = StubLLM()
+    chat = CachedLLM(stub, provider="openai", bypass=True)
+    chat.call("q")
+    chat.call("q")
+    assert stub.calls == 2 and chat.stats()["bypassed"] == 2 and chat.stats()["hits"] == 0
+    assert CachedLLM(stub, provider="openai").call("q") == "reply 3 to q"  # bypassed calls were not stored
+    monkeypatch.setenv("LLM_CACHE", "false")
+    assert cached_llm(stub) is stub
+    monkeypatch.setenv("LLM_CACHE", "true")
+    monkeypatch.setenv("LLM_CACHE_BYPASS", "true")
+    assert isinstance(cached_llm(stub), CachedLLM) and cached_llm(stub).bypass
+
+def test_concurrent_first_calls_share_one_store(monkeypatch):
+    import threading
+    from shopsmart import llm
+    from shopsmart.core import cache
+    opened, barrier = [], threading.Barrier(8)
+
+    class SlowStore(cache.SqliteCache):
+        def __init__(self, *args, **kwargs):
+            opened.append(self)
+            time.sleep(0.05)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(llm, "SqliteCache", SlowStore)
+    stores = []
+    threads = [threading.Thread(target=lambda: (barrier.wait(), stores.append(llm.llm_store()))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(opened) == 1 and all(s is stores[0] for s in stores)
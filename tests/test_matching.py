@@ -0,0 +1,36 @@
+from shopsmart.core.models import Product
+from shopsmart.core.matching import cluster_products, spec_tokens
+
+def P(title, price, source, rating=None):
+    return Product(title=title, url=f"https://{source.split('/')[0]}/{abs(hash(title))}", price=price, source=source, rating=rating)
+
+def test_spec_tokens_normalize_units():
+    assert spec_tokens("Apple iPhone 15 (128 GB) - 6.1 inch") == ("128gb", "6.1in")
+
+def test_clusters_same_item_across_marketplaces():
+    products = [
+        P("Samsung Galaxy A55 5G, 256GB, 8GB RAM, Awesome Navy", 18999, "amazon.eg"),
+        P("Samsung Galaxy A55 5G Dual SIM 256GB 8GB RAM Navy", 18500, "jumia.com.eg", rating=4.3),
+        P("Samsung Galaxy A35 5G Dual SIM 256GB 8GB RAM Navy", 14500, "noon.com/egypt-en"),
+        P("Samsung Galaxy A55 5G 128GB 8GB RAM Navy", 16500, "noon.com/egypt-en"),
+        P("Apple iPhone 15 128GB Black", 41999, "noon.com/egypt-en"),
+        P("Apple iPhone 15 (128 GB) - Black", 42999, "amazon.eg"),
+        P("Apple iPhone 15 Pro 128GB Black", 52999, "amazon.eg"),
+    ]
+    clusters = cluster_products(products)
+    assert [len(c.offers) for c in clusters] == [2, 1, 1, 2, 1]
+    a55 = clusters[0].canonical
+    assert a55.price == 18500 and a55.rating == 4.3
+    assert a55.extra["sources"] == "amazon.eg,jumia.com.eg"
+
+def test_clusters_listings_that_name_the_brand_or_specs_differently():
+    products = [
+        P("Apple iPhone 15 (128 GB) - Black", 42999, "amazon.eg"),
+        P("iPhone 15 128GB Black", 41999, "noon.com/egypt-en"),
+        P("Samsung Galaxy A55 5G, 8GB RAM, 256GB", 18999, "amazon.eg"),
+        P("Samsung Galaxy A55 256GB", 18500, "jumia.com.eg"),
+        P("Galaxy A55 5G 128GB", 16500, "noon.com/egypt-en"),
+    ]
+    clusters = cluster_products(products)
+    assert [len(c.offers) for c in clusters] == [2, 2, 1]
+    assert [c.key for c in clusters] == [products[0].key, products[2].key, products[4].key]
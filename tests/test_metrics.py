@@ -0,0 +1,36 @@
+import urllib.request
+from shopsmart.core import metrics
+
+def test_histogram_renders_cumulative_buckets_and_counters():
+    h = metrics.Histogram("t_seconds", "test", buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        h.observe(v, domain="amazon.eg")
+    c = metrics.Counter("t_total", "test")
+    c.inc(domain='a"b')
+    lines = h.render() + c.render()
+    assert 't_seconds_bucket{domain="amazon.eg",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{domain="amazon.eg",le="1"} 2' in lines
+    assert 't_seconds_bucket{domain="amazon.eg",le="+Inf"} 3' in lines
+    assert 't_seconds_count{domain="amazon.eg"} 3' in lines
+    assert 't_total{domain="a\\"b"} 1' in lines
+
+def test_trace_and_disabled_spans(monkeypatch):
+    trace = metrics.Trace()
+    with trace.span("plan"):
+        pass
+    with trace.span("plan"):
+        pass
+    assert set(trace.as_dict()) == {"plan", "total"}
+    monkeypatch.setattr(metrics, "_enabled", False)
+    assert metrics.span("x") is metrics._NOOP and trace.span("y") is metrics._NOOP
+    assert trace.as_dict() == {}
+
+def test_endpoint_serves_prometheus_text(monkeypatch):
+    monkeypatch.setattr(metrics, "_server", None)
+    port = metrics.start_server(0)
+    with metrics.span("unit"):
+        pass
+    body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read().decode()
+    assert "# TYPE shopsmart_stage_seconds histogram" in body
+    assert 'shopsmart_stage_seconds_count{stage="unit"}' in body
+    metrics._server.shutdown()
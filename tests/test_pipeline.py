@@ -0,0 +1,175 @@
+import time
+from shopsmart import agents
+from shopsmart.core.models import Product, SearchPlan
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def call(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        if "SearchPlan" in prompt:
+            return '{"query": "earbuds", "brand": "Oraimo", "max_price": 2000, "min_rating": 4, "features": []}'
+        return "fine choice"
+
+def _products(urls, **kwargs):
+    for i, u in enumerate(urls):
+        yield i, u, Product(title=f"Oraimo buds {i}", url=u, price=1500 + i * 400, rating=4.5, source="jumia.com.eg")
+
+def test_iter_pipeline_streams_stage_events(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE", "false")
+    monkeypatch.setenv("PLANNER", "llm")
+    monkeypatch.setenv("SPECULATIVE_SEARCH", "false")
+    llm = FakeLLM()
+    monkeypatch.setattr(agents, "make_llm", lambda: llm)
+    monkeypatch.setattr(agents, "search_plan", lambda plan, max_results=12, **kw: [f"https://www.jumia.com.eg/p-{i}.html" for i in range(3)])
+    monkeypatch.setattr(agents, "iter_extract", _products)
+    events = list(agents.iter_pipeline("oraimo earbuds under 2000"))
+    kinds = [e.kind for e in events]
+    assert kinds[:2] == ["plan", "urls"] and kinds[-1] == "done"
+    assert kinds.count("product") == 3
+    assert any(e.kind == "ranking" and e.final for e in events)
+    result = events[-1].result
+    assert result["plan"]["brand"] == "Oraimo"
+    assert result["recommendation"]["best"]["title"] == "Oraimo buds 0"
+    assert result["summary"] == "fine choice" and len(llm.prompts) == 3
+    assert {"plan", "search", "extract", "rank", "narrate", "total"} <= set(result["timings"])
+
+def test_confident_rule_plan_skips_the_planner_llm(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE", "false")
+    llm = FakeLLM()
+    monkeypatch.setattr(agents, "make_llm", lambda: llm)
+    monkeypatch.setattr(agents, "search_plan", lambda plan, max_results=12, **kw: [f"https://www.jumia.com.eg/p-{i}.html" for i in range(3)])
+    monkeypatch.setattr(agents, "iter_extract", _products)
+    events = list(agents.iter_pipeline("oraimo earbuds under 2,000 EGP", constraints={"min_rating": 4.5, "features": ["anc"]}))
+    assert events[0].source == "rules"
+    assert events[0].plan.model_dump() == {"query": "oraimo earbuds", "brand": "Oraimo", "max_price": 2000, "min_rating": 4.5, "features": ["anc"]}
+    assert not any("SearchPlan" in p for p in llm.prompts) and len(llm.prompts) == 2
+
+def test_run_pipeline_offline_against_replayed_pages(monkeypatch):
+    from benchmarks.fakes import FakeLLM, FakeTavily, ReplayServer, replay_pages
+    from shopsmart import llm
+    from shopsmart.core import http
+    from shopsmart.tools import tavily_tool
+
+    monkeypatch.setenv("TAVILY_API_KEY", "offline")
+    monkeypatch.setenv("LLM_CACHE", "false")
+    monkeypatch.setenv("EARLY_STOP", "false")  # every replayed page fits the budget; fetch them all
+    with ReplayServer(replay_pages(copies=2)) as server:
+        http.set_client(server.client())
+        tavily_tool.set_client(FakeTavily(server.urls))
+        llm.set_llm(FakeLLM(tokens=5))
+        try:
+            result = agents.run_pipeline("iphone 15 under 60000")
+        finally:
+            http.set_client(None)
+            tavily_tool.set_client(None)
+            llm.set_llm(None)
+    assert result["plan"]["max_price"] == 60000
+    assert len(result["products"]) == len(result["urls"]) == 12
+    assert server.stats["requests"] == 12 and server.stats["not_found"] == 0
+    assert result["summary"] == "word0 word1 word2 word3 word4"
+
+def test_speculative_search_is_reused_when_the_plan_matches(monkeypatch):
+    from shopsmart import speculation
+    monkeypatch.setenv("LLM_CACHE", "false")
+    monkeypatch.setenv("PLANNER", "llm")
+    llm = FakeLLM()
+    monkeypatch.setattr(agents, "make_llm", lambda: llm)
+    searches, extracted = [], []
+
+    def search(plan, max_results=12, **kw):
+        searches.append(plan.query)
+        return [f"https://www.jumia.com.eg/p-{i}.html" for i in range(3)]
+
+    def extract(url):
+        extracted.append(url)
+        return Product(title="Oraimo buds", url=url, price=1500, rating=4.5, source="jumia.com.eg")
+
+    monkeypatch.setattr(agents, "search_plan", search)
+    monkeypatch.setattr(agents, "extract_product", extract)
+    monkeypatch.setattr(agents, "iter_extract", _products)
+    before = speculation.speculation_stats()["hits"]
+    result = agents.run_pipeline("some oraimo earbuds")
+    assert searches == ["some oraimo earbuds"]  # the planned "earbuds" reused the speculative search
+    assert sorted(extracted) == [f"https://www.jumia.com.eg/p-{i}.html" for i in range(3)]
+    assert speculation.speculation_stats()["hits"] == before + 1
+    assert len(result["products"]) == 3
+
+def test_pending_speculative_extraction_without_a_deadline(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE", "false")
+    monkeypatch.setenv("PLANNER", "llm")
+    monkeypatch.setenv("PIPELINE_DEADLINE", "0")
+    monkeypatch.setenv("STAGE_BUDGETS", "")
+    monkeypatch.setattr(agents, "make_llm", FakeLLM)
+    monkeypatch.setattr(agents, "search_plan", lambda plan, max_results=12, **kw: [f"https://www.jumia.com.eg/p-{i}.html" for i in range(3)])
+
+    def slow_extract(url):
+        time.sleep(0.3)  # still in flight when the extract stage picks up the speculative pages
+        return Product(title=f"Oraimo buds {url[-6]}", url=url, price=1500, rating=4.5, source="jumia.com.eg")
+
+    monkeypatch.setattr(agents, "extract_product", slow_extract)
+    result = agents.run_pipeline("some oraimo earbuds")
+    assert len(result["products"]) == 3 and not result["skipped"]
+
+def test_plan_search_uses_the_query_it_is_given(monkeypatch):
+    seen = []
+    monkeypatch.setattr(agents, "search_plan", lambda plan, max_results=12, **kw: seen.append((plan, max_results)) or [])
+    agents.plan_search(SearchPlan(query="earbuds", brand="Oraimo"))("oraimo freepods", max_results=6)
+    assert seen == [(SearchPlan(query="oraimo freepods", brand="Oraimo"), 6)]
+
+class SlowStreamLLM:
+    def __init__(self, delay, hang=None):
+        self.delay, self.hang = delay, hang
+
+    def stream(self, prompt):
+        for word in ("a", " b"):
+            time.sleep(self.hang if self.hang and "Pick the best" in prompt else self.delay)
+            yield word
+
+    def call(self, prompt, **kwargs):
+        return '{"summary": "pros and cons", "reasoning": "buy the first"}'
+
+def test_narrate_runs_both_calls_concurrently_with_a_timeout():
+    plan = SearchPlan(query="earbuds")
+    t0 = time.perf_counter()
+    events = []
+    gen = agents.narrate(SlowStreamLLM(0.2), plan, "- x", timeout=5, merge=False)
+    try:
+        while True:
+            events.append(next(gen))
+    except StopIteration as done:
+        summary, reasoning, errors = done.value
+    assert time.perf_counter() - t0 < 0.7  # two 0.4s calls overlapped
+    assert (summary, reasoning, errors) == ("a b", "a b", {})
+    assert {e.stage for e in events} == {"summary", "reasoning"}
+
+    summary, reasoning, errors = agents.narrate_all(SlowStreamLLM(0.01, hang=1.0), plan, "- x", timeout=0.3, merge=False)
+    assert summary == "a b" and reasoning == "" and errors == {"reasoning": "timeout"}
+
+def test_narrate_merged_mode_makes_one_structured_call():
+    out = agents.narrate_all(SlowStreamLLM(0), SearchPlan(query="earbuds"), "- x", merge=True)
+    assert out == ("pros and cons", "buy the first", {})
+
+def test_extraction_stops_once_the_top5_is_settled(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE", "false")
+    monkeypatch.setenv("SPECULATIVE_SEARCH", "false")
+    monkeypatch.setenv("EXTRACT_HEDGES", "0")
+    monkeypatch.setenv("MATCH_DEDUPE", "false")
+    urls = [f"https://www.jumia.com.eg/buds-{i}.html" for i in range(10)]
+    slow = set(urls[8:])
+
+    def extract(url):
+        if url in slow:
+            time.sleep(2)
+        i = urls.index(url)
+        return Product(title=f"Oraimo buds {i}", url=url, price=1000 + i * 100, rating=4.5, source="jumia.com.eg")
+
+    monkeypatch.setattr(agents, "make_llm", lambda: FakeLLM())
+    monkeypatch.setattr(agents, "search_plan", lambda plan, max_results=12, **kw: urls)
+    monkeypatch.setattr("shopsmart.tools.extraction.extract_product", extract)
+    t0 = time.monotonic()
+    result = agents.run_pipeline("oraimo earbuds under 2000", per_domain=8)
+    assert time.monotonic() - t0 < 1.5
+    assert {s["url"] for s in result["skipped"]} == slow and {s["reason"] for s in result["skipped"]} == {"early_stop"}
+    assert len(result["products"]) == 8 and len(result["top5"]) == 5
@@ -0,0 +1,60 @@
+import pytest
+from shopsmart.core.models import SearchPlan
+from shopsmart.core.planner import apply_constraints, rule_plan
+
+@pytest.mark.parametrize("text, expected", [
+    ("oraimo earbuds under 2000 EGP 4+ stars", {"query": "oraimo earbuds", "brand": "Oraimo", "max_price": 2000, "min_rating": 4}),
+    ("samsung galaxy a55 256gb under 20k", {"query": "samsung galaxy a55 256gb", "brand": "Samsung", "max_price": 20000}),
+    ("jbl speaker between 1000 and 2,500 le rated 4.5", {"query": "jbl speaker", "brand": "JBL", "max_price": 2500, "min_rating": 4.5}),
+    ("anker power bank 20000mah <= 1500", {"query": "anker power bank 20000mah", "brand": "Anker", "max_price": 1500}),
+])
+def test_rule_plan_extracts_constraints(text, expected):
+    plan, confidence = rule_plan(text)
+    assert confidence >= 0.6
+    for field, value in expected.items():
+        assert getattr(plan, field) == value
+
+def test_rule_plan_normalizes_arabic_digits_but_defers_arabic_queries():
+    plan, confidence = rule_plan("سماعة تحت ٢٬٥٠٠ جنيه")
+    assert plan.max_price == 2500
+    assert confidence < 0.6
+
+@pytest.mark.parametrize("text", ["gift for my mom around 3000", "which phone should I buy", "under 2000 egp"])
+def test_rule_plan_is_unsure_about_vague_requests(text):
+    assert rule_plan(text)[1] < 0.6
+
+def test_apply_constraints_overrides_and_merges_features():
+    plan = SearchPlan(query="earbuds", brand="Oraimo", max_price=3000, features=["anc"])
+    out = apply_constraints(plan, {"brand": "", "max_price": 2000, "min_rating": 0, "features": ["anc", " wireless "]})
+    assert (out.brand, out.max_price, out.min_rating, out.features) == ("Oraimo", 2000, None, ["anc", "wireless"])
+
+@pytest.mark.parametrize("text, features", [
+    ("iphone 15 pro max 256gb", ["256gb"]),
+    ("sandisk ssd up to 1tb", ["1tb"]),
+    ("lenovo 2 in 1 laptop", []),
+])
+def test_rule_plan_keeps_specs_and_product_names_out_of_the_budget(text, features):
+    plan, confidence = rule_plan(text)
+    assert plan.max_price is None and plan.query == text and plan.features == features
+    assert confidence >= 0.6
+
+def test_rule_plan_needs_a_currency_or_budget_word_to_trust_max():
+    assert rule_plan("phone max 5000 egp")[0].max_price == 5000 and rule_plan("phone max 5000 egp")[1] >= 0.6
+    assert rule_plan("budget up to 3000 xiaomi earbuds")[0].max_price == 3000
+    plan, confidence = rule_plan("phone max 5000")
+    assert plan.max_price == 5000 and confidence < 0.6
+
+@pytest.mark.parametrize("text", ["sharp knife", "fresh orange juice", "honor among thieves book", "apple cider vinegar"])
+def test_everyday_words_are_not_brands(text):
+    plan, confidence = rule_plan(text)
+    assert plan.brand is None and confidence >= 0.6
+
+@pytest.mark.parametrize("text, brand, sure", [
+    ("iphone 15 pro max 256gb", "Apple", True),
+    ("redmi note 13 under 10000 egp", "Xiaomi", True),
+    ("apple watch series 9", "Apple", False),
+    ("tornado fan under 3000 egp", "Tornado", False),
+])
+def test_brands_resolve_aliases_and_defer_common_words(text, brand, sure):
+    plan, confidence = rule_plan(text)
+    assert plan.brand == brand and (confidence >= 0.6) == sure
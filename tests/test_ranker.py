@@ -0,0 +1,37 @@
+import random
+from shopsmart.core.models import Product
+from shopsmart.core.ranker import score_product, rank_products, ProductBatch, score_batch
+
+def _random_products(n, seed=7):
+    rnd = random.Random(seed)
+    brands = ["Samsung", "Xiaomi", "Apple", "Oraimo"]
+    out = []
+    for i in range(n):
+        out.append(Product(
+            title=f"{rnd.choice(brands)} item {i}" if rnd.random() > 0.05 else "",
+            url=f"https://www.amazon.eg/dp/{i}",
+            price=rnd.choice([None, float(rnd.randint(100, 5000))]),
+            rating=rnd.choice([None, 5.0, 4.0, round(rnd.uniform(1, 5), 1)]),
+        ))
+    return out
+
+def test_vectorized_scores_match_scalar_rules():
+    products = _random_products(500)
+    for args in [("samsung", 2000.0, 4.0), (None, None, None), ("Apple", 4000.0, None), ("", None, 3.5)]:
+        expected = [score_product(p, *args) for p in products]
+        assert score_batch(ProductBatch(products), *args).tolist() == expected
+
+def test_top_k_matches_full_stable_sort():
+    products = _random_products(300, seed=3)
+    for args in [("Xiaomi", 2500.0, 4.0), (None, 1000.0, None)]:
+        full = sorted(products, key=lambda p: score_product(p, *args), reverse=True)
+        assert rank_products(products, *args) == full
+        for k in (0, 1, 5, 299, 1000):
+            assert rank_products(products, *args, k=k) == full[:k]
+    assert rank_products([], "x", 1.0, 1.0, k=5) == []
+
+def test_brand_bonus_counts_product_line_aliases():
+    products = [Product(title="iPhone 15 128GB Black", url="https://noon.com/a", price=40000),
+                Product(title="Generic phone case", url="https://noon.com/b", price=40000)]
+    assert rank_products(products, "Apple", None, None)[0].title == "iPhone 15 128GB Black"
+    assert score_product(products[0], "Apple", None, None) == score_batch(ProductBatch(products), "Apple", None, None)[0]
@@ -0,0 +1,77 @@
+import time
+from shopsmart import refresh
+from shopsmart.core.catalog import Catalog
+from shopsmart.core.models import Product
+from shopsmart.core.utils import product_key
+from shopsmart.refresh import PriceHistory, RefreshScheduler, RefreshStore
+
+PAGE = '<script type="application/ld+json">{"@type": "Product", "name": "Phone", "offers": {"price": "%s"}}</script>'
+
+def test_price_history_roundtrip_skips_repeats():
+    h = PriceHistory()
+    assert h.append(1.0, 100.0) and not h.append(2.0, 100.0) and h.append(3.0, 90.0)
+    again = PriceHistory.from_bytes(*h.to_bytes())
+    assert list(again.ts) == [1.0, 3.0] and list(again.prices) == [100.0, 90.0]
+
+def test_scheduler_prioritises_and_uses_conditional_gets(tmp_path, monkeypatch):
+    cat = Catalog(str(tmp_path / "c.sqlite"))
+    old, popular = "https://www.amazon.eg/dp/OLD", "https://www.amazon.eg/dp/HOT"
+    cat.bulk_upsert([Product(title="Phone", url=old, price=100.0)], fetched_at=time.time() - 7200)
+    cat.bulk_upsert([Product(title="Phone", url=popular, price=100.0)], fetched_at=time.time() - 3600)
+    cat.record_hits([popular, popular, popular])
+    responses = {old: [(PAGE % 100, {"etag": "a"}), (None, {})], popular: [(PAGE % 100, {}), (PAGE % 100, {}), (PAGE % 95, {})]}
+    seen = []
+
+    def fake_fetch(url, etag=None, last_modified=None):
+        seen.append((url, etag))
+        return responses[url].pop(0)
+
+    monkeypatch.setattr(refresh, "fetch_conditional", fake_fetch)
+    sched = RefreshScheduler(catalog=cat, store=RefreshStore(str(tmp_path / "r.sqlite")), min_age=0, unlimited=True)
+    assert [u for _, _, u in sorted(sched.queue())] == [popular, old]
+    sched.run_once()
+    sched.run_once()
+    sched.run_once(max_requests=1)
+    assert seen[:2] == [(popular, None), (old, None)] and (old, "a") in seen
+    assert sched.stats["not_modified"] == 1 and sched.stats["unchanged_body"] == 1
+    assert cat.get(popular).price == 95.0
+    hist = sched.store.history(product_key(popular))
+    assert list(hist.prices) == [100.0, 95.0]
+
+def test_failed_refreshes_back_off_and_give_up(tmp_path, monkeypatch):
+    cat = Catalog(str(tmp_path / "c.sqlite"))
+    dead, ok = "https://www.amazon.eg/dp/DEAD", "https://www.amazon.eg/dp/OK"
+    cat.bulk_upsert([Product(title="Phone", url=dead, price=100.0)], fetched_at=time.time() - 7200)
+    cat.bulk_upsert([Product(title="Phone", url=ok, price=100.0)], fetched_at=time.time() - 3600)
+    tried = []
+
+    def fake_fetch(url, etag=None, last_modified=None):
+        tried.append(url)
+        if url == dead:
+            raise RuntimeError("blocked")
+        return None, {}
+
+    monkeypatch.setattr(refresh, "fetch_conditional", fake_fetch)
+    monkeypatch.setenv("REFRESH_BACKOFF", "60")
+    monkeypatch.setenv("REFRESH_MAX_FAILURES", "3")
+    sched = RefreshScheduler(catalog=cat, store=RefreshStore(str(tmp_path / "r.sqlite")), min_age=0, unlimited=True)
+    for _ in range(3):
+        sched.run_once()
+    assert tried == [dead, ok, ok, ok] and sched.stats["errors"] == 1 and sched.stats["backing_off"] == 1  # per pass, not summed
+    key = product_key(dead)
+    failures, retry_at, failed_at = sched.store.backoffs()[key]
+    assert failures == 1 and 59 < retry_at - failed_at <= 60
+    assert key in [k for _, k, _ in sched.queue(now=time.time() + 61)]
+    assert sched.store.fail(key, 60, 86400) == 2 and sched.store.backoffs()[key][1] - time.time() > 119
+    sched.store.fail(key, 60, 86400)
+    assert key not in [k for _, k, _ in sched.queue(now=time.time() + 10 ** 6)]  # gave up after three in a row
+    cat.bulk_upsert([Product(title="Phone", url=dead, price=90.0)], fetched_at=time.time() + 1)  # a pipeline run fetched it again
+    assert key in [k for _, k, _ in sched.queue(now=time.time() + 10 ** 6)]
+
+def test_zero_rate_pauses_refreshing(tmp_path, monkeypatch):
+    cat = Catalog(str(tmp_path / "c.sqlite"))
+    cat.bulk_upsert([Product(title="Phone", url="https://www.amazon.eg/dp/OLD", price=100.0)], fetched_at=time.time() - 7200)
+    monkeypatch.setattr(refresh, "fetch_conditional", lambda *a, **kw: (None, {}))
+    sched = RefreshScheduler(catalog=cat, store=RefreshStore(str(tmp_path / "r.sqlite")), per_domain_per_minute=0, min_age=0)
+    stats = sched.run_once()
+    assert stats["checked"] == 0 and stats["deferred"] == 1
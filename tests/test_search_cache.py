@@ -0,0 +1,104 @@
+from shopsmart.tools import tavily_tool
+from shopsmart.tools.tavily_tool import SearchCache, normalize_query
+
+class FakeTavily:
+    def __init__(self):
+        self.calls = 0
+
+    def search(self, query, **kwargs):
+        self.calls += 1
+        return {"results": [{"url": "https://www.amazon.eg/dp/A1"}, {"url": "https://www.noon.com/uae-en/x"}]}
+
+def test_normalize_query_ignores_order_and_spacing():
+    assert normalize_query("AirPods  Pro under 9000 EGP") == normalize_query("under 9000 egp airpods pro")
+
+def test_search_cache_exact_and_fuzzy_reuse(tmp_path, monkeypatch):
+    fake = FakeTavily()
+    monkeypatch.setattr(tavily_tool, "get_client", lambda: fake)
+    tavily_tool.set_search_cache(SearchCache(path=str(tmp_path / "s.sqlite"), ttl=60, fuzzy_threshold=90))
+    try:
+        first = tavily_tool.search_products("airpods pro under 9000 EGP")
+        assert tavily_tool.search_products("under 9000 EGP airpods pro") == first
+        assert tavily_tool.search_products("airpod pro under 9000 EGP") == first
+        tavily_tool.search_products("airpods pro under 8000 EGP")
+    finally:
+        tavily_tool.set_search_cache(None)
+    assert first == ["https://www.amazon.eg/dp/A1"]
+    assert fake.calls == 2
+
+def test_search_products_dedupes_on_product_key(monkeypatch):
+    class Variants:
+        def search(self, query, **kwargs):
+            return {"results": [{"url": "https://www.amazon.eg/gp/product/B0CV9XQ5VX?ref=sr_1"},
+                                {"url": "https://www.amazon.eg/Galaxy-A55/dp/B0CV9XQ5VX"},
+                                {"url": "https://www.jumia.com.eg/a55-123456.html?utm_source=t"},
+                                {"url": "https://www.jumia.com.eg/galaxy-a55-123456.html"}]}
+
+    monkeypatch.setenv("SEARCH_CACHE", "false")
+    monkeypatch.setattr(tavily_tool, "get_client", lambda: Variants())
+    assert tavily_tool.search_products("galaxy a55") == ["https://www.amazon.eg/dp/B0CV9XQ5VX",
+                                                         "https://www.jumia.com.eg/a55-123456.html"]
+
+def test_search_plan_fans_out_per_marketplace_and_fuses_with_quotas(monkeypatch):
+    import time
+    from shopsmart.core.models import SearchPlan
+
+    class PerDomain:
+        def __init__(self):
+            self.queries = []
+
+        def search(self, query, include_domains=None, **kwargs):
+            self.queries.append((query, include_domains[0]))
+            if "noon" in include_domains[0]:
+                time.sleep(0.5)  # misses the budget
+                return {"results": [{"url": "https://www.noon.com/egypt-en/x/N1234567A/p/"}]}
+            if "amazon" in include_domains[0]:
+                # every Amazon result, and a popular one from both variants, would fill all slots alone
+                return {"results": [{"url": "https://www.amazon.eg/dp/B00000000" + str(i)} for i in range(8)]}
+            return {"results": [{"url": f"https://www.jumia.com.eg/p-{n}.html"} for n in (111111, 222222)]}
+
+    fake = PerDomain()
+    monkeypatch.setenv("SEARCH_CACHE", "false")
+    monkeypatch.setenv("SEARCH_BUDGET", "0.2")
+    monkeypatch.setattr(tavily_tool, "get_client", lambda: fake)
+    t0 = time.monotonic()
+    urls = tavily_tool.search_plan(SearchPlan(query="earbuds", brand="Oraimo"), max_results=6)
+    assert time.monotonic() - t0 < 0.45
+    assert len(fake.queries) == 6 and ("Oraimo earbuds egypt", "www.noon.com") in fake.queries
+    assert urls == ["https://www.amazon.eg/dp/B000000000", "https://www.jumia.com.eg/p-111111.html",
+                    "https://www.amazon.eg/dp/B000000001", "https://www.jumia.com.eg/p-222222.html",
+                    "https://www.amazon.eg/dp/B000000002", "https://www.amazon.eg/dp/B000000003"]
+
+def test_search_plan_never_waits_past_the_stage_timeout(monkeypatch):
+    import time
+    from shopsmart.core.models import SearchPlan
+
+    class Stuck:
+        def search(self, query, include_domains=None, **kwargs):
+            time.sleep(1.0 if "jumia" in include_domains[0] else 0.5)
+            return {"results": [{"url": "https://www.jumia.com.eg/p-111111.html"}] if "jumia" in include_domains[0] else []}
+
+    monkeypatch.setenv("SEARCH_CACHE", "false")
+    monkeypatch.setenv("SEARCH_BUDGET", "0.1")
+    monkeypatch.setattr(tavily_tool, "get_client", lambda: Stuck())
+    t0 = time.monotonic()
+    assert tavily_tool.search_plan(SearchPlan(query="earbuds"), timeout=0.3) == []
+    assert time.monotonic() - t0 < 0.45
+    assert tavily_tool.search_plan(SearchPlan(query="speaker"), timeout=5) == ["https://www.jumia.com.eg/p-111111.html"]
+
+def test_single_search_fallback_honours_the_timeout(monkeypatch):
+    import time
+    from shopsmart.core.models import SearchPlan
+
+    class Slow:
+        def search(self, query, **kwargs):
+            time.sleep(0.5)
+            return {"results": [{"url": "https://www.jumia.com.eg/p-111111.html"}]}
+
+    monkeypatch.setenv("SEARCH_CACHE", "false")
+    monkeypatch.setenv("SEARCH_FANOUT", "false")
+    monkeypatch.setattr(tavily_tool, "get_client", lambda: Slow())
+    t0 = time.monotonic()
+    assert tavily_tool.search_plan(SearchPlan(query="earbuds"), timeout=0.1) == []
+    assert time.monotonic() - t0 < 0.3
+    assert tavily_tool.search_plan(SearchPlan(query="earbuds"), timeout=5) == ["https://www.jumia.com.eg/p-111111.html"]
@@ -0,0 +1,71 @@
+import threading
+import pytest
+from shopsmart.core.models import PipelineDone, UrlsFound
+from shopsmart.service import PipelineService, ServiceBusy
+
+def _gated_runner(gate, runs):
+    def run(query, constraints=None, **opts):
+        runs.append(query)
+        yield UrlsFound(urls=[query])
+        gate.wait(5)
+        yield PipelineDone(result={"query": query})
+    return run
+
+def test_identical_concurrent_queries_share_one_run():
+    gate, runs = threading.Event(), []
+    svc = PipelineService(workers=2, max_queue=4, runner=_gated_runner(gate, runs))
+    try:
+        jobs = [svc.submit(q) for q in ("AirPods Pro under 9000", "airpods pro  under 9000", " AIRPODS PRO UNDER 9000")]
+        other = svc.submit("airpods pro under 9000", constraints={"brand": "Apple"})
+        gate.set()
+        assert len({j.id for j in jobs}) == 1 and jobs[0].subscribers == 3 and other is not jobs[0]
+        assert [e.kind for e in jobs[0].events()] == ["urls", "done"]
+        assert jobs[2].result(timeout=5) == {"query": "AirPods Pro under 9000"}
+        other.result(timeout=5)
+        assert len(runs) == 2
+        assert svc.submit("airpods pro under 9000") is jobs[0]  # finished within the share window
+        stats = svc.stats()
+        assert stats["started"] == 2 and stats["coalesced"] == 3 and stats["done"] == 2 and "wait_p50_ms" in stats
+    finally:
+        svc.shutdown()
+
+def test_word_order_makes_a_different_job():
+    gate, runs = threading.Event(), []
+    gate.set()
+    svc = PipelineService(workers=2, runner=_gated_runner(gate, runs))
+    try:
+        a, b = svc.submit("case for iphone"), svc.submit("iphone for case")
+        assert a is not b and a.result(timeout=5) != b.result(timeout=5)
+    finally:
+        svc.shutdown()
+
+def test_full_queue_rejects_new_work_but_still_coalesces():
+    gate, runs = threading.Event(), []
+    svc = PipelineService(workers=1, max_queue=1, runner=_gated_runner(gate, runs))
+    try:
+        running = svc.submit("q1")
+        running.poll(0, timeout=5)  # started on the only worker
+        queued = svc.submit("q2")
+        assert svc.position(queued) == 0 and svc.stats()["queued"] == 1
+        with pytest.raises(ServiceBusy):
+            svc.submit("q3")
+        assert svc.submit("q2") is queued
+        gate.set()
+        assert queued.result(timeout=5) == {"query": "q2"}
+        assert svc.stats()["rejected"] == 1
+    finally:
+        svc.shutdown()
+
+def test_pipeline_failure_reaches_every_subscriber():
+    def boom(query, constraints=None, **opts):
+        yield UrlsFound(urls=[])
+        raise RuntimeError("tavily down")
+
+    svc = PipelineService(workers=1, runner=boom)
+    try:
+        job = svc.submit("q")
+        with pytest.raises(RuntimeError, match="tavily down"):
+            job.result(timeout=5)
+        assert job.status == "failed" and svc.submit("q") is not job
+    finally:
+        svc.shutdown()